@@ -4,14 +4,19 @@
 import logging
 import os
 import platform
+import json
+import signal
+import socket
 import sys
 import time
 import traceback
 from multiprocessing import JoinableQueue  # for then number of cpus
 from optparse import OptionParser
+from threading import Lock
 
 from pg_view import consts
 from pg_view import flags
+from pg_view.collectors.cluster_collector import ClusterStatCollector
 from pg_view.collectors.host_collector import HostStatCollector
 from pg_view.collectors.memory_collector import MemoryStatCollector
 from pg_view.collectors.partition_collector import PartitionStatCollector, DetachedDiskStatCollector
@@ -19,11 +24,20 @@ from pg_view.collectors.pg_collector import PgstatCollector
 from pg_view.collectors.system_collector import SystemStatCollector
 from pg_view.loggers import logger, enable_logging_to_stderr, disable_logging_to_stderr
 from pg_view.models.consumers import DiskCollectorConsumer
+from pg_view.models.delta import DeltaEncoder
+from pg_view.models.daemon import SnapshotServer, SnapshotViewer, SocketUnavailable, collector_is_serving, \
+    default_socket_path, socket_is_owned
 from pg_view.models.db_client import build_connection, detect_db_connection_arguments, \
     establish_user_defined_connection, make_cluster_desc, get_postmasters_directories
-from pg_view.models.outputs import CommonOutput, CursesOutput
+from pg_view.models.exporter import MetricsServer, render_metrics
+from pg_view.models.graphite import GraphiteSink, metric_lines
+from pg_view.models.outputs import CommonOutput, CursesOutput, DelimitedOutput, FrameQueue, NdjsonOutput
+from pg_view.models.recording import Player, Recorder, Recording, parse_start
+from pg_view.models.scheduler import Sampler, Snapshot, wait_for_input
+from pg_view.models.sinks import OutputSink
 from pg_view.utils import get_valid_output_methods, OUTPUT_METHOD, \
-    output_method_is_valid, read_configuration, process_single_collector, process_groups
+    output_method_is_valid, read_configuration, process_groups, parse_refresh_intervals, parse_listen_address, \
+    parse_graphite_address, parse_sink, COLLECTOR_NAMES, monotonic
 
 try:
     import psycopg2
@@ -48,10 +62,71 @@ def parse_args():
     parser.add_option('-H', '--help', help='show_help', action='help')
     parser.add_option('-v', '--verbose', help='verbose mode', action='store_true', dest='verbose')
     parser.add_option('-i', '--instance', help='name of the instance to monitor', action='store', dest='instance')
-    parser.add_option('-t', '--tick', help='tick length (in seconds)',
-                      action='store', dest='tick', type='int', default=1)
+    parser.add_option('-t', '--tick', help='tick length, i.e. how often to sample (in seconds, may be fractional)',
+                      action='store', dest='tick', type='float', default=1)
+    parser.add_option('-r', '--display-interval', help='how often to redraw the output (in seconds), the samples '
+                                                       'taken in between are aggregated (default: tick length)',
+                      action='store', dest='display_interval', type='float')
+    parser.add_option('--realtime-interval', help='tick length in the realtime mode, toggled with \'r\' '
+                                                  '(in seconds, default: {0})'.format(consts.MIN_TICK_LENGTH),
+                      action='store', dest='realtime_interval', type='float', default=consts.MIN_TICK_LENGTH)
+    parser.add_option('-D', '--deadline', help='time (in seconds) to wait for each collector before showing '
+                                               'its previous data as stale (default: tick length)',
+                      action='store', dest='deadline', type='float')
+    parser.add_option('-I', '--interval', help='refresh interval of a collector (in seconds), given as name=seconds, '
+                                               'where name is one of {0} (may be used multiple times)'.format(
+                                                   ', '.join(COLLECTOR_NAMES)),
+                      action='append', dest='intervals', default=[])
+    parser.add_option('--summary', help='start with one line per cluster, the details are collected only for the '
+                                        'clusters expanded with Enter', action='store_true', default=False,
+                      dest='summary')
+    parser.add_option('--disable', help='don\'t collect anything for one of {0}, toggled with the keys 1 to {1} '
+                                        '(may be used multiple times)'.format(', '.join(COLLECTOR_NAMES),
+                                                                              len(COLLECTOR_NAMES)),
+                      action='append', default=[], dest='disabled')
+    parser.add_option('-S', '--socket', help='share a single collector between several pg_view instances through '
+                                             'this unix socket: attach to the collector serving on it as a viewer, '
+                                             'or become one if there is none', action='store', dest='socket')
+    parser.add_option('--serve', help='only collect the data and serve it to the viewers attached to the socket '
+                                      '(default: {0})'.format(default_socket_path()),
+                      action='store_true', dest='serve', default=False)
     parser.add_option('-o', '--output-method', help='send output to the following source', action='store',
                       default=OUTPUT_METHOD.curses, dest='output_method')
+    parser.add_option('--delta', help='with the ndjson output, write all the data only every DELTA ticks and just '
+                                      'what has changed in between, pg_view_undelta restores the full output',
+                      action='store', type=int, dest='delta')
+    parser.add_option('--output-dir', help='with the csv or tsv output, write a file per collector to this directory '
+                                           'instead of the standard output', action='store', dest='output_dir')
+    parser.add_option('--queue-size', help='frames of the non-curses output waiting for the reader of the standard '
+                                           'output, before the queue policy kicks in (default: 10)',
+                      action='store', type=int, default=10, dest='queue_size')
+    parser.add_option('--queue-policy', help='what to do with a new frame when the queue is full: block until there '
+                                             'is room, drop-oldest or drop-newest (default: block)',
+                      type='choice', choices=FrameQueue.POLICIES, default='block', dest='queue_policy')
+    parser.add_option('-n', '--iterations', help='exit after showing the output this many times, implies the console '
+                                                 'output unless another non-interactive one is chosen',
+                      action='store', type=int, dest='iterations')
+    parser.add_option('--duration', help='exit after running for this many seconds, the same way as --iterations',
+                      action='store', type='float', dest='duration')
+    parser.add_option('--listen', help='serve the latest data as OpenMetrics on http://[HOST:]PORT/metrics '
+                                       '(HOST defaults to 127.0.0.1)', action='store', dest='listen')
+    parser.add_option('--listen-backends', help='export the metrics of this many busiest backends of each cluster '
+                                                'as well, to --listen and --graphite (default: none)',
+                      action='store', type=int, default=0, dest='listen_backends')
+    parser.add_option('--graphite', help='send the metrics to the graphite plaintext listener on [HOST:]PORT '
+                                         '(HOST defaults to 127.0.0.1) or unix:PATH', action='store', dest='graphite')
+    parser.add_option('--graphite-prefix', help='put this in front of the host name in the graphite metric paths',
+                      action='store', dest='graphite_prefix')
+    parser.add_option('--sink', help='write the output to a file as well, given as METHOD[:COLLECTOR,...]=FILE, '
+                                     'i.e. ndjson=/var/log/pg_view.ndjson, all the collectors unless named '
+                                     '(may be used multiple times)', action='append', default=[], dest='sinks')
+    parser.add_option('--record', help='write the rows of every collector to this file as well, to replay later',
+                      action='store', dest='record')
+    parser.add_option('--replay', help='show the data recorded to this file instead of the live one, space pauses, '
+                                       '. and , step, [ ] { } move by 1 or 10 minutes, < > change the speed',
+                      action='store', dest='replay')
+    parser.add_option('--replay-start', help='start the replay at this time of the day (HH:MM[:SS]) or this many '
+                                             'seconds into the recording', action='store', dest='replay_start')
     parser.add_option('-V', '--use-version',
                       help='version of the instance to monitor (in case it can\'t be autodetected)',
                       action='store', dest='version', type='float')
@@ -63,6 +138,9 @@ def parse_args():
                       action='store', default='', dest='config_file')
     parser.add_option('-P', '--pid', help='always track a given pid (may be used multiple times)',
                       action='append', type=int, default=[])
+    parser.add_option('--idle-budget', help='read /proc for at most this many idle backends per tick, taking '
+                                            'turns, and show them as a single summary row', action='store',
+                      type=int, dest='idle_budget')
     parser.add_option('-U', '--username', help='database user name',
                       action='store', dest='username')
     parser.add_option('-d', '--dbname', help='database name to connect to',
@@ -79,18 +157,39 @@ def parse_args():
 # setup system constants
 output_method = OUTPUT_METHOD.curses
 options = None
+render_lock = Lock()
+# the outputs that write all the collectors of a tick at once, on refresh
+BATCH_OUTPUT_METHODS = (OUTPUT_METHOD.ndjson, OUTPUT_METHOD.csv, OUTPUT_METHOD.tsv)
+cluster_summary = None
+# plays a recording back in place of the sampler
+player = None
+# writes the non-curses output to the standard output
+output_queue = None
 
 
 # execution starts here
-def loop(collectors, consumer, groups, output_method):
+def loop(loop_fn, output_method, *args):
     if output_method == OUTPUT_METHOD.curses:
-        curses.wrapper(do_loop, groups, output_method, collectors, consumer)
+        curses.wrapper(loop_fn, output_method, *args)
     else:
-        do_loop(None, groups, output_method, collectors, consumer)
+        try:
+            loop_fn(None, output_method, *args)
+        finally:
+            if output_queue is not None:
+                output_queue.close()
 
 
 def poll_keys(screen, output):
+    """ process all pending keypresses, return False if we are asked to quit """
     c = screen.getch()
+    while c != -1:
+        if not process_key(c, output):
+            return False
+        c = screen.getch()
+    return True
+
+
+def process_key(c, output):
     if c == ord('u'):
         flags.display_units = flags.display_units is False
     if c == ord('f'):
@@ -103,18 +202,65 @@ def poll_keys(screen, output):
         flags.autohide_fields = flags.autohide_fields is False
     if c == ord('t'):
         flags.notrim = flags.notrim is False
-    if c == ord('r'):
-        flags.realtime = flags.realtime is False
+    if c == ord('c'):
+        flags.summary = flags.summary is False
+    # the sampling is up to the collector a viewer is attached to
+    if output.collecting:
+        if c == ord('r'):
+            flags.realtime = flags.realtime is False
+        if ord('1') <= c < ord('1') + len(COLLECTOR_NAMES):
+            flags.disabled ^= set([COLLECTOR_NAMES[c - ord('1')]])
+    panel = output.focused_panel()
+    if panel is not None:
+        offset = flags.scroll_offsets.get(panel, 0)
+        if c in (curses.KEY_DOWN, ord('j')):
+            offset += 1
+        if c in (curses.KEY_UP, ord('k')):
+            offset -= 1
+        if c == curses.KEY_NPAGE:
+            offset += output.page_length()
+        if c == curses.KEY_PPAGE:
+            offset -= output.page_length()
+        if c == curses.KEY_HOME:
+            offset = 0
+        flags.scroll_offsets[panel] = max(offset, 0)
+        if c == ord('o'):
+            keys = output.sort_keys(panel)
+            sort_key = flags.sort_keys.get(panel)
+            flags.sort_keys[panel] = keys[(keys.index(sort_key) + 1) % len(keys)] if sort_key in keys else None
+            # the top rows are different now
+            flags.scroll_offsets[panel] = 0
+        if c == ord('g'):
+            columns = output.group_columns(panel)
+            column = flags.group_by.get(panel)
+            flags.group_by[panel] = columns[(columns.index(column) + 1) % len(columns)] if column in columns else None
+            flags.scroll_offsets[panel] = 0
+        if c in (ord('\n'), curses.KEY_ENTER) and output.cursor(panel) is not None:
+            flags.expanded ^= set([output.cursor(panel)])
+    if player is not None:
+        # moving through the recording being played back
+        moves = {ord('.'): (player.step, 1), ord(','): (player.step, -1), ord(']'): (player.skip, 60),
+                 ord('['): (player.skip, -60), ord('}'): (player.skip, 600), ord('{'): (player.skip, -600),
+                 ord('>'): (player.change_speed, 1), ord('<'): (player.change_speed, -1)}
+        if c == ord(' '):
+            player.toggle_pause()
+        elif c in moves:
+            fn, arg = moves[c]
+            fn(arg)
+    if c == ord('\t'):
+        flags.focus += 1
     if c == ord('q'):
         # bail out immediately
         return False
     return True
 
 
-def do_loop(screen, groups, output_method, collectors, consumer):
-    """ Display output (or pass it through to ncurses) """
+def create_output(screen, output_method):
+    global output_queue
 
-    output = None
+    if output_method != OUTPUT_METHOD.curses:
+        # a reader of the pipe that doesn't keep up shouldn't hold up the ticks that follow
+        output_queue = FrameQueue(sys.stdout, options.queue_size, options.queue_policy)
     if output_method == OUTPUT_METHOD.curses:
         if screen is None:
             logger.error('No parent screen is passed to the curses application')
@@ -125,41 +271,219 @@ def do_loop(screen, groups, output_method, collectors, consumer):
             if not output.is_color_supported:
                 logger.error('Curses output requires a terminal that supports color')
                 sys.exit(1)
+            output.replay = player
+    elif output_method == OUTPUT_METHOD.ndjson:
+        output = NdjsonOutput(output_queue, DeltaEncoder(options.delta) if options.delta else None)
+    elif output_method in (OUTPUT_METHOD.csv, OUTPUT_METHOD.tsv):
+        output = DelimitedOutput(output_queue, ',' if output_method == OUTPUT_METHOD.csv else '\t', options.output_dir)
     else:
-        output = CommonOutput()
-    while 1:
-        # process input:
-        consumer.consume()
-        for st in collectors:
-            if output_method == OUTPUT_METHOD.curses:
+        output = CommonOutput(output_queue)
+    return output
+
+
+def create_file_output(output_method, stream):
+    """ the output of an additional sink, always written in full """
+    if output_method == OUTPUT_METHOD.ndjson:
+        return NdjsonOutput(stream)
+    if output_method in (OUTPUT_METHOD.csv, OUTPUT_METHOD.tsv):
+        return DelimitedOutput(stream, ',' if output_method == OUTPUT_METHOD.csv else '\t')
+    return CommonOutput(stream)
+
+
+def do_loop(screen, output_method, sampler, groups):
+    """ Display output (or pass it through to ncurses) """
+
+    output = create_output(screen, output_method)
+    sampler.start()
+    snapshot = Snapshot(0, {})
+    shown = 0
+    stop_at = monotonic() + options.duration if options.duration else None
+    while not batch_finished(shown, stop_at):
+        if output_method == OUTPUT_METHOD.curses:
+            # wait for either a new snapshot or a keypress, the sampler never waits for us
+            readable = wait_for_input([sys.stdin.fileno(), sampler.fileno()])
+            if sys.stdin.fileno() in readable:
                 if not poll_keys(screen, output):
                     # bail out immediately
+                    sampler.stop()
                     return
-            st.set_units_display(flags.display_units)
-            st.set_ignore_autohide(not flags.autohide_fields)
-            st.set_notrim(flags.notrim)
-            process_single_collector(st)
-            if output_method == OUTPUT_METHOD.curses:
-                if not poll_keys(screen, output):
-                    return
+                snapshot = sampler.latest()
+                display_collectors(output, output_method, groups, sampler.collectors, snapshot)
+                continue
+        else:
+            timeout = consts.TICK_LENGTH
+            if stop_at is not None:
+                timeout = max(min(timeout, stop_at - monotonic()), 0)
+            sampler.wait_for_snapshot(snapshot.version, timeout)
+        latest = sampler.latest()
+        if latest.version != snapshot.version:
+            if output_queue is not None and snapshot.version:
+                # the snapshots published while we were busy with the output are never shown
+                output_queue.skip(latest.version - snapshot.version - 1)
+            snapshot = latest
+            # a batch run shows the rates, which take a second refresh of the collectors to calculate
+            if (options.iterations or options.duration) and not has_rates(sampler, snapshot):
+                continue
+            display_collectors(output, output_method, groups, sampler.collectors, snapshot)
+            shown += 1
+    sampler.stop()
+
+
+def has_rates(sampler, snapshot):
+    return sampler.rates_version is not None and snapshot.version >= sampler.rates_version
+
+
+def batch_finished(shown, stop_at):
+    """ whether the output has been shown as many times, or for as long, as we were asked to """
+    if options.iterations is not None and shown >= options.iterations:
+        return True
+    return stop_at is not None and monotonic() >= stop_at
+
+
+def view_loop(screen, output_method, viewer):
+    """ Display the output rendered for us by the collector we are attached to """
 
+    output = create_output(screen, output_method)
+    output.collecting = False
+    viewer.request(current_view(output_method, output))
+    data = []
+    shown = 0
+    stop_at = monotonic() + options.duration if options.duration else None
+    while not batch_finished(shown, stop_at):
         if output_method == OUTPUT_METHOD.curses:
-            process_groups(groups)
-        # in the non-curses cases display actually shows the data and refresh
-        # clears the screen, so we need to refresh before display to clear the old data.
-        if options.clear_screen and output_method != OUTPUT_METHOD.curses:
-            output.refresh()
+            readable = wait_for_input([sys.stdin.fileno(), viewer])
+            if sys.stdin.fileno() in readable:
+                if not poll_keys(screen, output):
+                    return
+                # the display options might have changed, the collector renders the output for us
+                viewer.request(current_view(output_method, output))
+                show_output(output, output_method, data)
+                continue
+        elif stop_at is not None and not wait_for_input([viewer], max(stop_at - monotonic(), 0)):
+            continue
+        received = viewer.receive()
+        if received is None:
+            logger.error('the collector we were attached to has gone away')
+            return
+        # freezing a viewer only stops updating its own screen, the collector keeps going
+        if received and not flags.freeze:
+            data = received
+            show_output(output, output_method, data)
+            shown += 1
+
+
+def current_view(output_method, output):
+    """ display options of this pg_view instance, a collector we are attached to renders the output with them """
+    view = {'method': output_method, 'units': flags.display_units, 'autohide': flags.autohide_fields,
+            'notrim': flags.notrim, 'offsets': {}, 'sort': {}, 'group': {},
+            'limit': None, 'summary': flags.summary, 'expanded': [], 'collectors': None,
+            'filter_aux': flags.filter_aux,
+            'delta': isinstance(output, NdjsonOutput) and output.delta_encoder is not None}
+    if output_method == OUTPUT_METHOD.curses:
+        view['offsets'] = dict(flags.scroll_offsets)
+        view['sort'] = dict(flags.sort_keys)
+        view['group'] = dict(flags.group_by)
+        view['expanded'] = sorted(flags.expanded)
+        view['limit'] = output.rows_limit()
+    return view
+
+
+def render_snapshot(groups, collectors, snapshot, view):
+    """ produce the output of each collector out of the snapshot rows, with the given display options """
+    # collectors keep the display options as their state, viewers rendering concurrently shouldn't mix them up
+    with render_lock:
+        # the output that subscribes to some of the collectors only is never bothered with the rest
+        if view.get('collectors') is not None:
+            collectors = [st for st in collectors if st.NAME in view['collectors']]
+        if view['summary']:
+            collectors = summary_collectors(groups, collectors, view['expanded'])
+        else:
+            for group in groups.values():
+                if group['pg'] in collectors:
+                    group['pg'].request_details()
         for st in collectors:
-            output.display(st.output(output_method))
-        # in the curses case, refresh shows the data queued by display
-        if output_method == OUTPUT_METHOD.curses:
-            output.refresh()
-        if not flags.realtime:
-            time.sleep(consts.TICK_LENGTH)
+            st.set_units_display(view['units'])
+            st.set_ignore_autohide(not view['autohide'])
+            st.set_notrim(view['notrim'])
+            st.set_keyed_rows(view['delta'])
+            st.set_viewport(view['offsets'].get(st.ident(), 0), view['limit'])
+            st.set_sort_key(view['sort'].get(st.ident()))
+            st.set_group_by(view['group'].get(st.ident()))
+            st.set_aux_processes_filter(view['filter_aux'])
+        if view['method'] == OUTPUT_METHOD.curses:
+            process_groups(groups)
+        # the collectors that show the same rows as before with the same options don't format them again
+        return [st.cached_output(view['method'], cluster_summary.aggregate(snapshot.rows) if st is cluster_summary
+                                 else snapshot.rows.get(st, [])) for st in collectors]
+
+
+def summary_collectors(groups, collectors, expanded):
+    """ replace the panels of the clusters with a line for each of them, except for the expanded ones """
+    clusters = dict((st, group['pg']) for group in groups.values() for st in (group['partitions'], group['pg']))
+    result = [st for st in collectors if st not in clusters] + [cluster_summary]
+    for st in collectors:
+        if st in clusters and clusters[st].ident() in expanded:
+            # the processes of the clusters nobody looks at are not collected one by one
+            clusters[st].request_details()
+            result.append(st)
+    return result
+
+
+def display_collectors(output, output_method, groups, collectors, snapshot):
+    """ show the rows of the collectors from the given snapshot """
+    show_output(output, output_method,
+                render_snapshot(groups, collectors, snapshot, current_view(output_method, output)))
+
+
+def show_output(output, output_method, data):
+    if output_queue is not None and output_queue.dropped:
+        data = [dropped_notice(output_method, output_queue.dropped)] + data
+    # in the non-curses cases display actually shows the data, so we need to clear the screen before it.
+    if options.clear_screen and output_method not in (OUTPUT_METHOD.curses,) + BATCH_OUTPUT_METHODS:
+        output.clear()
+    for result in data:
+        output.display(result)
+    # in the curses, ndjson, csv and tsv cases, refresh shows the data queued by display
+    if output_method == OUTPUT_METHOD.curses:
+        clamp_scroll_offsets(data)
+        output.refresh()
+    elif output_method in BATCH_OUTPUT_METHODS:
+        output.refresh()
+    if output_queue is not None:
+        output_queue.end_frame()
+
+
+def dropped_notice(output_method, count):
+    """ tell the reader how many frames it has missed so far, in the format of the output """
+    if output_method == OUTPUT_METHOD.json:
+        return json.dumps({'type': 'dropped', 'frames': count}, indent=4)
+    if output_method == OUTPUT_METHOD.ndjson:
+        return '{{"type":"dropped","frames":{0}}}'.format(count)
+    if output_method in (OUTPUT_METHOD.csv, OUTPUT_METHOD.tsv):
+        return {'collector': 'dropped', 'header': ['frames'], 'rows': [[count]]}
+    return '{0} frames dropped so far, the output falls behind'.format(count)
+
+
+def clamp_scroll_offsets(data):
+    """ don't let the scrolling run past the last row of the panel """
+    for d in data:
+        for panel, result in d.items():
+            if 'viewport' in result and panel in flags.scroll_offsets:
+                flags.scroll_offsets[panel] = min(flags.scroll_offsets[panel], max(result['viewport']['total'] - 1, 0))
+
+
+def tick_interval():
+    """ seconds between the ticks, the realtime mode samples as often as it is allowed to """
+    return options.realtime_interval if flags.realtime else consts.TICK_LENGTH
+
+
+def ticks_per_display():
+    """ number of samples aggregated into a single redraw """
+    return max(1, int(round((options.display_interval or consts.TICK_LENGTH) / consts.TICK_LENGTH)))
 
 
 def main():
-    global options
+    global options, cluster_summary
 
     # bail out if we are not running Linux
     if platform.system() != 'Linux':
@@ -171,6 +495,22 @@ def main():
         sys.exit(254)
 
     options, args = parse_args()
+    flags.summary = options.summary
+    unknown = set(options.disabled) - set(COLLECTOR_NAMES)
+    if unknown:
+        print('Unknown collector to disable: {0}'.format(', '.join(sorted(unknown))))
+        print('Valid collectors are: {0}'.format(','.join(COLLECTOR_NAMES)))
+        sys.exit(1)
+    flags.disabled = set(options.disabled)
+    if options.tick < consts.MIN_TICK_LENGTH:
+        print('Tick length should be at least {0} seconds'.format(consts.MIN_TICK_LENGTH))
+        sys.exit(1)
+    if options.realtime_interval < consts.MIN_TICK_LENGTH:
+        print('Realtime interval should be at least {0} seconds'.format(consts.MIN_TICK_LENGTH))
+        sys.exit(1)
+    if options.display_interval is not None and options.display_interval < options.tick:
+        print('Display interval should not be shorter than the tick length')
+        sys.exit(1)
     consts.TICK_LENGTH = options.tick
 
     output_method = options.output_method
@@ -184,9 +524,100 @@ def main():
         print('Curses output is selected, but curses are unavailable, falling back to console output')
         output_method == OUTPUT_METHOD.console
 
+    if options.iterations is not None and options.iterations < 1:
+        print('Number of iterations should be at least 1')
+        sys.exit(1)
+    if options.duration is not None and options.duration <= 0:
+        print('Duration should be positive')
+        sys.exit(1)
+    if (options.iterations or options.duration) and options.serve:
+        print('The collector serving the viewers runs until stopped, without --iterations or --duration')
+        sys.exit(1)
+    if (options.iterations or options.duration) and output_method == OUTPUT_METHOD.curses:
+        # there is nobody to press the keys in the batch mode
+        output_method = OUTPUT_METHOD.console
+
+    if options.delta is not None and (options.delta < 1 or output_method != OUTPUT_METHOD.ndjson):
+        print('Delta encoding needs the ndjson output and a keyframe interval of at least 1 tick')
+        sys.exit(1)
+
+    if options.output_dir is not None:
+        if output_method not in (OUTPUT_METHOD.csv, OUTPUT_METHOD.tsv):
+            print('Output directory is only used by the csv and tsv outputs')
+            sys.exit(1)
+        if not os.path.isdir(options.output_dir):
+            print('Output directory {0} does not exist'.format(options.output_dir))
+            sys.exit(1)
+
+    if options.queue_size < 1:
+        print('Output queue should hold at least 1 frame')
+        sys.exit(1)
+
+    if options.idle_budget is not None and options.idle_budget < 0:
+        print('Idle backends budget should not be negative')
+        sys.exit(1)
+
+    try:
+        refresh_intervals = parse_refresh_intervals(options.intervals)
+    except ValueError as e:
+        print('Invalid refresh interval: {0}'.format(e))
+        sys.exit(1)
+
+    if options.replay and (options.record or options.socket or options.serve or options.listen or options.graphite or
+                           options.sinks):
+        print('A recording can only be replayed on its own, without recording or serving it')
+        sys.exit(1)
+
+    listen_address = None
+    if options.listen:
+        try:
+            listen_address = parse_listen_address(options.listen)
+        except ValueError as e:
+            print('Invalid address to listen on: {0}'.format(e))
+            sys.exit(1)
+    graphite_address = None
+    if options.graphite:
+        try:
+            graphite_address = parse_graphite_address(options.graphite)
+        except ValueError as e:
+            print('Invalid graphite address: {0}'.format(e))
+            sys.exit(1)
+    sinks = []
+    for value in options.sinks:
+        try:
+            method, names, path = parse_sink(value)
+            sinks.append((method, names, path, open(path, 'a')))
+        except (ValueError, IOError) as e:
+            print('Invalid sink {0}: {1}'.format(value, e))
+            sys.exit(1)
+    if options.listen_backends < 0:
+        print('Number of backends to export should not be negative')
+        sys.exit(1)
+
     # set basic logging
     setup_logger(options)
 
+    if options.replay:
+        replay_recording(output_method)
+        sys.exit(0)
+
+    if options.serve and not options.socket:
+        options.socket = default_socket_path()
+    if options.socket and os.path.exists(options.socket) and not socket_is_owned(options.socket):
+        print('The socket {0} belongs to another user'.format(options.socket))
+        sys.exit(1)
+    if options.socket and not options.serve and collector_is_serving(options.socket):
+        # somebody is collecting already, just show what they collect
+        try:
+            viewer = SnapshotViewer(options.socket)
+            disable_logging_to_stderr()
+            loop(view_loop, output_method, viewer)
+            enable_logging_to_stderr()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sys.exit(0)
+
     user_dbname = options.instance
     user_dbver = options.version
     clusters = []
@@ -244,6 +675,11 @@ def main():
                 clusters.append(desc)
     collectors = []
     groups = {}
+    server = None
+    recorder = None
+    metrics_server = None
+    graphite_sink = None
+    output_sinks = []
     try:
         if len(clusters) == 0:
             logger.error('No suitable PostgreSQL instances detected, exiting...')
@@ -253,28 +689,104 @@ def main():
 
         # initialize the disks stat collector process and create an exchange queue
         q = JoinableQueue(1)
-        work_directories = [cl['wd'] for cl in clusters if 'wd' in cl]
-        collector = DetachedDiskStatCollector(q, work_directories)
-        collector.start()
         consumer = DiskCollectorConsumer(q)
 
-        collectors.append(HostStatCollector())
-        collectors.append(SystemStatCollector())
-        collectors.append(MemoryStatCollector())
+        collectors_by_name = dict((name, []) for name in COLLECTOR_NAMES)
+        collectors_by_name['host'].append(HostStatCollector())
+        collectors_by_name['system'].append(SystemStatCollector())
+        collectors_by_name['memory'].append(MemoryStatCollector())
+        collectors.extend(collectors_by_name['host'] + collectors_by_name['system'] + collectors_by_name['memory'])
         for cl in clusters:
             part = PartitionStatCollector(cl['name'], cl['ver'], cl['wd'], consumer)
-            pg = PgstatCollector(cl['pgcon'], cl['reconnect'], cl['pid'], cl['name'], cl['ver'], options.pid)
+            pg = PgstatCollector(cl['pgcon'], cl['reconnect'], cl['pid'], cl['name'], cl['ver'], options.pid,
+                                 options.idle_budget)
+            # start collecting the processes right away, unless only the summary is shown
+            pg.details_lease = max(pg.details_lease, 3 * ticks_per_display() * consts.TICK_LENGTH)
+            pg.details_until = 0 if options.summary else monotonic() + pg.details_lease
             groupname = cl['wd']
             groups[groupname] = {'pg': pg, 'partitions': part}
             collectors.append(part)
             collectors.append(pg)
+            collectors_by_name['partitions'].append(part)
+            collectors_by_name['postgres'].append(pg)
+        cluster_summary = ClusterStatCollector(groups)
+        # host, memory and partition data changes slowly, there is no point in sampling it faster than we redraw
+        for name in 'host', 'memory', 'partitions':
+            for st in collectors_by_name[name]:
+                st.ticks_per_refresh = ticks_per_display()
+        for name, seconds in refresh_intervals.items():
+            for st in collectors_by_name[name]:
+                st.set_refresh_interval(seconds, consts.TICK_LENGTH)
 
+        work_directories = [cl['wd'] for cl in clusters if 'wd' in cl]
+        # du and df are only worth running as often as the partitions collector asks for their results
+        partition_ticks = collectors_by_name['partitions'][0].ticks_per_refresh
+        # there is no way to turn the partitions on without the keyboard, don't bother with du and df then
+        if 'partitions' not in flags.disabled or output_method == OUTPUT_METHOD.curses:
+            collector = DetachedDiskStatCollector(q, work_directories, partition_ticks)
+            collector.start()
+
+        def reload_static_data(signum, frame):
+            for st in collectors:
+                st.invalidate_static_data()
+
+        signal.signal(signal.SIGHUP, reload_static_data)
+
+        sampler = Sampler(collectors, consumer, tick_interval, ticks_per_display(), options.deadline)
+        if options.record:
+            sampler.recorder = recorder = Recorder(options.record, collectors)
+            # the recording is meant to be replayed with the details, even when nobody watches it being made
+            for st in collectors_by_name['postgres']:
+                st.keep_details()
+        if options.socket:
+            def render_for_viewer(snapshot, view):
+                return render_snapshot(groups, collectors, snapshot, view)
+
+            server = SnapshotServer(options.socket, sampler, render_for_viewer)
+            server.start()
+        for st in collectors_by_name['postgres']:
+            st.metrics_backends = options.listen_backends
+            # the labels of the busiest backends come from the processes, which are otherwise read on demand only
+            if options.listen_backends and (listen_address or graphite_address):
+                st.keep_details()
+
+        def metric_rows(snapshot):
+            return ([(st, snapshot.rows.get(st, [])) for st in collectors] +
+                    [(cluster_summary, cluster_summary.aggregate(snapshot.rows))])
+
+        if listen_address:
+            def render_for_scrape(snapshot):
+                return render_metrics(metric_rows(snapshot), snapshot.version)
+
+            metrics_server = MetricsServer(listen_address, sampler, render_for_scrape)
+            metrics_server.start()
+        if graphite_address:
+            hostname = socket.gethostname().split('.')[0]
+
+            def render_for_graphite(snapshot):
+                return metric_lines(metric_rows(snapshot), hostname, time.time(), options.graphite_prefix)
+
+            graphite_sink = GraphiteSink(graphite_address, sampler, render_for_graphite)
+            graphite_sink.start()
+
+        def render_for_sink(snapshot, view):
+            return render_snapshot(groups, collectors, snapshot, view)
+
+        for method, names, path, stream in sinks:
+            view = dict(current_view(method, None), summary=False, collectors=names)
+            output_sinks.append(OutputSink(sampler, create_file_output(method, stream), view, render_for_sink, path))
+            output_sinks[-1].start()
+        if options.serve:
+            logger.info('serving the collected data on {0}'.format(options.socket))
+            sampler.run()
         # we don't want to mix diagnostics messages with useful output, so we log the former into a file.
         disable_logging_to_stderr()
-        loop(collectors, consumer, groups, output_method)
+        loop(do_loop, output_method, sampler, groups)
         enable_logging_to_stderr()
     except KeyboardInterrupt:
         pass
+    except SocketUnavailable as e:
+        print('Unable to serve the collected data: {0}'.format(e))
     except curses.error:
         print(traceback.format_exc())
         if 'SSH_CLIENT' in os.environ and 'SSH_TTY' not in os.environ:
@@ -282,9 +794,68 @@ def main():
     except:
         print(traceback.format_exc())
     finally:
+        if server:
+            server.close()
+        if recorder:
+            recorder.close()
+        if metrics_server:
+            metrics_server.close()
+        if graphite_sink:
+            graphite_sink.close()
+        for sink in output_sinks:
+            sink.close()
+        for _, _, _, stream in sinks:
+            stream.close()
         sys.exit(0)
 
 
+def replay_recording(output_method):
+    """ show the data of a recording instead of collecting anything """
+    global cluster_summary, player
+
+    try:
+        recording = Recording(options.replay)
+    except (IOError, ValueError) as e:
+        print('Unable to read the recording: {0}'.format(e))
+        sys.exit(1)
+    if len(recording) == 0:
+        print('The recording {0} is empty'.format(options.replay))
+        sys.exit(1)
+    # the collectors are never refreshed, they only get the recorded rows to display
+    collectors = []
+    groups = {}
+    for desc in recording.collectors:
+        if desc['name'] == 'host':
+            st = HostStatCollector()
+        elif desc['name'] == 'system':
+            st = SystemStatCollector()
+        elif desc['name'] == 'memory':
+            st = MemoryStatCollector()
+        elif desc['name'] == 'partitions':
+            st = PartitionStatCollector(desc['dbname'], desc['dbver'], desc['work_directory'], None)
+            groups.setdefault((desc['dbname'], desc['dbver']), {})['partitions'] = st
+        else:
+            st = PgstatCollector(None, None, None, desc['dbname'], desc['dbver'], [])
+            groups.setdefault((desc['dbname'], desc['dbver']), {})['pg'] = st
+        collectors.append(st)
+    cluster_summary = ClusterStatCollector(groups)
+    player = Player(recording, collectors)
+    if options.replay_start:
+        try:
+            player.position = recording.find(parse_start(options.replay_start, recording.start_time))
+        except ValueError as e:
+            print('Invalid time to start the replay at: {0}'.format(e))
+            sys.exit(1)
+    try:
+        disable_logging_to_stderr()
+        loop(do_loop, output_method, player, groups)
+        enable_logging_to_stderr()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recording.close()
+
+
 def setup_logger(options):
     logger.setLevel((logging.INFO if options.verbose else logging.ERROR))
     if options.log_file:
@@ -1,13 +1,91 @@
+import heapq
 import json
 import os
 import subprocess
 import time
 from datetime import timedelta, datetime
 from numbers import Number
+from threading import Lock
 
 from pg_view.loggers import logger
 from pg_view.models.outputs import COLSTATUS, COLALIGN, COLTYPES, COLHEADER, ColumnType
-from pg_view.utils import OUTPUT_METHOD
+from pg_view.utils import OUTPUT_METHOD, monotonic
+
+
+class SampleAggregator(object):
+    """ Accumulates diff rows of several samples taken between two redraws. The aggregated row
+        contains the average value of each aggregated column, as well as its minimum and maximum
+        in the '_min' and '_max' dictionaries. Rows that appeared only in some of the samples are
+        kept as well, so that short-lived processes don't disappear between redraws.
+    """
+
+    def __init__(self, columns, key_fn):
+        self.columns = columns
+        self.key_fn = key_fn
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.last_rows = []
+        self.accumulated = {}
+        self.keys = []
+
+    def add(self, rows):
+        self.samples += 1
+        self.last_rows = rows
+        previous = None
+        for idx, row in enumerate(rows):
+            key = self.key_fn(idx, row)
+            acc = self.accumulated.get(key)
+            if acc is None:
+                acc = self.accumulated[key] = {'sum': {}, 'count': {}, 'min': {}, 'max': {}}
+                self.keys.append(key)
+            # non-aggregated columns show their most recent values
+            acc['row'] = row
+            # the row it comes after, in case it is gone by the end
+            acc['after'] = previous
+            previous = key
+            for col in self.columns:
+                val = row.get(col)
+                if val is None or not isinstance(val, Number) or isinstance(val, bool):
+                    continue
+                if col in acc['sum']:
+                    acc['sum'][col] += val
+                    acc['count'][col] += 1
+                    acc['min'][col] = min(acc['min'][col], val)
+                    acc['max'][col] = max(acc['max'][col], val)
+                else:
+                    acc['sum'][col] = acc['min'][col] = acc['max'][col] = val
+                    acc['count'][col] = 1
+
+    def result(self):
+        if self.samples <= 1:
+            return list(self.last_rows)
+        result = []
+        # keep the order of the latest sample, rows that are gone by now stay right after the row they
+        # followed when they were seen last, i.e. a blocked process after its blocker
+        order = [self.key_fn(idx, row) for idx, row in enumerate(self.last_rows)]
+        seen = set(order)
+        for key in self.keys:
+            if key in seen:
+                continue
+            after = self.accumulated[key]['after']
+            if after is None:
+                order.insert(0, key)
+            elif after in seen:
+                order.insert(order.index(after) + 1, key)
+            else:
+                order.append(key)
+            seen.add(key)
+        for key in order:
+            acc = self.accumulated[key]
+            row = dict(acc['row'])
+            for col in acc['sum']:
+                row[col] = acc['sum'][col] / float(acc['count'][col])
+            row['_min'] = acc['min']
+            row['_max'] = acc['max']
+            result.append(row)
+        return result
 
 
 class StatCollector(object):
@@ -17,8 +95,29 @@ class StatCollector(object):
     """
 
     BYTE_MAP = [('TB', 1073741824), ('GB', 1048576), ('MB', 1024)]
+    # the units of the values the output functions take, out of the units of the values they produce
+    RAW_UNITS = {
+        'bytes_to_mbytes': lambda units: units.replace('MB', 'B'),
+        'kb_to_mbytes': lambda units: units.replace('MB', 'KB'),
+        'sectors_to_mbytes': lambda units: units.replace('MB', 'sectors'),
+        'kb_pretty_print': lambda units: 'KB',
+        'time_diff_to_percent': lambda units: 'fraction',
+        'time_pretty_print': lambda units: 's',
+        'delta_pretty_print': lambda units: 's',
+    }
     USER_HZ = os.sysconf(os.sysconf_names['SC_CLK_TCK'])
     RD = 1
+    # whether the curses output can be scrolled through, as opposed to always starting from the first row
+    SCROLLABLE = False
+    # whether the content version follows the values shown rather than the rows, for the collectors
+    # with a single row of rounded values: a few kilobytes more don't change the 2.0GB on the screen
+    VERSION_BY_OUTPUT = False
+    # alternative orders of the curses output rows, as name: key function, the first row has the largest key
+    SORT_KEYS = {}
+    # what the order of the rows produced by the collector is called
+    DEFAULT_ORDER = None
+    # one of the COLLECTOR_NAMES the collector is known as on the command line
+    NAME = None
 
     NCURSES_DEFAULTS = {
         'pos': -1,
@@ -29,6 +128,8 @@ class StatCollector(object):
     }
 
     NCURSES_CUSTOM_OUTPUT_FIELDS = ['header', 'prefix', 'prepend_column_headers']
+    # no whitespace in the ndjson output
+    NDJSON_ENCODER = json.JSONEncoder(separators=(',', ':'))
 
     def __init__(self, ticks_per_refresh=1, produce_diffs=True):
         self.rows_prev = []
@@ -41,9 +142,27 @@ class StatCollector(object):
         self._previous_moment = None
         self._current_moment = None
         self.produce_diffs = produce_diffs
+        self.enabled = True
         self.show_units = False
         self.ignore_autohide = True
         self.notrim = False
+        # whether the ndjson rows carry the key identifying them across the ticks, only the delta encoding needs it
+        self.keyed_rows = False
+        # part of the rows visible on the screen, the curses output doesn't bother with the rest
+        self.viewport_offset = 0
+        self.viewport_limit = None
+        self.sort_key = None
+        # rows to display and whether they come from the last successful refresh
+        self.rows_snapshot = []
+        self.stale = False
+        # grows whenever the rows to display change, along with the output formatted last for each method
+        self.content_version = 0
+        self.content_values = None
+        self.output_cache = {}
+        # samples taken since the last time rows were displayed
+        self.samples = SampleAggregator([], self.sample_key)
+        self.samples_lock = Lock()
+        self._sampled_moment = None
 
         # transformation data
         self.transform_dict_data = {}  # data to transform a dictionary input to the stat row
@@ -53,8 +172,15 @@ class StatCollector(object):
         self.diff_generator_data = {}  # data to produce a diff row out of 2 input ones.
         self.output_transform_data = {}  # data to transform diff output
 
+        # gauges exported for each row: the name, the input column, the factor to turn it into the base units
+        self.metrics_data = []
+        self.metrics_labels = []  # columns that tell the rows apart in the exported gauges
+
         self.output_function = {OUTPUT_METHOD.console: self.console_output, OUTPUT_METHOD.json: self.json_output,
-                                OUTPUT_METHOD.curses: self.ncurses_output}
+                                OUTPUT_METHOD.ndjson: self.ndjson_output, OUTPUT_METHOD.csv: self.table_output,
+                                OUTPUT_METHOD.tsv: self.table_output, OUTPUT_METHOD.curses: self.ncurses_output}
+        # encoded keys of the ndjson output columns, along with the units setting they were encoded for
+        self.ndjson_columns = None
         self.cook_function = {OUTPUT_METHOD.curses: self.curses_cook_value}
         self.ncurses_custom_fields = dict.fromkeys(StatCollector.NCURSES_CUSTOM_OUTPUT_FIELDS, None)
 
@@ -63,6 +189,9 @@ class StatCollector(object):
                   self.output_transform_data]:
             self.validate_list_out(l)
         self.output_column_positions = self._calculate_output_column_positions()
+        # rates are aggregated between redraws, as well as the columns explicitly marked for that
+        aggregated = [col['out'] for col in self.diff_generator_data if col.get('diff', True) or col.get('aggregate')]
+        self.samples = SampleAggregator(aggregated if self.produce_diffs else [], self.sample_key)
 
     def set_ignore_autohide(self, new_status):
         self.ignore_autohide = new_status
@@ -70,6 +199,25 @@ class StatCollector(object):
     def set_notrim(self, val):
         self.notrim = val
 
+    def set_keyed_rows(self, val):
+        self.keyed_rows = val
+
+    def set_viewport(self, offset, limit):
+        self.viewport_offset = offset
+        self.viewport_limit = limit
+
+    def set_group_by(self, column):
+        """ only the collectors that aggregate their rows support grouping """
+        pass
+
+    def set_aux_processes_filter(self, newval):
+        """ only the postgres collector tells the auxiliary processes apart """
+        pass
+
+    def set_sort_key(self, name):
+        """ order the curses output by one of SORT_KEYS, None keeps the order of the collector """
+        self.sort_key = name if name in self.SORT_KEYS else None
+
     def _calculate_output_column_positions(self):
         result = {}
         for idx, col in enumerate(self.output_transform_data):
@@ -262,6 +410,10 @@ class StatCollector(object):
     def set_units_display(self, status):
         self.show_units = status
 
+    def has_rates(self):
+        """ whether the rows carry the rates already, those are only known from the second refresh on """
+        return not self.produce_diffs or self._previous_moment is not None
+
     def needs_diffs(self):
         """ whether the collector needs diffs. It might not if it's not interested in them,
             or if it doesn't have data to produce them yet.
@@ -273,11 +425,93 @@ class StatCollector(object):
         self.ticks += 1
 
     def needs_refresh(self):
-        return self.ticks % self.ticks_per_refresh == 0
+        # the first tick always refreshes, so that the collector has data to show right away
+        return (self.ticks - 1) % self.ticks_per_refresh == 0
+
+    def set_refresh_interval(self, seconds, tick_length):
+        self.ticks_per_refresh = max(1, int(round(float(seconds) / tick_length)))
+
+    def disable(self):
+        """ Stop refreshing the collector and forget its rows, so that the rates start over once it is enabled """
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.rows_prev = []
+        self.rows_cur = []
+        self.rows_diff = []
+        self.diff_time = 0
+        self._previous_moment = None
+        self._current_moment = None
+        with self.samples_lock:
+            self.samples.reset()
+            self._sampled_moment = None
+            self.set_rows_snapshot([])
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            # refresh right away on the next tick
+            self.ticks = 0
+
+    def invalidate_static_data(self):
+        """ Forget the data that is normally read only once, it is read again on the next refresh """
+        pass
 
     def refresh(self):
         self._do_refresh(None)
 
+    def sample_key(self, idx, row):
+        """ identify the row across the samples aggregated between redraws """
+        return idx
+
+    def take_snapshot(self):
+        """ add the rows of the last refresh to the samples waiting to be displayed """
+        if self._current_moment == self._sampled_moment:
+            # nothing new since the last sample, i.e. the output is frozen or not due for a refresh
+            return
+        self._sampled_moment = self._current_moment
+        with self.samples_lock:
+            self.samples.add(self.rows_diff if self.produce_diffs else self.rows_cur)
+
+    def flush_samples(self):
+        """ aggregate the samples taken since the previous call into the rows to display. If there
+            are none, i.e. the collector is refreshed less often or is late - show the previous ones.
+            Returns True if the rows to display have changed.
+        """
+        with self.samples_lock:
+            if self.samples.samples == 0:
+                return False
+            self.set_rows_snapshot(self.samples.result())
+            self.samples.reset()
+            return True
+
+    def set_rows_snapshot(self, rows):
+        """ replace the rows to display, unless they are the same as before. The output formatted for
+            them stays valid as long as neither the content version nor the display options change
+        """
+        if rows == self.rows_snapshot:
+            return
+        values = self._content_values(rows)
+        if values != self.content_values:
+            self.content_values = values
+            self.content_version += 1
+        self.rows_snapshot = rows
+
+    def _content_values(self, rows):
+        """ what the content version is computed over, either the rows or the values they are shown with """
+        if not self.VERSION_BY_OUTPUT:
+            return rows
+        return [[self._produce_output_value(values, col) for col in self.output_transform_data]
+                for row in rows for values in (row, row.get('_min', {}), row.get('_max', {}))]
+
+    def recorded_state(self):
+        """ what the output depends on besides the rows, recorded along with them """
+        return {'stale': self.stale}
+
+    def restore_state(self, state):
+        """ bring back the state recorded along with the rows being played back """
+        self.stale = state.get('stale', False)
+
     def ident(self):
         return str(self.__class__).lower().split('.')[-1].split('statcollector')[0]
 
@@ -344,7 +578,8 @@ class StatCollector(object):
         self.rows_prev = self.rows_cur
         self.rows_cur = new_rows
         self._previous_moment = self._current_moment
-        self._current_moment = time.time()
+        # rates must not jump when the wall clock is adjusted
+        self._current_moment = monotonic()
         if self._previous_moment is None:
             self.diff_time = 0
         else:
@@ -607,7 +842,7 @@ class StatCollector(object):
         header = self._output_row_for_console(None, 'h')
 
         if before_string:
-            result.append(before_string)
+            result.append(before_string + (' (stale)' if self.stale else ''))
 
         result.append(templ.format(*header))
 
@@ -652,6 +887,17 @@ class StatCollector(object):
             statuses.append(self._calculate_output_status(row, col, row[num], method))
         return statuses
 
+    @staticmethod
+    def _worst_statuses(statuses, other_statuses):
+        """ merge two lists of per-column status maps, picking the most critical status for each word """
+        result = []
+        for st, other in zip(statuses, other_statuses):
+            merged = dict(st)
+            for no in other:
+                merged[no] = max(merged.get(no, COLSTATUS.cs_ok), other[no])
+            result.append(merged)
+        return result
+
     def _calculate_column_types(self, rows):
         result = {}
         if len(rows) > 0:
@@ -688,19 +934,124 @@ class StatCollector(object):
         output['type'] = StatCollector.ident(self)
         if self.__dict__.get('dbname') and self.__dict__.get('dbver'):
             output['name'] = '{0}/{1}'.format(self.dbname, self.dbver)
+        if self.stale:
+            output['stale'] = True
         for r in rows:
-            data.append(self._produce_output_row(r))
+            row = self._produce_output_row(r)
+            if '_max' in r:
+                row['min'] = self._produce_aggregated_output_row(r['_min'])
+                row['max'] = self._produce_aggregated_output_row(r['_max'])
+            data.append(row)
             output['data'] = data
         return json.dumps(output, indent=4)
 
+    def ndjson_output(self, rows, before_string=None, after_string=None):
+        """ The same data as the json output, encoded compactly into a single line. The keys are
+            encoded once, rather than for each row, and the columns always come in the same order.
+        """
+        encode = self.NDJSON_ENCODER.encode
+        result = ['{"type":', encode(StatCollector.ident(self))]
+        if self.__dict__.get('dbname') and self.__dict__.get('dbver'):
+            result += [',"name":', encode('{0}/{1}'.format(self.dbname, self.dbver))]
+        if self.stale:
+            result.append(',"stale":true')
+        result.append(',"data":[')
+        columns = self._ndjson_columns()
+        for i, r in enumerate(rows):
+            if i > 0:
+                result.append(',')
+            row_key = self.row_key(r) if self.keyed_rows else None
+            result.append('{' + ('' if row_key is None else '"_key":' + encode(row_key) + ',') +
+                          ','.join(key + encode(self._produce_output_value(r, col)) for key, col in columns))
+            if '_max' in r:
+                result += [',"min":', encode(self._produce_aggregated_output_row(r['_min'])),
+                           ',"max":', encode(self._produce_aggregated_output_row(r['_max']))]
+            result.append('}')
+        result.append(']}')
+        return ''.join(result)
+
+    def table_output(self, rows, before_string=None, after_string=None):
+        """ The raw values of the rows for the csv and tsv outputs, with neither the widths nor the cooked
+            values to calculate: the output writes them out as they are, the delimiter is up to it.
+        """
+        columns = self.output_transform_data
+        return {'collector': self.ident(), 'header': [self._produce_table_name(col) for col in columns],
+                'rows': [[r.get(self._get_input_column_name(col)) for col in columns] for r in rows]}
+
+    @staticmethod
+    def _produce_table_name(col):
+        """ the output column name with the units of the raw value, rather than of the one shown on the screen """
+        units = col.get('units')
+        if 'fn' in col and col['fn'].__name__ in StatCollector.RAW_UNITS:
+            units = StatCollector.RAW_UNITS[col['fn'].__name__](units or '')
+        return col['out'] + (' ' + units if units else '')
+
+    def metrics(self, rows):
+        """ the samples of the gauges in metrics_data, as the gauge, its labels and the value in the base units """
+        labels = []
+        if self.__dict__.get('dbname') and self.__dict__.get('dbver'):
+            labels.append(('cluster', '{0}/{1}'.format(self.dbname, self.dbver)))
+        result = []
+        for row in rows:
+            row_labels = labels + [(name, row.get(name)) for name in self.metrics_labels]
+            for gauge in self.metrics_data:
+                value = row.get(gauge['in'])
+                if value is not None:
+                    result.append((gauge, row_labels, float(value) * gauge.get('scale', 1)))
+        return result
+
+    def row_key(self, row):
+        """ identify the row across the ticks in the delta-encoded output, None if its position does """
+        return None
+
+    def _ndjson_columns(self):
+        """ the encoded key of each output column, followed by a colon, and the column itself """
+        if self.ndjson_columns is None or self.ndjson_columns[0] != self.show_units:
+            self.ndjson_columns = (self.show_units, [(self.NDJSON_ENCODER.encode(self._produce_output_name(col)) + ':',
+                                                      col) for col in self.output_transform_data])
+        return self.ndjson_columns[1]
+
+    def _produce_aggregated_output_row(self, values):
+        """ produce output columns out of the minimum or maximum values of the aggregated ones """
+        result = {}
+        for col in self.output_transform_data:
+            if self._get_input_column_name(col) in values:
+                result[self._produce_output_name(col)] = self._produce_output_value(values, col)
+        return result
+
     def ncurses_filter_row(self, row):
         return False
 
+    def _rows_in_viewport(self, rows):
+        """ Drop the filtered rows and the ones that don't fit the screen, before any work is done on them.
+            Returns the remaining rows, the offset of the first one and the number of rows we could show.
+        """
+        rows = [r for r in rows if not self.ncurses_filter_row(r)]
+        total = len(rows)
+        offset = min(self.viewport_offset, max(total - 1, 0)) if self.SCROLLABLE else 0
+        end = offset + self.viewport_limit if self.viewport_limit is not None else total
+        if self.sort_key is not None:
+            rows = self._top_rows(rows, end)
+        return rows[offset:end], offset, total
+
+    def _row_groups(self, rows):
+        """ split the rows into groups that stay together when the rows are sorted """
+        return [[r] for r in rows]
+
+    def _top_rows(self, rows, count):
+        """ Order the groups of rows by the sort key of the largest row in each of them. Only the first
+            count rows are displayed, so instead of sorting all of them just select as many groups.
+        """
+        key_fn = self.SORT_KEYS[self.sort_key]
+        groups = heapq.nlargest(count, self._row_groups(rows), key=lambda group: max(key_fn(r) for r in group))
+        return [r for group in groups for r in group]
+
     def ncurses_output(self, rows, before_string=None, after_string=None):
         """ for ncurses - we just return data structures. The output code
             is quite complex and deserves a separate class.
         """
 
+        rows, offset, total = self._rows_in_viewport(rows)
         self._calculate_dynamic_width(rows, method=OUTPUT_METHOD.curses)
 
         raw_result = {}
@@ -718,10 +1069,14 @@ class StatCollector(object):
 
         for r in rows:
             values_row = self._output_row_for_curses(r, 'v')
-            if self.ncurses_filter_row(dict(zip(result_header, values_row))):
-                continue
             cooked_row = self.cook_row(result_header, values_row, method=OUTPUT_METHOD.curses)
             status_row = self._calculate_statuses_for_row(values_row, method=OUTPUT_METHOD.curses)
+            if '_max' in r:
+                # the row shows the average of several samples, color it by the worst of them
+                for extreme in '_min', '_max':
+                    extreme_row = self._output_row_for_curses(dict(r, **r[extreme]), 'v')
+                    status_row = self._worst_statuses(status_row, self._calculate_statuses_for_row(
+                        extreme_row, method=OUTPUT_METHOD.curses))
             result_rows.append(dict(zip(result_header, cooked_row)))
             status_rows.append(dict(zip(result_header, status_row)))
             values_rows.append(dict(zip(result_header, values_row)))
@@ -734,6 +1089,11 @@ class StatCollector(object):
         result['hide'] = self._get_columns_to_hide(result_rows, status_rows)
         result['highlights'] = dict(zip(result_header, self._get_highlights()))
         result['types'] = types_row
+        result['stale'] = self.stale
+        if self.SCROLLABLE:
+            result['viewport'] = {'offset': offset, 'total': total}
+        if self.SORT_KEYS:
+            result['sort'] = {'key': self.sort_key, 'keys': list(self.SORT_KEYS), 'default': self.DEFAULT_ORDER}
         for x in StatCollector.NCURSES_CUSTOM_OUTPUT_FIELDS:
             result[x] = self.ncurses_custom_fields.get(x, None)
         for k in StatCollector.NCURSES_DEFAULTS.keys():
@@ -743,13 +1103,34 @@ class StatCollector(object):
                 result[k] = dict(zip(result_header, raw_result[k]))
         return {self.ident(): result}
 
-    def output(self, method, before_string=None, after_string=None):
+    def output_state(self):
+        """ the display options the output depends on, besides the rows """
+        return (self.show_units, self.ignore_autohide, self.notrim, self.keyed_rows, self.viewport_offset,
+                self.viewport_limit, self.sort_key, self.stale, sorted(self.ncurses_custom_fields.items()))
+
+    def cached_output(self, method, rows):
+        """ The output of the rows to display, formatted again only once they or the display options have
+            changed. The rows derived from them, i.e. the aggregated ones, are formatted every time.
+        """
+        # read before the rows are compared, the sampler might replace them in the meantime
+        version = self.content_version
+        # the csv and tsv outputs write the raw values, those might change while the values shown don't
+        raw = method in (OUTPUT_METHOD.csv, OUTPUT_METHOD.tsv)
+        if rows is not self.rows_snapshot or (raw and self.VERSION_BY_OUTPUT):
+            return self.output(method, rows=rows)
+        key = (version, self.output_state())
+        cached = self.output_cache.get(method)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        result = self.output(method, rows=rows)
+        self.output_cache[method] = (key, result)
+        return result
+
+    def output(self, method, before_string=None, after_string=None, rows=None):
         if method not in self.output_function:
             raise Exception('Output method {0} is not supported'.format(method))
-        if self.produce_diffs:
-            rows = self.rows_diff
-        else:
-            rows = self.rows_cur
+        if rows is None:
+            rows = self.rows_diff if self.produce_diffs else self.rows_cur
         return self.output_function[method](rows, before_string, after_string)
 
     def diff(self):
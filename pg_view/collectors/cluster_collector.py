@@ -0,0 +1,162 @@
+from pg_view.collectors.base_collector import StatCollector
+from pg_view.collectors.partition_collector import PartitionStatCollector
+from pg_view.models.outputs import COLSTATUS, COLALIGN
+from pg_view.utils import OUTPUT_METHOD
+
+
+class ClusterStatCollector(StatCollector):
+    """ Sums up every PostgreSQL cluster in a single line, out of the rows of its processes and partitions
+        collectors. It doesn't collect anything on its own: the clusters that are not expanded to their
+        detailed panels are only asked for the number of connections and their active backends.
+    """
+
+    SCROLLABLE = True
+    # seconds left until the data partition is full, the same thresholds as the partitions output uses
+    UNTIL_FULL_WARNING = 10800
+    UNTIL_FULL_CRITICAL = 3600
+
+    def __init__(self, groups):
+        super(ClusterStatCollector, self).__init__()
+        self.groups = groups
+
+        self.output_transform_data = [
+            {
+                'out': 'cluster',
+                'pos': 0,
+                'noautohide': True,
+                'maxw': 30,
+            },
+            {
+                'out': 'role',
+                'pos': 1,
+                'noautohide': True,
+                'status_fn': self.role_status_fn,
+            },
+            {
+                'out': 'conns',
+                'pos': 2,
+                'noautohide': True,
+                'align': COLALIGN.ca_right,
+            },
+            {
+                'out': 'active',
+                'pos': 3,
+                'noautohide': True,
+                'align': COLALIGN.ca_right,
+            },
+            {
+                'out': 'waiting',
+                'pos': 4,
+                'noautohide': True,
+                'align': COLALIGN.ca_right,
+                'warning': 1,
+            },
+            {
+                'out': 'cpu',
+                'units': '%',
+                'fn': StatCollector.time_diff_to_percent,
+                'round': StatCollector.RD,
+                'pos': 5,
+                'noautohide': True,
+                'align': COLALIGN.ca_right,
+            },
+            {
+                'out': 'read',
+                'in': 'read_bytes',
+                'units': 'MB/s',
+                'fn': StatCollector.bytes_to_mbytes,
+                'round': StatCollector.RD,
+                'pos': 6,
+                'noautohide': True,
+            },
+            {
+                'out': 'write',
+                'in': 'write_bytes',
+                'units': 'MB/s',
+                'fn': StatCollector.bytes_to_mbytes,
+                'round': StatCollector.RD,
+                'pos': 7,
+                'noautohide': True,
+            },
+            {
+                'out': 'disk_left',
+                'in': 'space_left',
+                'fn': self.kb_pretty_print,
+                'pos': 8,
+                'noautohide': True,
+                'align': COLALIGN.ca_right,
+            },
+            {
+                'out': 'status',
+                'pos': 9,
+                'noautohide': True,
+                'status_fn': self.status_fn,
+            },
+        ]
+
+        self.metrics_data = [
+            {'name': 'postgres_connections', 'in': 'conns', 'help': 'Connections to the cluster'},
+            {'name': 'postgres_active_backends', 'in': 'active', 'help': 'Backends running a query'},
+            {'name': 'postgres_waiting_backends', 'in': 'waiting', 'help': 'Backends waiting for a lock'},
+            {'name': 'postgres_cpu_seconds_per_second', 'in': 'cpu', 'help': 'CPU time used by the backends'},
+            {'name': 'postgres_read_bytes_per_second', 'in': 'read_bytes', 'help': 'Data read by the backends'},
+            {'name': 'postgres_written_bytes_per_second', 'in': 'write_bytes', 'help': 'Data written by the backends'},
+        ]
+        self.metrics_labels = ['cluster', 'role']
+
+        self.ncurses_custom_fields = {'header': True}
+        self.ncurses_custom_fields['prefix'] = None
+
+        self.postinit()
+
+    def ident(self):
+        return 'clusters'
+
+    def role_status_fn(self, row, col):
+        if row[self.output_column_positions[col['out']]] == 'offline':
+            return {-1: COLSTATUS.cs_critical}
+        return {-1: COLSTATUS.cs_ok}
+
+    def status_fn(self, row, col):
+        return {-1: {'critical': COLSTATUS.cs_critical, 'warning': COLSTATUS.cs_warning}.get(
+            row[self.output_column_positions[col['out']]], COLSTATUS.cs_ok)}
+
+    def aggregate(self, rows):
+        """ produce a row per cluster out of the snapshot rows of its collectors, given as a dict by collector """
+        result = []
+        for group in sorted(self.groups.values(), key=lambda group: (group['pg'].dbname, group['pg'].dbver)):
+            pg = group['pg']
+            row = {'ident': pg.ident(), 'cluster': '{0}/{1}'.format(pg.dbname, pg.dbver),
+                   'role': pg.role(), 'conns': pg.total_connections,
+                   'active': pg.active_connections, 'waiting': 0, 'cpu': 0, 'read_bytes': 0, 'write_bytes': 0,
+                   'space_left': None}
+            for process in rows.get(pg, []):
+                if process.get('waiting'):
+                    row['waiting'] += 1
+                row['cpu'] += (process.get('utime') or 0) + (process.get('stime') or 0)
+                row['read_bytes'] += process.get('read_bytes') or 0
+                row['write_bytes'] += process.get('write_bytes') or 0
+            until_full = None
+            for partition in rows.get(group['partitions'], []):
+                if partition.get('type') == PartitionStatCollector.DATA_NAME:
+                    row['space_left'] = partition.get('space_left')
+                    until_full = partition.get('time_until_full')
+            row['status'] = self._worst_status(row, until_full)
+            result.append(row)
+        return result
+
+    def _worst_status(self, row, until_full):
+        if row['role'] == 'offline' or until_full is not None and until_full <= self.UNTIL_FULL_CRITICAL:
+            return 'critical'
+        if row['waiting'] > 0 or until_full is not None and until_full <= self.UNTIL_FULL_WARNING:
+            return 'warning'
+        return 'ok'
+
+    def output(self, method, rows=None):
+        result = super(ClusterStatCollector, self).output(method, before_string='PostgreSQL clusters:',
+                                                          after_string='\n', rows=rows)
+        if method == OUTPUT_METHOD.curses and rows:
+            # the cluster on top of the scrolled list is the one expanded or collapsed with Enter
+            offset = result[self.ident()]['viewport']['offset']
+            result[self.ident()]['cursor'] = rows[offset]['ident']
+        return result
@@ -12,6 +12,8 @@ class HostStatCollector(StatCollector):
 
     """ General system-wide statistics """
 
+    NAME = 'host'
+    VERSION_BY_OUTPUT = True
     UPTIME_FILE = '/proc/uptime'
 
     def __init__(self):
@@ -61,6 +63,7 @@ class HostStatCollector(StatCollector):
         ]
 
         self.ncurses_custom_fields = {'header': False, 'prefix': None, 'prepend_column_headers': False}
+        self.static_data = None
 
         self.postinit()
 
@@ -68,11 +71,18 @@ class HostStatCollector(StatCollector):
         raw_result = {}
         raw_result.update(self._read_uptime())
         raw_result.update(self._read_load_average())
-        raw_result.update(self._read_hostname())
-        raw_result.update(self._read_uname())
-        raw_result.update(self._read_cpus())
+        if self.static_data is None:
+            # host name, kernel and the number of cores don't change while we are running
+            self.static_data = {}
+            self.static_data.update(self._read_hostname())
+            self.static_data.update(self._read_uname())
+            self.static_data.update(self._read_cpus())
+        raw_result.update(self.static_data)
         self._do_refresh([raw_result])
 
+    def invalidate_static_data(self):
+        self.static_data = None
+
     def _read_load_average(self):
         return self._transform_list(os.getloadavg())
 
@@ -150,5 +160,6 @@ class HostStatCollector(StatCollector):
         uname_row = os.uname()
         return self._transform_input(uname_row, self.transform_uname_data)
 
-    def output(self, method):
-        return super(self.__class__, self).output(method, before_string='Host statistics', after_string='\n')
+    def output(self, method, rows=None):
+        return super(self.__class__, self).output(method, before_string='Host statistics', after_string='\n',
+                                                  rows=rows)
@@ -5,6 +5,8 @@ from pg_view.loggers import logger
 class MemoryStatCollector(StatCollector):
     """ Collect memory-related statistics """
 
+    NAME = 'memory'
+    VERSION_BY_OUTPUT = True
     MEMORY_STAT_FILE = '/proc/meminfo'
 
     def __init__(self):
@@ -40,6 +42,20 @@ class MemoryStatCollector(StatCollector):
             },
         ]
 
+        self.metrics_data = [
+            {'name': 'memory_total_bytes', 'in': 'total', 'scale': 1024, 'help': 'Total usable memory'},
+            {'name': 'memory_free_bytes', 'in': 'free', 'scale': 1024, 'help': 'Memory not used at all'},
+            {'name': 'memory_buffers_bytes', 'in': 'buffers', 'scale': 1024, 'help': 'Memory used by the buffers'},
+            {'name': 'memory_cached_bytes', 'in': 'cached', 'scale': 1024, 'help': 'Memory used by the page cache'},
+            {'name': 'memory_dirty_bytes', 'in': 'dirty', 'scale': 1024, 'help': 'Memory waiting to be written'},
+            {'name': 'memory_commit_limit_bytes', 'in': 'commit_limit', 'scale': 1024,
+             'help': 'Memory that can be allocated'},
+            {'name': 'memory_committed_as_bytes', 'in': 'committed_as', 'scale': 1024,
+             'help': 'Memory the workload would need in the worst case'},
+            {'name': 'memory_commit_left_bytes', 'in': 'commit_left', 'scale': 1024,
+             'help': 'Memory left to allocate until the commit limit'},
+        ]
+
         self.output_transform_data = [
             {
                 'out': 'total',
@@ -154,5 +170,6 @@ class MemoryStatCollector(StatCollector):
             self.warn_non_optional_column(colname)
         return result
 
-    def output(self, method):
-        return super(self.__class__, self).output(method, before_string='Memory statistics:', after_string='\n')
+    def output(self, method, rows=None):
+        return super(self.__class__, self).output(method, before_string='Memory statistics:', after_string='\n',
+                                                  rows=rows)
@@ -17,6 +17,7 @@ if sys.hexversion >= 0x03000000:
 class PartitionStatCollector(StatCollector):
     """Collect statistics about PostgreSQL partitions """
 
+    NAME = 'partitions'
     DISK_STAT_FILE = '/proc/diskstats'
     DATA_NAME = 'data'
     XLOG_NAME = 'xlog'
@@ -51,6 +52,24 @@ class PartitionStatCollector(StatCollector):
             {'out': 'await'},
         ]
 
+        self.metrics_data = [
+            {'name': 'partition_size_bytes', 'in': 'space_total', 'scale': 1024, 'help': 'Size of the partition'},
+            {'name': 'partition_free_bytes', 'in': 'space_left', 'scale': 1024, 'help': 'Space left on the partition'},
+            {'name': 'partition_seconds_until_full', 'in': 'time_until_full',
+             'help': 'Time until the partition is full at the current fill rate'},
+            {'name': 'partition_read_bytes_per_second', 'in': 'read', 'scale': 512,
+             'help': 'Data read from the partition per second'},
+            {'name': 'partition_written_bytes_per_second', 'in': 'write', 'scale': 512,
+             'help': 'Data written to the partition per second'},
+            {'name': 'partition_io_busy_ratio', 'in': 'await', 'scale': 0.001,
+             'help': 'Share of the time the device was busy with I/O'},
+            {'name': 'directory_size_bytes', 'in': 'path_size', 'scale': 1024,
+             'help': 'Size of the data or the WAL directory'},
+            {'name': 'directory_fill_bytes_per_second', 'in': 'path_fill_rate', 'scale': 1024,
+             'help': 'Growth of the data or the WAL directory per second'},
+        ]
+        self.metrics_labels = ['type']
+
         self.output_transform_data = [
             {'out': 'type', 'pos': 0, 'noautohide': True},
             {'out': 'dev', 'pos': 1, 'noautohide': True},
@@ -194,16 +213,18 @@ class PartitionStatCollector(StatCollector):
             fp and fp.close()
         return result
 
-    def output(self, method):
-        return super(self.__class__, self).output(method, before_string='PostgreSQL partitions:', after_string='\n')
+    def output(self, method, rows=None):
+        return super(self.__class__, self).output(method, before_string='PostgreSQL partitions:', after_string='\n',
+                                                  rows=rows)
 
 
 class DetachedDiskStatCollector(Process):
     """ This class runs in a separate process and runs du and df """
 
-    def __init__(self, q, work_directories):
+    def __init__(self, q, work_directories, ticks_per_refresh=1):
         super(DetachedDiskStatCollector, self).__init__()
         self.work_directories = work_directories
+        self.ticks_per_refresh = ticks_per_refresh
         self.q = q
         self.daemon = True
         self.df_cache = {}
@@ -219,7 +240,7 @@ class DetachedDiskStatCollector(Process):
                 df_data = self.get_df_data(wd)
                 result[wd] = [du_data, df_data]
             self.q.put(result)
-            time.sleep(consts.TICK_LENGTH)
+            time.sleep(consts.TICK_LENGTH * self.ticks_per_refresh)
 
     def get_du_data(self, wd):
         data_size = 0
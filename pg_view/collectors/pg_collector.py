@@ -1,12 +1,18 @@
+import bisect
+import heapq
+import random
 import re
 import sys
+from collections import OrderedDict
+from threading import Thread
 
 import psycopg2
 
 from pg_view.collectors.base_collector import StatCollector
+from pg_view.collectors.pg_group_collector import PgGroupStatCollector
 from pg_view.loggers import logger
 from pg_view.models.outputs import COLSTATUS, COLALIGN
-from pg_view.utils import MEM_PAGE_SIZE, dbversion_as_float
+from pg_view.utils import MEM_PAGE_SIZE, OUTPUT_METHOD, dbversion_as_float, monotonic
 
 if sys.hexversion >= 0x03000000:
     long = int
@@ -18,9 +24,23 @@ else:
 class PgstatCollector(StatCollector):
     """ Collect PostgreSQL-related statistics """
 
+    NAME = 'postgres'
     STATM_FILENAME = '/proc/{0}/statm'
-
-    def __init__(self, pgcon, reconnect, pid, dbname, dbver, always_track_pids):
+    SCROLLABLE = True
+    # the processes are ordered by the transaction age unless asked otherwise
+    SORT_KEYS = OrderedDict([
+        ('cpu', lambda row: (row.get('utime') or 0) + (row.get('stime') or 0)),
+        ('read', lambda row: row.get('read_bytes') or 0),
+        ('write', lambda row: row.get('write_bytes') or 0),
+        ('uss', lambda row: row.get('uss') or 0),
+    ])
+    DEFAULT_ORDER = 'age'
+    GROUP_COLUMNS = tuple(PgGroupStatCollector.GROUP_HEADERS)
+    # delay between reconnection attempts, doubled after every failure
+    RECONNECT_MIN_DELAY = 1
+    RECONNECT_MAX_DELAY = 60
+
+    def __init__(self, pgcon, reconnect, pid, dbname, dbver, always_track_pids, idle_budget=None):
         super(PgstatCollector, self).__init__()
         self.postmaster_pid = pid
         self.pgcon = pgcon
@@ -28,17 +48,34 @@ class PgstatCollector(StatCollector):
         self.pids = []
         self.rows_diff = []
         self.rows_diff_output = []
-        # figure out our backend pid
-        self.connection_pid = pgcon.get_backend_pid()
-        self.max_connections = self._get_max_connections()
-        self.recovery_status = self._get_recovery_status()
+        # figure out our backend pid, there is no connection when a recording is played back
+        self.connection_pid = pgcon.get_backend_pid() if pgcon else None
+        self.max_connections = self._get_max_connections() if pgcon else 0
+        self.recovery_status = self._get_recovery_status() if pgcon else 'unknown'
         self.always_track_pids = always_track_pids
         self.dbname = dbname
         self.dbver = dbver
-        self.server_version = pgcon.get_parameter_status('server_version')
+        self.server_version = pgcon.get_parameter_status('server_version') if pgcon else None
+        # the state recorded along with the rows being played back
+        self.replayed = None
         self.filter_aux_processes = True
         self.total_connections = 0
         self.active_connections = 0
+        # state of the background reconnection attempts
+        self.reconnect_worker = None
+        self.reconnect_result = None
+        self.reconnect_failures = 0
+        self.next_reconnect_time = 0
+        # number of idle backends to read /proc for on each tick, all of them if None
+        self.idle_budget = idle_budget
+        self.idle_samples = {}
+        self.idle_last_sampled = 0
+        # the processes are only collected one by one while somebody looks at them, see request_details
+        self.details_until = None
+        self.details_lease = 5
+        # aggregated view of the processes, enabled by choosing a column to group them by
+        self.group_by = None
+        self.grouped = PgGroupStatCollector(self)
 
         self.transform_list_data = [
             {'out': 'pid', 'in': 0, 'fn': int},
@@ -71,6 +108,7 @@ class PgstatCollector(StatCollector):
             {'out': 'type', 'diff': False},
             {'out': 'state', 'diff': False},
             {'out': 'priority', 'diff': False},
+            {'out': 'starttime', 'diff': False},
             {'out': 'utime'},
             {'out': 'stime'},
             {'out': 'guest_time'},
@@ -81,6 +119,8 @@ class PgstatCollector(StatCollector):
             {'out': 'age', 'diff': False},
             {'out': 'datname', 'diff': False},
             {'out': 'usename', 'diff': False},
+            {'out': 'client_addr', 'diff': False},
+            {'out': 'application_name', 'diff': False},
             {'out': 'waiting', 'diff': False},
             {'out': 'locked_by', 'diff': False},
             {'out': 'query', 'diff': False},
@@ -208,6 +248,19 @@ class PgstatCollector(StatCollector):
             },
         ]
 
+        # the backends are only exported on request, and just the busiest ones: their pids come and go
+        self.metrics_backends = 0
+        self.metrics_data = [
+            {'name': 'backend_cpu_user_ratio', 'in': 'utime', 'help': 'Share of the CPU time used in the user mode'},
+            {'name': 'backend_cpu_system_ratio', 'in': 'stime',
+             'help': 'Share of the CPU time used in the kernel mode'},
+            {'name': 'backend_read_bytes_per_second', 'in': 'read_bytes', 'help': 'Data read per second'},
+            {'name': 'backend_written_bytes_per_second', 'in': 'write_bytes', 'help': 'Data written per second'},
+            {'name': 'backend_uss_bytes', 'in': 'uss', 'help': 'Memory used by the backend alone'},
+            {'name': 'backend_transaction_age_seconds', 'in': 'age', 'help': 'Age of the current transaction'},
+        ]
+        self.metrics_labels = ['pid', 'type', 'datname', 'usename']
+
         self.ncurses_custom_fields = {'header': True}
         self.ncurses_custom_fields['prefix'] = None
 
@@ -258,6 +311,17 @@ class PgstatCollector(StatCollector):
     def ident(self):
         return '{0} ({1}/{2})'.format('postgres', self.dbname, self.dbver)
 
+    def sample_key(self, idx, row):
+        return row['pid']
+
+    def metrics(self, rows):
+        return super(PgstatCollector, self).metrics(heapq.nlargest(self.metrics_backends, rows,
+                                                                   key=self.SORT_KEYS['cpu']))
+
+    def row_key(self, row):
+        # pids are reused, the start time tells a new process from the one gone
+        return 'idle' if row['pid'] is None else '{0}:{1}'.format(row['pid'], row.get('starttime'))
+
     @staticmethod
     def _get_psinfo(cmdline):
         """ gets PostgreSQL process type from the command-line."""
@@ -293,21 +357,37 @@ class PgstatCollector(StatCollector):
         else:
             return False
 
+    def request_details(self):
+        """ keep collecting every process for a while, the cluster summary only needs the active ones """
+        if self.details_until is not None:
+            self.details_until = monotonic() + self.details_lease
+
+    def keep_details(self):
+        """ collect every process until pg_view exits, for those who read all the rows rather than look at them """
+        self.details_until = None
+
+    def details_requested(self):
+        return self.details_until is None or monotonic() < self.details_until
+
     def refresh(self):
         """ Reads data from /proc and PostgreSQL stats """
         result = []
-        # fetch up-to-date list of subprocess PIDs
-        self.get_subprocesses_pid()
+        detailed = self.details_requested()
+        if detailed:
+            # fetch up-to-date list of subprocess PIDs
+            self.get_subprocesses_pid()
+        # if we've lost the connection, don't wait for the server here: the connection
+        # is re-established in the background and we stay offline until it succeeds.
+        if not self.pgcon and not self._check_reconnect():
+            self._do_refresh([])
+            return
         try:
-            if not self.pgcon:
-                # if we've lost the connection, try to reconnect and
-                # re-initialize all connection invariants
-                self.pgcon, self.postmaster_pid = self.reconnect()
-                self.connection_pid = self.pgcon.get_backend_pid()
-                self.max_connections = self._get_max_connections()
-                self.dbver = dbversion_as_float(self.pgcon)
-                self.server_version = self.pgcon.get_parameter_status('server_version')
-            stat_data = self._read_pg_stat_activity()
+            if detailed:
+                stat_data = self._read_pg_stat_activity()
+            else:
+                stat_data = self._read_active_backends()
+                # the auxiliary processes and idle backends are left out
+                self.pids = sorted(stat_data)
         except psycopg2.OperationalError as e:
             logger.info("failed to query the server: {}".format(e))
             if self.pgcon and not self.pgcon.closed:
@@ -316,11 +396,15 @@ class PgstatCollector(StatCollector):
             self._do_refresh([])
             return
         logger.info("new refresh round")
+        idle_pids = []
         for pid in self.pids:
             if pid == self.connection_pid:
                 continue
             is_backend = pid in stat_data
-            is_active = is_backend and (stat_data[pid]['query'] != 'idle' or pid in self.always_track_pids)
+            is_active = is_backend and (stat_data[pid].get('query') != 'idle' or pid in self.always_track_pids)
+            if is_backend and not is_active and self.idle_budget is not None:
+                idle_pids.append(pid)
+                continue
             result_row = {}
             # for each pid, get hash row from /proc/
             proc_data = self._read_proc(pid, is_backend, is_active)
@@ -332,9 +416,93 @@ class PgstatCollector(StatCollector):
             # result is not empty - add it to the list of current rows
             if result_row:
                 result.append(result_row)
+        if self.idle_budget is not None:
+            result.extend(self._sample_idle_backends(idle_pids, stat_data))
         # and refresh the rows with this data
         self._do_refresh(result)
 
+    def _sample_idle_backends(self, pids, stat_data):
+        """ Read /proc for at most idle_budget of the idle backends, taking turns in the pid order, and
+            reuse the values read before for the others. Only the state and the memory usage are kept:
+            the cpu and I/O counters of a process sampled once in a while would produce bogus rates.
+        """
+        pids.sort()
+        samples = dict((pid, self.idle_samples[pid]) for pid in pids if pid in self.idle_samples)
+        # continue right after the backend sampled last on the previous tick
+        start = bisect.bisect_right(pids, self.idle_last_sampled)
+        for pid in (pids[start:] + pids[:start])[:self.idle_budget]:
+            samples[pid] = self._read_idle_proc(pid)
+            self.idle_last_sampled = pid
+        self.idle_samples = samples
+
+        result = []
+        for pid in pids:
+            result_row = {'pid': pid, 'type': 'backend'}
+            result_row.update(samples.get(pid) or {})
+            result_row.update(stat_data[pid])
+            result.append(result_row)
+        return result
+
+    def _read_idle_proc(self, pid):
+        """ read the state and the memory usage of an idle backend, None if it is gone """
+        fp = None
+        try:
+            fp = open('/proc/{0}/stat'.format(pid), 'r')
+            stat = fp.read().strip().split()
+        except IOError:
+            logger.warning('Unable to read /proc/{0}/stat, process data will be unavailable'.format(pid))
+            return None
+        finally:
+            fp and fp.close()
+        return {'state': self._transform_input(stat).get('state'), 'uss': self._get_memory_usage(pid)}
+
+    def _check_reconnect(self):
+        """ Pick up the result of the background reconnection attempt, or start a new one once
+            the backoff delay expires. Returns True if the connection has been re-established.
+        """
+        if self.reconnect_worker is not None:
+            if self.reconnect_worker.is_alive():
+                return False
+            self.reconnect_worker = None
+            if isinstance(self.reconnect_result, Exception):
+                # exponential backoff with jitter, so that multiple collectors don't hammer the server in sync
+                delay = min(self.RECONNECT_MAX_DELAY, self.RECONNECT_MIN_DELAY * 2 ** self.reconnect_failures)
+                delay *= random.uniform(0.5, 1)
+                self.reconnect_failures += 1
+                self.next_reconnect_time = monotonic() + delay
+                logger.info('failed to reconnect to {0}: {1}, next attempt in {2:.1f}s'.format(
+                    self.dbname, self.reconnect_result, delay))
+                return False
+            # re-initialize all connection invariants
+            (self.pgcon, self.postmaster_pid, self.connection_pid, self.max_connections, self.dbver,
+             self.server_version) = self.reconnect_result
+            self.reconnect_failures = 0
+            self.next_reconnect_time = 0
+            return True
+        if monotonic() >= self.next_reconnect_time:
+            self.reconnect_result = None
+            self.reconnect_worker = Thread(target=self._reconnect_in_background,
+                                           name='reconnect-{0}'.format(self.dbname))
+            self.reconnect_worker.daemon = True
+            self.reconnect_worker.start()
+        return False
+
+    def _reconnect_in_background(self):
+        """ Establish a new connection and read its invariants, runs in a separate thread """
+        pgcon = None
+        try:
+            pgcon, postmaster_pid = self.reconnect()
+            self.reconnect_result = (pgcon, postmaster_pid, pgcon.get_backend_pid(), self._get_max_connections(pgcon),
+                                     dbversion_as_float(pgcon), pgcon.get_parameter_status('server_version'))
+        except Exception as e:
+            # don't leave a connection behind on every attempt against a server that is in trouble already
+            if pgcon is not None:
+                try:
+                    pgcon.close()
+                except Exception:
+                    pass
+            self.reconnect_result = e
+
     def _read_proc(self, pid, is_backend, is_active):
         """ see man 5 proc for details (/proc/[pid]/stat) """
         result = {}
@@ -408,10 +576,10 @@ class PgstatCollector(StatCollector):
             uss = (long(statm[1]) - long(statm[2])) * MEM_PAGE_SIZE
         return uss
 
-    def _get_max_connections(self):
+    def _get_max_connections(self, pgcon=None):
         """ Read max connections from the database """
 
-        cur = self.pgcon.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur = (pgcon or self.pgcon).cursor(cursor_factory=psycopg2.extras.RealDictCursor)
         cur.execute('show max_connections')
         result = cur.fetchone()
         cur.close()
@@ -426,6 +594,43 @@ class PgstatCollector(StatCollector):
         cur.close()
         return result.get('role', 'unknown')
 
+    def _read_active_backends(self):
+        """ Count the connections and read just the active backends from pg_stat_activity, that's all
+            the cluster summary needs. Unlike the full query, there is no join with pg_locks.
+        """
+        cur = self.pgcon.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        cur.execute("""
+                SELECT count(*) AS total,
+                       CASE WHEN pg_is_in_recovery() THEN 'standby' ELSE 'master' END AS role
+                  FROM pg_stat_activity
+            """)
+        result = cur.fetchone()
+        self.total_connections = int(result['total'])
+        self.recovery_status = result['role']
+        if self.dbver < 9.2:
+            cur.execute("""
+                    SELECT procpid AS pid, waiting
+                      FROM pg_stat_activity
+                     WHERE current_query != '<IDLE>' AND procpid != pg_backend_pid()
+                """)
+        elif self.dbver < 9.6:
+            cur.execute("""
+                    SELECT pid, waiting
+                      FROM pg_stat_activity
+                     WHERE state != 'idle' AND pid != pg_backend_pid()
+                """)
+        else:
+            cur.execute("""
+                    SELECT pid, wait_event IS NOT NULL AS waiting
+                      FROM pg_stat_activity
+                     WHERE state != 'idle' AND pid != pg_backend_pid()
+                """)
+        ret = dict((r['pid'], r) for r in cur.fetchall())
+        self.active_connections = len(ret)
+        self.pgcon.commit()
+        cur.close()
+        return ret
+
     def _read_pg_stat_activity(self):
         """ Read data from pg_stat_activity """
 
@@ -441,6 +646,7 @@ class PgstatCollector(StatCollector):
                            usename,
                            client_addr,
                            client_port,
+                           application_name,
                            round(extract(epoch from (now() - xact_start))) as age,
                            waiting,
                            string_agg(other.pid::TEXT, ',' ORDER BY other.pid) as locked_by,
@@ -484,7 +690,7 @@ class PgstatCollector(StatCollector):
                                                       AND this.objsubid = other.objsubid))
                                                    )
                       WHERE procpid != pg_backend_pid()
-                      GROUP BY 1,2,3,4,5,6,7,9
+                      GROUP BY 1,2,3,4,5,6,7,8,10
                 """)
         elif self.dbver < 9.6:
             cur.execute("""
@@ -493,6 +699,7 @@ class PgstatCollector(StatCollector):
                            usename,
                            client_addr,
                            client_port,
+                           application_name,
                            round(extract(epoch from (now() - xact_start))) as age,
                            waiting,
                            string_agg(other.pid::TEXT, ',' ORDER BY other.pid) as locked_by,
@@ -533,7 +740,7 @@ class PgstatCollector(StatCollector):
                                                       AND this.objsubid = other.objsubid))
                                                    )
                       WHERE a.pid != pg_backend_pid()
-                      GROUP BY 1,2,3,4,5,6,7,9
+                      GROUP BY 1,2,3,4,5,6,7,8,10
                 """)
         else:
             cur.execute("""
@@ -542,6 +749,7 @@ class PgstatCollector(StatCollector):
                            usename,
                            client_addr,
                            client_port,
+                           application_name,
                            round(extract(epoch from (now() - xact_start))) as age,
                            CASE WHEN wait_event IS NULL THEN false ELSE true END as waiting,
                            string_agg(other.pid::TEXT, ',' ORDER BY other.pid) as locked_by,
@@ -582,7 +790,7 @@ class PgstatCollector(StatCollector):
                                                       AND this.objsubid = other.objsubid))
                                                    )
                       WHERE a.pid != pg_backend_pid()
-                      GROUP BY 1,2,3,4,5,6,7,9
+                      GROUP BY 1,2,3,4,5,6,7,8,10
             """)
         results = cur.fetchall()
         # fill in the number of total connections, including ourselves
@@ -603,54 +811,82 @@ class PgstatCollector(StatCollector):
         cur.close()
         return ret
 
+    def role(self):
+        """ master or standby, offline when we are not connected """
+        if self.replayed is not None:
+            return self.replayed.get('role', 'offline')
+        return self.recovery_status if self.pgcon else 'offline'
+
+    def recorded_state(self):
+        state = super(PgstatCollector, self).recorded_state()
+        state.update(role=self.role(), prefix=self.ncurses_produce_prefix(), total_connections=self.total_connections,
+                     active_connections=self.active_connections)
+        return state
+
+    def restore_state(self, state):
+        super(PgstatCollector, self).restore_state(state)
+        self.replayed = state
+        self.total_connections = state.get('total_connections', 0)
+        self.active_connections = state.get('active_connections', 0)
+
     def ncurses_produce_prefix(self):
+        if self.replayed is not None:
+            return self.replayed.get('prefix', '{0} {1} (no data)\n'.format(self.dbname, self.dbver))
         if self.pgcon:
-            return "{dbname} {version} {role} connections: {conns} of {max_conns} allocated, {active_conns} active\n". \
+            return "{dbname} {version} {role} connections: {conns} of {max_conns} allocated, {active_conns} active" \
+                   "{stale}\n". \
                 format(dbname=self.dbname,
                        version=self.server_version,
                        role=self.recovery_status,
                        conns=self.total_connections,
                        max_conns=self.max_connections,
-                       active_conns=self.active_connections)
+                       active_conns=self.active_connections,
+                       stale=(' (stale)' if self.stale else ''))
         else:
-            return "{dbname} {version} (offline)\n". \
+            if self.reconnect_worker is not None:
+                state = 'reconnecting'
+            else:
+                state = 'reconnecting in {0}s'.format(max(int(round(self.next_reconnect_time - monotonic())), 0))
+            return "{dbname} {version} (offline, {state})\n". \
                 format(dbname=self.dbname,
-                       version=self.server_version)
+                       version=self.server_version,
+                       state=state)
 
     @staticmethod
     def process_sort_key(process):
         return process['age'] if process['age'] is not None else maxsize
 
     def diff(self):
-        """ we only diff backend processes if new one is not idle and use pid to identify processes """
+        """ diff the processes, identified by pid, and order them for display: idle backends last """
 
         self.rows_diff = []
         self.running_diffs = []
         self.blocked_diffs = {}
+        # idle backends are only shown in the grouped view, they go after all others
+        idle_diffs = []
+        rows_prev = dict((x['pid'], x) for x in self.rows_prev)
         for cur in self.rows_cur:
-            if 'query' not in cur or cur['query'] != 'idle' or cur['pid'] in self.always_track_pids:
-                # look for the previous row corresponding to the current one
-                for x in self.rows_prev:
-                    if x['pid'] == cur['pid']:
-                        prev = x
-                        break
+            # look for the previous row corresponding to the current one
+            prev = rows_prev.get(cur['pid'])
+            if prev is None:
+                continue
+            # now we have a previous and a current row - do the diff
+            candidate = self._produce_diff_row(prev, cur)
+            if candidate is not None and len(candidate) > 0:
+                if self._is_idle(candidate):
+                    idle_diffs.append(candidate)
+                elif candidate['locked_by'] is None:
+                    self.running_diffs.append(candidate)
                 else:
-                    continue
-                # now we have a previous and a current row - do the diff
-                candidate = self._produce_diff_row(prev, cur)
-                if candidate is not None and len(candidate) > 0:
-                    if candidate['locked_by'] is None:
-                        self.running_diffs.append(candidate)
+                    # when determining the position where to put the blocked process,
+                    # only consider the first blocker. This will provide consustent
+                    # results for multiple processes blocked by the same set of blockers,
+                    # since the list is sorted by pid.
+                    block_pid = int(candidate['locked_by'].split(',')[0])
+                    if block_pid not in self.blocked_diffs:
+                        self.blocked_diffs[block_pid] = [candidate]
                     else:
-                        # when determining the position where to put the blocked process,
-                        # only consider the first blocker. This will provide consustent
-                        # results for multiple processes blocked by the same set of blockers,
-                        # since the list is sorted by pid.
-                        block_pid = int(candidate['locked_by'].split(',')[0])
-                        if block_pid not in self.blocked_diffs:
-                            self.blocked_diffs[block_pid] = [candidate]
-                        else:
-                            self.blocked_diffs[block_pid].append(candidate)
+                        self.blocked_diffs[block_pid].append(candidate)
         # order the result rows by the start time value
         if len(self.blocked_diffs) == 0:
             self.rows_diff = self.running_diffs
@@ -680,6 +916,62 @@ class PgstatCollector(StatCollector):
                         if child_row['pid'] in self.blocked_diffs:
                             blocked_temp.extend(self.blocked_diffs[child_row['pid']])
                             del self.blocked_diffs[child_row['pid']]
+        self.rows_diff.extend(idle_diffs)
+
+    def _is_idle(self, row):
+        return row.get('query') == 'idle' and row['pid'] not in self.always_track_pids
+
+    def _collapse_idle(self, rows):
+        """ hide the idle backends, in the budgeted mode they are summed up in a single row at the end """
+        result = [r for r in rows if not self._is_idle(r)]
+        if self.idle_budget is not None and len(result) < len(rows):
+            idle_rows = [r for r in rows if self._is_idle(r)]
+            result.append({'pid': None, 'type': 'backend', 'locked_by': None, 'waiting': False,
+                           'uss': sum(r.get('uss') or 0 for r in idle_rows),
+                           'query': '{0} idle backends'.format(len(idle_rows))})
+        return result
 
-    def output(self, method):
-        return super(self.__class__, self).output(method, before_string='PostgreSQL processes:', after_string='\n')
+    def _row_groups(self, rows):
+        """ keep the processes blocked by another one with the blocker, the first one of them as diff does """
+        groups = []
+        by_pid = {}
+        for row in rows:
+            blocker = int(row['locked_by'].split(',')[0]) if row.get('locked_by') else None
+            if blocker in by_pid:
+                group = by_pid[blocker]
+                group.append(row)
+            else:
+                # the blocker isn't there, i.e. it is gone or comes later than the blocked one
+                group = [row]
+                groups.append(group)
+            by_pid[row.get('pid')] = group
+        return groups
+
+    def set_group_by(self, column):
+        """ show the processes aggregated by one of the GROUP_COLUMNS, or one by one if it is None """
+        self.group_by = column if column in self.GROUP_COLUMNS else None
+        if self.group_by is not None:
+            self.grouped.set_group_by(self.group_by)
+
+    def output_state(self):
+        return super(PgstatCollector, self).output_state() + (self.group_by, self.filter_aux_processes)
+
+    def output(self, method, rows=None):
+        if rows is None:
+            rows = self.rows_diff
+        if self.group_by is not None:
+            # the grouped view is displayed with the options of the per-process one
+            grouped = self.grouped
+            grouped.set_units_display(self.show_units)
+            grouped.set_ignore_autohide(self.ignore_autohide)
+            grouped.set_notrim(self.notrim)
+            grouped.set_viewport(self.viewport_offset, self.viewport_limit)
+            grouped.set_sort_key(self.sort_key)
+            grouped.stale = self.stale
+            result = grouped.output(method, rows=grouped.aggregate(rows))
+        else:
+            result = super(self.__class__, self).output(method, before_string='PostgreSQL processes:',
+                                                        after_string='\n', rows=self._collapse_idle(rows))
+        if method == OUTPUT_METHOD.curses:
+            result[self.ident()]['group'] = {'column': self.group_by, 'columns': list(self.GROUP_COLUMNS)}
+        return result
@@ -0,0 +1,156 @@
+from collections import OrderedDict
+
+from pg_view.collectors.base_collector import StatCollector
+from pg_view.models.outputs import COLALIGN
+
+
+class PgGroupStatCollector(StatCollector):
+    """ Aggregates the diffed rows of the PostgreSQL processes into one row per database, user, client
+        address or application name. It doesn't collect anything on its own, the PostgreSQL collector
+        passes its rows through it when the grouped view is enabled.
+    """
+
+    SCROLLABLE = True
+    SORT_KEYS = OrderedDict([
+        ('cpu', lambda row: row['cpu']),
+        ('read', lambda row: row['read_bytes']),
+        ('write', lambda row: row['write_bytes']),
+        ('uss', lambda row: row['uss']),
+    ])
+    DEFAULT_ORDER = 'count'
+    # header of the group column for each of the columns the rows can be grouped by
+    GROUP_HEADERS = OrderedDict([('datname', 'db'), ('usename', 'user'), ('client_addr', 'client'),
+                                 ('application_name', 'app')])
+
+    def __init__(self, parent):
+        super(PgGroupStatCollector, self).__init__()
+        self.parent = parent
+        # name the cluster in the JSON output, the way the per-process output does
+        self.dbname = parent.dbname
+        self.dbver = parent.dbver
+        self.group_by = 'datname'
+
+        self.output_transform_data = [
+            {
+                'out': 'db',
+                'in': 'group',
+                'pos': 0,
+                'noautohide': True,
+                'maxw': 30,
+            },
+            {
+                'out': 'count',
+                'pos': 1,
+                'noautohide': True,
+                'align': COLALIGN.ca_right,
+            },
+            {
+                'out': 'active',
+                'pos': 2,
+                'noautohide': True,
+                'align': COLALIGN.ca_right,
+            },
+            {
+                'out': 'idle',
+                'pos': 3,
+                'noautohide': True,
+                'align': COLALIGN.ca_right,
+            },
+            {
+                'out': 'idle_tx',
+                'pos': 4,
+                'noautohide': True,
+                'align': COLALIGN.ca_right,
+                'warning': 1,
+            },
+            {
+                'out': 'waiting',
+                'pos': 5,
+                'noautohide': True,
+                'align': COLALIGN.ca_right,
+                'warning': 1,
+            },
+            {
+                'out': 'cpu',
+                'units': '%',
+                'fn': StatCollector.time_diff_to_percent,
+                'round': StatCollector.RD,
+                'pos': 6,
+                'noautohide': True,
+                'align': COLALIGN.ca_right,
+            },
+            {
+                'out': 'read',
+                'in': 'read_bytes',
+                'units': 'MB/s',
+                'fn': StatCollector.bytes_to_mbytes,
+                'round': StatCollector.RD,
+                'pos': 7,
+                'noautohide': True,
+            },
+            {
+                'out': 'write',
+                'in': 'write_bytes',
+                'units': 'MB/s',
+                'fn': StatCollector.bytes_to_mbytes,
+                'round': StatCollector.RD,
+                'pos': 8,
+                'noautohide': True,
+            },
+            {
+                'out': 'uss',
+                'units': 'MB',
+                'fn': StatCollector.bytes_to_mbytes,
+                'round': StatCollector.RD,
+                'pos': 9,
+                'noautohide': True,
+            },
+        ]
+
+        self.ncurses_custom_fields = {'header': True}
+        self.ncurses_custom_fields['prefix'] = None
+
+        self.postinit()
+
+    def ident(self):
+        # take the place of the per-process output of the cluster
+        return self.parent.ident()
+
+    def set_group_by(self, column):
+        self.group_by = column
+        self.output_transform_data[0]['out'] = self.GROUP_HEADERS[column]
+        self.output_column_positions = self._calculate_output_column_positions()
+        self.ndjson_columns = None
+
+    def aggregate(self, rows):
+        """ produce the group rows in a single pass over the process rows, the largest groups go first """
+        groups = {}
+        for row in rows:
+            if row.get('type') != 'backend':
+                continue
+            key = row.get(self.group_by)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {'group': key if key is not None else '', 'count': 0, 'active': 0,
+                                       'idle': 0, 'idle_tx': 0, 'waiting': 0, 'cpu': 0, 'read_bytes': 0,
+                                       'write_bytes': 0, 'uss': 0}
+            group['count'] += 1
+            query = row.get('query') or ''
+            if query == 'idle':
+                group['idle'] += 1
+            elif query.startswith('idle in transaction'):
+                group['idle_tx'] += 1
+            else:
+                group['active'] += 1
+            if row.get('waiting'):
+                group['waiting'] += 1
+            group['cpu'] += (row.get('utime') or 0) + (row.get('stime') or 0)
+            group['read_bytes'] += row.get('read_bytes') or 0
+            group['write_bytes'] += row.get('write_bytes') or 0
+            group['uss'] += row.get('uss') or 0
+        return sorted(groups.values(), key=lambda group: group['count'], reverse=True)
+
+    def output(self, method, rows=None):
+        return super(PgGroupStatCollector, self).output(
+            method, before_string='PostgreSQL processes by {0}:'.format(self.GROUP_HEADERS[self.group_by]),
+            after_string='\n', rows=rows)
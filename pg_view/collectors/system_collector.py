@@ -6,6 +6,7 @@ class SystemStatCollector(StatCollector):
 
     """ Collect global system statistics, i.e. CPU/IO usage, not including memory. """
 
+    NAME = 'system'
     PROC_STAT_FILENAME = '/proc/stat'
 
     def __init__(self):
@@ -51,8 +52,22 @@ class SystemStatCollector(StatCollector):
             {'out': 'steal', 'fn': self._cpu_time_diff},
             {'out': 'guest', 'fn': self._cpu_time_diff},
             {'out': 'ctxt'},
-            {'out': 'running', 'diff': False},
-            {'out': 'blocked', 'diff': False},
+            {'out': 'running', 'diff': False, 'aggregate': True},
+            {'out': 'blocked', 'diff': False, 'aggregate': True},
+        ]
+
+        self.metrics_data = [
+            {'name': 'cpu_user_ratio', 'in': 'utime', 'help': 'Share of the CPU time spent in the user mode'},
+            {'name': 'cpu_system_ratio', 'in': 'stime', 'help': 'Share of the CPU time spent in the kernel mode'},
+            {'name': 'cpu_idle_ratio', 'in': 'idle', 'help': 'Share of the CPU time spent idle'},
+            {'name': 'cpu_iowait_ratio', 'in': 'iowait', 'help': 'Share of the CPU time spent waiting for I/O'},
+            {'name': 'cpu_irq_ratio', 'in': 'irq', 'help': 'Share of the CPU time spent serving interrupts'},
+            {'name': 'cpu_softirq_ratio', 'in': 'softirq', 'help': 'Share of the CPU time spent serving softirqs'},
+            {'name': 'cpu_steal_ratio', 'in': 'steal', 'help': 'Share of the CPU time taken by the hypervisor'},
+            {'name': 'cpu_guest_ratio', 'in': 'guest', 'help': 'Share of the CPU time spent running guests'},
+            {'name': 'context_switches_per_second', 'in': 'ctxt', 'help': 'Context switches per second'},
+            {'name': 'processes_running', 'in': 'running', 'help': 'Processes in the runnable state'},
+            {'name': 'processes_blocked', 'in': 'blocked', 'help': 'Processes blocked waiting for I/O'},
         ]
 
         self.output_transform_data = [
@@ -198,5 +213,6 @@ class SystemStatCollector(StatCollector):
 
         return self._transform_input(cpu_row)
 
-    def output(self, method):
-        return super(SystemStatCollector, self).output(method, before_string='System statistics:', after_string='\n')
+    def output(self, method, rows=None):
+        return super(SystemStatCollector, self).output(method, before_string='System statistics:', after_string='\n',
+                                                       rows=rows)
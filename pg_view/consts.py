@@ -1 +1,5 @@
 TICK_LENGTH = 1
+# sampling more often than that costs more than it reveals
+MIN_TICK_LENGTH = 0.1
+# give up on establishing a database connection after that many seconds
+CONNECT_TIMEOUT = 5
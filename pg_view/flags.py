@@ -5,3 +5,14 @@ autohide_fields = False
 display_units = False
 notrim = False
 realtime = False
+# COLLECTOR_NAMES of the collectors paused by the user
+disabled = set()
+# one line per cluster, only the expanded ones (given by the collector ident) show their panels
+summary = False
+expanded = set()
+# per panel (collector ident) state of the curses output: the first row shown, the sort order and grouping
+scroll_offsets = {}
+sort_keys = {}
+group_by = {}
+# index of the panel the scrolling and sorting keys apply to
+focus = 0
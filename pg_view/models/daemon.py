@@ -0,0 +1,217 @@
+import errno
+import fcntl
+import json
+import os
+import socket
+import tempfile
+import traceback
+from threading import Thread
+
+from pg_view import consts
+from pg_view.loggers import logger
+from pg_view.models.outputs import ColumnType
+from pg_view.models.scheduler import wait_for_input
+from pg_view.utils import OUTPUT_METHOD
+
+
+def default_socket_path():
+    """ the socket goes to the runtime directory of the user if there is one, nobody else can even get to it """
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(directory, 'pg_view-{0}.sock'.format(os.getuid()))
+
+
+def socket_is_owned(path):
+    """ check that the socket belongs to the user running pg_view, and not to somebody who has put it there first """
+    return os.stat(path).st_uid == os.getuid()
+
+
+class SocketUnavailable(Exception):
+    """ the socket is taken by another collector, or belongs to another user """
+    pass
+
+
+def lock_socket(path):
+    """ Take the lock file next to the socket, the collector serving on it holds the lock for as long as it
+        runs. The file stays behind afterwards: removing it would let two collectors lock different files.
+    """
+    try:
+        fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+    except OSError as e:
+        raise SocketUnavailable('unable to lock {0}: {1}'.format(path, e.strerror))
+    try:
+        if os.fstat(fd).st_uid != os.getuid():
+            raise SocketUnavailable('{0} belongs to another user'.format(path))
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError as e:
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            raise SocketUnavailable('another collector is already serving on {0}'.format(path))
+    except Exception:
+        os.close(fd)
+        raise
+    return fd
+
+
+def collector_is_serving(path):
+    """ check whether there is a live collector behind the socket, rather than a leftover file """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+class LineChannel(object):
+    """ exchanges JSON messages, one per line, over a stream socket """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b''
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def send(self, message):
+        self.sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+
+    def receive(self):
+        """ read what is available on the socket and return the complete messages, None if the peer is gone """
+        chunk = self.sock.recv(65536)
+        if not chunk:
+            return None
+        self.buffer += chunk
+        lines = self.buffer.split(b'\n')
+        self.buffer = lines.pop()
+        return [json.loads(line.decode('utf-8')) for line in lines if line]
+
+
+class SnapshotServer(Thread):
+    """ Serves the snapshots published by the sampler to the read-only viewers attached to a unix socket.
+        Each viewer sends its display options (output method, units, scrolling and so on) whenever they
+        change, and gets the collectors output rendered with those options for every new snapshot.
+        The viewers don't collect anything themselves, so the database host pays for a single pg_view.
+    """
+
+    def __init__(self, path, sampler, render_fn):
+        super(SnapshotServer, self).__init__(name='snapshot-server')
+        self.daemon = True
+        self.path = path
+        self.sampler = sampler
+        self.render_fn = render_fn
+        # no other collector starting at the same time can get past this
+        self.lock_fd = lock_socket(path)
+        try:
+            self._bind()
+        except Exception:
+            os.close(self.lock_fd)
+            raise
+
+    def _bind(self):
+        if os.path.exists(self.path):
+            if not socket_is_owned(self.path):
+                raise SocketUnavailable('{0} belongs to another user'.format(self.path))
+            if collector_is_serving(self.path):
+                raise SocketUnavailable('another collector is already serving on {0}'.format(self.path))
+            # left behind by a collector that is gone
+            os.unlink(self.path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only the owner may connect, even for the moment between the bind and the chmod
+        umask = os.umask(0o177)
+        try:
+            self.sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        os.chmod(self.path, 0o600)
+        self.sock.listen(5)
+
+    def run(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except socket.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                # the socket is closed
+                return
+            viewer = Thread(target=self._serve_viewer, args=(conn,), name='snapshot-viewer')
+            viewer.daemon = True
+            viewer.start()
+
+    def close(self):
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        os.close(self.lock_fd)
+
+    def _serve_viewer(self, conn):
+        channel = LineChannel(conn)
+        view = None
+        version = 0
+        try:
+            while True:
+                # block until the viewer tells us what it wants, afterwards just check for the updates
+                if wait_for_input([channel], None if view is None else 0):
+                    messages = channel.receive()
+                    if messages is None:
+                        return
+                    if messages:
+                        view = messages[-1]
+                        # re-render the current snapshot with the new options right away
+                        version = -1
+                    continue
+                snapshot = self.sampler.wait_for_snapshot(version, consts.MIN_TICK_LENGTH)
+                if snapshot.version != version:
+                    version = snapshot.version
+                    channel.send({'version': version, 'data': self.render_fn(snapshot, view)})
+        except socket.error as e:
+            logger.info('viewer disconnected: {0}'.format(e))
+        except Exception:
+            logger.error('unable to serve the viewer: {0}'.format(traceback.format_exc()))
+        finally:
+            conn.close()
+
+
+class SnapshotViewer(object):
+    """ attaches to a collector serving snapshots and receives the output rendered for us """
+
+    def __init__(self, path):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        self.channel = LineChannel(sock)
+        self.output_method = None
+
+    def fileno(self):
+        return self.channel.fileno()
+
+    def request(self, view):
+        """ ask for the output rendered with the display options of the view """
+        self.output_method = view['method']
+        self.channel.send(view)
+
+    def receive(self):
+        """ return the latest output received, an empty list if there is none yet or None if the collector is gone """
+        messages = self.channel.receive()
+        if messages is None:
+            return None
+        if not messages:
+            return []
+        data = messages[-1]['data']
+        if self.output_method == OUTPUT_METHOD.curses:
+            data = [decode_curses_output(result) for result in data]
+        return data
+
+    def close(self):
+        self.channel.sock.close()
+
+
+def decode_curses_output(data):
+    """ restore the column tuples and the integer word numbers of statuses, JSON keeps neither of them """
+    for result in data.values():
+        result['rows'] = [dict((k, ColumnType(*v)) for k, v in row.items()) for row in result['rows']]
+        result['statuses'] = [dict((k, dict((int(no), status) for no, status in statuses.items()))
+                                   for k, statuses in row.items()) for row in result['statuses']]
+    return data
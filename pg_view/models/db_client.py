@@ -4,6 +4,7 @@ import re
 
 import psycopg2
 
+from pg_view import consts
 from pg_view.loggers import logger
 from pg_view.models.parsers import ProcNetParser
 from pg_view.utils import STAT_FIELD, dbversion_as_float
@@ -145,7 +146,7 @@ def make_cluster_desc(name, version, workdir, pid, pgcon, conn):
     """Create cluster descriptor, complete with the reconnect function."""
 
     def reconnect():
-        pgcon = psycopg2.connect(**conn)
+        pgcon = psycopg2.connect(connect_timeout=consts.CONNECT_TIMEOUT, **conn)
         pid = read_postmaster_pid(workdir, name)
         return (pgcon, pid)
 
@@ -0,0 +1,149 @@
+import json
+import sys
+
+ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+
+def collector_key(collector):
+    """ identify the output of a collector across the ticks, there is one collector of each type per cluster """
+    return '{0}/{1}'.format(collector['type'], collector['name']) if 'name' in collector else collector['type']
+
+
+def row_keys(rows):
+    """ the processes carry their own key, other rows are identified by their position """
+    return [row['_key'] if '_key' in row else str(i) for i, row in enumerate(rows)]
+
+
+def dict_delta(prev, cur, skip=()):
+    """ the values of cur that are new or different from prev, along with the names of the ones gone """
+    changed = dict((k, v) for k, v in cur.items() if k not in skip and (k not in prev or prev[k] != v))
+    unset = [k for k in prev if k not in skip and k not in cur]
+    if unset:
+        changed['_unset'] = unset
+    return changed
+
+
+def apply_dict_delta(prev, delta):
+    result = dict(prev)
+    result.update((k, v) for k, v in delta.items() if k != '_unset')
+    for k in delta.get('_unset', ()):
+        result.pop(k, None)
+    return result
+
+
+class DeltaEncoder(object):
+    """ Turns the ndjson records into a keyframe every keyframe_interval ticks and the changes since
+        the previous record otherwise. A change of a collector lists the top-level fields that differ,
+        the rows that differ (only their changed fields), the rows that are gone and the new row order.
+    """
+
+    def __init__(self, keyframe_interval):
+        self.keyframe_interval = keyframe_interval
+        self.ticks = 0
+        # collectors of the previous record, by key, and their order
+        self.previous = None
+        self.order = None
+
+    def encode(self, record):
+        """ return the record to write in place of the given one """
+        collectors = dict((collector_key(c), c) for c in record['collectors'])
+        order = [collector_key(c) for c in record['collectors']]
+        if self.previous is None or self.ticks % self.keyframe_interval == 0:
+            result = dict(record, keyframe=True)
+        else:
+            result = dict((k, v) for k, v in record.items() if k != 'collectors')
+            result['delta'] = {}
+            for key in order:
+                delta = self._collector_delta(self.previous.get(key), collectors[key])
+                if delta:
+                    result['delta'][key] = delta
+            removed = [key for key in self.order if key not in collectors]
+            if removed:
+                result['removed'] = removed
+            if order != [key for key in self.order if key in collectors]:
+                result['order'] = order
+        self.ticks += 1
+        self.previous = collectors
+        self.order = order
+        return result
+
+    @staticmethod
+    def _collector_delta(prev, cur):
+        if prev is None:
+            return cur
+        delta = dict_delta(prev, cur, skip=('data',))
+        prev_rows = dict(zip(row_keys(prev.get('data', [])), prev.get('data', [])))
+        cur_keys = row_keys(cur.get('data', []))
+        rows = {}
+        for key, row in zip(cur_keys, cur.get('data', [])):
+            if key not in prev_rows:
+                rows[key] = row
+            elif prev_rows[key] != row:
+                rows[key] = dict_delta(prev_rows[key], row)
+        if rows:
+            delta['rows'] = rows
+        removed = [key for key in prev_rows if key not in set(cur_keys)]
+        if removed:
+            delta['removed'] = removed
+        if cur_keys != [key for key in row_keys(prev.get('data', [])) if key in cur_keys]:
+            delta['order'] = cur_keys
+        return delta
+
+
+class DeltaDecoder(object):
+    """ Reconstructs the full records out of the output of DeltaEncoder """
+
+    def __init__(self):
+        self.collectors = None
+        self.order = None
+
+    def decode(self, record):
+        """ return the full record, None until the first keyframe is seen """
+        if record.get('keyframe'):
+            self.collectors = dict((collector_key(c), c) for c in record['collectors'])
+            self.order = [collector_key(c) for c in record['collectors']]
+            return dict((k, v) for k, v in record.items() if k != 'keyframe')
+        if self.collectors is None:
+            return None
+        for key in record.get('removed', ()):
+            self.collectors.pop(key, None)
+        for key, delta in record['delta'].items():
+            self.collectors[key] = self._apply_collector_delta(self.collectors.get(key), delta)
+        # the order is only sent when it is not the previous one without the removed collectors
+        self.order = record.get('order') or [key for key in self.order if key in self.collectors]
+        result = dict((k, v) for k, v in record.items() if k not in ('delta', 'removed', 'order'))
+        result['collectors'] = [self.collectors[key] for key in self.order]
+        return result
+
+    @staticmethod
+    def _apply_collector_delta(prev, delta):
+        if prev is None:
+            return delta
+        fields = dict((k, v) for k, v in delta.items() if k not in ('rows', 'removed', 'order'))
+        result = apply_dict_delta(prev, fields)
+        prev_keys = row_keys(prev.get('data', []))
+        rows = dict(zip(prev_keys, prev.get('data', [])))
+        for key in delta.get('removed', ()):
+            rows.pop(key, None)
+        for key, row in delta.get('rows', {}).items():
+            rows[key] = apply_dict_delta(rows[key], row) if key in rows else row
+        # likewise, the rows are only reordered when some of them are new or have moved
+        order = delta.get('order') or [key for key in prev_keys if key in rows]
+        result['data'] = [rows[key] for key in order]
+        return result
+
+
+def main():
+    """ read the delta-encoded ndjson output of pg_view on stdin and write the full records to stdout """
+    decoder = DeltaDecoder()
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        record = decoder.decode(json.loads(line))
+        if record is not None:
+            sys.stdout.write(ENCODER.encode(record) + '\n')
+    sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
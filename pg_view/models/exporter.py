@@ -0,0 +1,102 @@
+import math
+import sys
+from collections import OrderedDict
+from threading import Thread
+
+from pg_view.loggers import logger
+from pg_view.models.scheduler import SnapshotConsumer
+
+if sys.hexversion >= 0x03000000:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+else:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+PREFIX = 'pg_view_'
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    """
+    >>> [format_value(v) for v in (1.0, 0.25, float('inf'), float('-inf'), float('nan'))]
+    ['1.0', '0.25', '+Inf', '-Inf', 'NaN']
+    """
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+def render_metrics(collector_rows, version):
+    """ Produce the OpenMetrics text out of the rows of the collectors, given as a list of (collector, rows).
+        The samples of a gauge exported by several collectors, i.e. one for each cluster, go together.
+    """
+    gauges = OrderedDict()
+    for st, rows in collector_rows:
+        for gauge, labels, value in st.metrics(rows):
+            gauges.setdefault(gauge['name'], (gauge, []))[1].append((labels, value))
+    lines = []
+    for name, (gauge, samples) in gauges.items():
+        lines.append('# TYPE {0}{1} gauge'.format(PREFIX, name))
+        lines.append('# HELP {0}{1} {2}'.format(PREFIX, name, gauge['help']))
+        for labels, value in samples:
+            text = ','.join('{0}="{1}"'.format(k, escape_label('' if v is None else str(v))) for k, v in labels)
+            lines.append('{0}{1}{2} {3}'.format(PREFIX, name, '{' + text + '}' if text else '', format_value(value)))
+    lines.append('# TYPE {0}snapshots counter'.format(PREFIX))
+    lines.append('# HELP {0}snapshots Snapshots of the collectors taken so far'.format(PREFIX))
+    lines.append('{0}snapshots_total {1}'.format(PREFIX, version))
+    lines.append('# EOF')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """ sends the metrics rendered for the latest snapshot, nothing is collected or rendered on request """
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.exporter.body
+        self.send_response(200)
+        self.send_header('Content-Type', MetricsServer.CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # never write to the terminal, the curses output is there
+        logger.info('metrics request from {0}: {1}'.format(self.address_string(), format % args))
+
+
+class MetricsServer(SnapshotConsumer):
+    """ Serves the latest snapshot published by the sampler as OpenMetrics text from a local HTTP endpoint.
+        The text is rendered once for each new snapshot, in a thread of its own, so a scrape neither
+        triggers the collection nor waits for the rendering: it just sends the text rendered last.
+    """
+
+    CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+    def __init__(self, address, sampler, render_fn):
+        super(MetricsServer, self).__init__(sampler, name='metrics-renderer')
+        self.render_fn = render_fn
+        self.body = b'# EOF\n'
+        self.httpd = HTTPServer(address, MetricsHandler)
+        self.httpd.exporter = self
+        self.server = Thread(target=self.httpd.serve_forever, name='metrics-server')
+        self.server.daemon = True
+
+    def start(self):
+        self.server.start()
+        super(MetricsServer, self).start()
+
+    def consume(self, snapshot):
+        self.body = self.render_fn(snapshot).encode('utf-8')
+
+    def close(self):
+        super(MetricsServer, self).close()
+        if self.server.is_alive():
+            self.httpd.shutdown()
+        self.httpd.server_close()
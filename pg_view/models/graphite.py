@@ -0,0 +1,140 @@
+import math
+import re
+import socket
+from collections import deque
+from threading import Condition, Thread
+
+from pg_view.loggers import logger
+from pg_view.models.scheduler import SnapshotConsumer
+
+# the role of a cluster changes with a failover, the path of its metrics shouldn't
+SKIPPED_LABELS = ('role',)
+
+
+def path_component(value):
+    """ a label value as a single component of the metric path
+
+    >>> [path_component(v) for v in ('main/9.6', None, 'app server', 1234)]
+    ['main_9_6', 'none', 'app_server', '1234']
+    """
+    if value is None or value == '':
+        return 'none'
+    return re.sub(r'[^A-Za-z0-9_-]', '_', str(value))
+
+
+def metric_lines(collector_rows, host, now, prefix=None):
+    """ Produce the plaintext lines out of the rows of the collectors, given as a list of (collector, rows).
+        The path is [PREFIX.]HOST[.CLUSTER][.LABELS].METRIC, with the same metrics and units as the exporter.
+    """
+    base = ([prefix.strip('.')] if prefix else []) + [path_component(host)]
+    timestamp = int(now)
+    lines = []
+    for st, rows in collector_rows:
+        for gauge, labels, value in st.metrics(rows):
+            # graphite has no way to store them
+            if math.isnan(value) or math.isinf(value):
+                continue
+            path = base + [path_component(v) for k, v in labels if k not in SKIPPED_LABELS] + [gauge['name']]
+            lines.append('{0} {1!r} {2}\n'.format('.'.join(path), value, timestamp))
+    return lines
+
+
+class GraphiteSink(SnapshotConsumer):
+    """ Sends the metrics of every snapshot to graphite in its plaintext format. A renderer thread turns
+        the snapshots into lines and puts them on a bounded queue, a sender thread writes them out in
+        batches over a persistent TCP or unix socket. Neither of them ever holds up the sampler: when the
+        receiver is slow or away, the oldest lines are dropped from the queue while the sender retries.
+    """
+
+    def __init__(self, address, sampler, render_fn, queue_size=100000, batch_size=500, retry_interval=5,
+                 timeout=10):
+        super(GraphiteSink, self).__init__(sampler, name='graphite-renderer')
+        self.address = address
+        self.render_fn = render_fn
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.timeout = timeout
+        self.queue = deque(maxlen=queue_size)
+        self.cond = Condition()
+        self.dropped = 0
+        self.sent = 0
+        self.sock = None
+        # nothing is going to be queued anymore, the sender stops once the queue is empty
+        self.closed = False
+        self.sender = Thread(target=self._send, name='graphite-sender')
+        self.sender.daemon = True
+
+    def start(self):
+        self.sender.start()
+        super(GraphiteSink, self).start()
+
+    def put(self, lines):
+        """ queue the lines to send, making room for them by dropping the oldest ones """
+        with self.cond:
+            self.dropped += max(len(self.queue) + len(lines) - self.queue.maxlen, 0)
+            self.queue.extend(lines)
+            self.cond.notify_all()
+
+    def consume(self, snapshot):
+        self.put(self.render_fn(snapshot))
+
+    def _take_batch(self):
+        """ wait for the lines to send, returns nothing only when closed with the queue drained """
+        with self.cond:
+            while not self.queue and not self.closed:
+                self.cond.wait()
+            return [self.queue.popleft() for _ in range(min(self.batch_size, len(self.queue)))]
+
+    def _connect(self):
+        try:
+            if isinstance(self.address, tuple):
+                self.sock = socket.create_connection(self.address, self.timeout)
+            else:
+                self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.sock.settimeout(self.timeout)
+                self.sock.connect(self.address)
+        except socket.error as e:
+            logger.error('unable to connect to graphite at {0}: {1}'.format(self.address, e))
+            self._disconnect()
+            return False
+        logger.info('connected to graphite at {0}, {1} lines dropped so far'.format(self.address, self.dropped))
+        return True
+
+    def _disconnect(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def _send(self):
+        batch = []
+        while True:
+            if not batch:
+                batch = self._take_batch()
+                if not batch:
+                    break
+            if self.sock is None and not self._connect():
+                if self.stopped.is_set():
+                    break
+                self.stopped.wait(self.retry_interval)
+                continue
+            try:
+                self.sock.sendall(''.join(batch).encode('utf-8'))
+            except socket.error as e:
+                # the batch goes again over the new connection, graphite keeps a single value per timestamp
+                logger.error('unable to send the metrics to graphite: {0}'.format(e))
+                self._disconnect()
+                if self.stopped.is_set():
+                    break
+                continue
+            self.sent += len(batch)
+            batch = []
+        self._disconnect()
+
+    def close(self, timeout=None):
+        """ stop rendering and give the sender at most timeout seconds (the socket timeout by default) to flush """
+        super(GraphiteSink, self).close()
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.sender.is_alive():
+            self.sender.join(self.timeout if timeout is None else timeout)
@@ -1,14 +1,19 @@
+import csv
 import curses
+import json
 import os
 import re
+import sys
 import time
-from collections import namedtuple
+from collections import deque, namedtuple
 from operator import itemgetter
+from threading import Condition, Thread
 
 from pg_view import flags
 from pg_view.meta import __appname__, __version__, __license__
+from pg_view.models.delta import ENCODER
 
-from pg_view.utils import enum
+from pg_view.utils import enum, monotonic, COLLECTOR_NAMES
 
 
 COLSTATUS = enum(cs_ok=0, cs_warning=1, cs_critical=2)
@@ -26,16 +31,280 @@ class ColumnType(namedtuple('ColumnType', 'value header header_position')):
 
 
 class CommonOutput(object):
-    """ just a normal console output """
+    """ just a normal console output, or the same text written to a file """
 
-    def __init__(self):
+    # what clear(1) writes on the usual terminals
+    CLEAR_SCREEN = '\033[H\033[2J'
+
+    def __init__(self, stream=None):
         super(CommonOutput, self)
+        self.stream = stream
 
     def display(self, data):
-        print(data)
+        if self.stream is None:
+            print(data)
+        else:
+            self.stream.write('{0}\n'.format(data))
 
     def refresh(self):
-        os.system('clear')
+        if self.stream is None:
+            os.system('clear')
+        else:
+            self.stream.flush()
+
+    def clear(self):
+        """ clear the screen before the output that follows """
+        if self.stream is None:
+            os.system('clear')
+        else:
+            self.stream.write(self.CLEAR_SCREEN)
+
+
+class NdjsonOutput(object):
+    """ Writes the output of all collectors as a single line of compact JSON per tick, each one
+        stamped with the wall clock and the monotonic time, for the log shippers to consume.
+    """
+
+    def __init__(self, stream, delta_encoder=None):
+        self.stream = stream
+        self.collectors = []
+        # writes the changes since the previous tick instead of the full output, when set
+        self.delta_encoder = delta_encoder
+
+    def display(self, data):
+        """ just collect the data, it is written on refresh """
+        self.collectors.append(data)
+
+    def refresh(self):
+        if self.delta_encoder is None:
+            self.stream.write('{{"time":{0:.3f},"monotonic":{1:.3f},"collectors":[{2}]}}\n'.format(
+                time.time(), monotonic(), ','.join(self.collectors)))
+        else:
+            record = {'time': round(time.time(), 3), 'monotonic': round(monotonic(), 3),
+                      'collectors': [json.loads(collector) for collector in self.collectors]}
+            self.stream.write(ENCODER.encode(self.delta_encoder.encode(record)) + '\n')
+        self.stream.flush()
+        self.collectors = []
+
+
+class DelimitedOutput(object):
+    """ Writes the raw rows of the collectors as comma or tab separated values, for the offline analysis.
+        Each row starts with the time of the tick. The rows of all collectors go to the stream, led by the
+        name of the collector, unless a directory is given: then every collector gets a file of its own.
+        The header is only written when a collector shows up, or its columns change.
+    """
+
+    EXTENSIONS = {',': 'csv', '\t': 'tsv'}
+
+    def __init__(self, stream, delimiter, directory=None):
+        self.stream = stream
+        self.delimiter = delimiter
+        self.directory = directory
+        self.collectors = []
+        # stream, csv writer, the encoded name and the last header written, by collector name
+        self.targets = {}
+
+    def display(self, data):
+        """ just collect the data, it is written on refresh """
+        self.collectors.append(data)
+
+    def refresh(self):
+        now = '{0:.3f}'.format(time.time())
+        streams = set()
+        for data in self.collectors:
+            target = self._target(data['collector'])
+            stream, writer = target['stream'], target['writer']
+            if target['header'] != data['header']:
+                writer.writerow(['time'] + ([] if self.directory else ['collector']) + data['header'])
+                target['header'] = data['header']
+            # the rows go to the writer as they are, only the time and the name are written separately
+            prefix = now + self.delimiter + target['prefix']
+            for row in data['rows']:
+                stream.write(prefix)
+                writer.writerow(row)
+            streams.add(stream)
+        for stream in streams:
+            stream.flush()
+        self.collectors = []
+
+    def _target(self, collector):
+        target = self.targets.get(collector)
+        if target is None:
+            if self.directory:
+                name = '{0}.{1}'.format(re.sub(r'[^\w.-]+', '_', collector).strip('_'), self.EXTENSIONS[self.delimiter])
+                stream = self._open(os.path.join(self.directory, name))
+                prefix = ''
+            else:
+                stream = self.stream
+                prefix = self._quote(collector) + self.delimiter
+            writer = csv.writer(stream, delimiter=self.delimiter, lineterminator='\n')
+            target = self.targets[collector] = {'stream': stream, 'writer': writer, 'prefix': prefix, 'header': None}
+        return target
+
+    def _quote(self, value):
+        if any(c in value for c in (self.delimiter, '"', '\n')):
+            return '"{0}"'.format(value.replace('"', '""'))
+        return value
+
+    @staticmethod
+    def _open(path):
+        # the csv module wants to deal with the line endings itself
+        if sys.hexversion >= 0x03000000:
+            return open(path, 'w', newline='')
+        return open(path, 'wb')
+
+
+class FrameQueue(object):
+    """ Stands for the standard output in front of the non-curses outputs, so that a reader of the pipe
+        that stalls doesn't stall the caller. The outputs write into the frame being built, the complete
+        frames go to a bounded queue and a thread of its own writes them out. When the queue is full the
+        policy decides: block waits for room, drop-oldest throws the oldest frame away and drop-newest
+        the new one. The dropped frames are counted, along with the ones never built as the caller was
+        behind, for the next frames to mention.
+    """
+
+    POLICIES = ('block', 'drop-oldest', 'drop-newest')
+
+    def __init__(self, stream, size, policy):
+        self.stream = stream
+        self.size = size
+        self.policy = policy
+        self.buffer = []
+        self.frames = deque()
+        self.cond = Condition()
+        self.dropped = 0
+        self.closed = False
+        # the writer has failed, i.e. the reader has gone away
+        self.error = None
+        self.writer = Thread(target=self._write, name='output-writer')
+        self.writer.daemon = True
+        self.writer.start()
+
+    def write(self, text):
+        self.buffer.append(text)
+
+    def flush(self):
+        """ nothing goes out before the frame is complete """
+
+    def skip(self, count):
+        """ count the frames the caller has skipped """
+        with self.cond:
+            self.dropped += count
+
+    def end_frame(self):
+        frame = ''.join(self.buffer)
+        self.buffer = []
+        with self.cond:
+            if len(self.frames) >= self.size:
+                if self.policy == 'drop-newest':
+                    self.dropped += 1
+                    return
+                if self.policy == 'drop-oldest':
+                    self.frames.popleft()
+                    self.dropped += 1
+                while len(self.frames) >= self.size and self.error is None:
+                    self.cond.wait()
+            if self.error is not None:
+                raise self.error
+            self.frames.append(frame)
+            self.cond.notify_all()
+
+    def _write(self):
+        while True:
+            with self.cond:
+                while not self.frames and not self.closed:
+                    self.cond.wait()
+                if not self.frames:
+                    return
+                frame = self.frames.popleft()
+                self.cond.notify_all()
+            try:
+                self.stream.write(frame)
+                self.stream.flush()
+            except (IOError, OSError) as e:
+                with self.cond:
+                    self.error = e
+                    self.frames.clear()
+                    self.cond.notify_all()
+                return
+
+    def close(self):
+        """ wait for the frames in the queue to be written """
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.writer.join()
+
+
+class FrameBuffer(object):
+    """ Wraps the curses screen and keeps the frame being drawn as (character, attribute) cells.
+        On refresh only the cells that differ from the previous frame are sent to the screen, in
+        runs of the same attribute, so the parts of the screen that didn't change cost nothing.
+    """
+
+    BLANK = (' ', 0)
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.rows = {}
+        self.previous = {}
+        self.size = None
+
+    def __getattr__(self, name):
+        # anything but drawing goes to the screen directly
+        return getattr(self.screen, name)
+
+    def erase(self):
+        self.rows = {}
+
+    def addnstr(self, y, x, text, n, attr=0):
+        text = text[:n]
+        row = self.rows.setdefault(y, [])
+        if len(row) < x + len(text):
+            row.extend([self.BLANK] * (x + len(text) - len(row)))
+        for i, ch in enumerate(text):
+            row[x + i] = (ch, attr)
+
+    def addch(self, y, x, ch, attr=0):
+        self.addnstr(y, x, ch, 1, attr)
+
+    def inch(self, y, x):
+        row = self.rows.get(y, ())
+        ch, attr = row[x] if x < len(row) else self.BLANK
+        return ord(ch) | attr
+
+    def refresh(self):
+        size = self.screen.getmaxyx()
+        if size != self.size:
+            # the terminal has been resized, whatever is on the screen is of no use
+            self.size = size
+            self.previous = {}
+            self.screen.erase()
+        for y in set(self.rows) | set(self.previous):
+            row, previous = self.rows.get(y, []), self.previous.get(y, [])
+            if row != previous:
+                self._draw_changes(y, row, previous)
+        self.previous, self.rows = self.rows, {}
+        self.screen.refresh()
+
+    def _draw_changes(self, y, row, previous):
+        width = max(len(row), len(previous))
+        row = row + [self.BLANK] * (width - len(row))
+        previous = previous + [self.BLANK] * (width - len(previous))
+        x = 0
+        while x < width:
+            if row[x] == previous[x]:
+                x += 1
+                continue
+            start, attr = x, row[x][1]
+            while x < width and row[x] != previous[x] and row[x][1] == attr:
+                x += 1
+            text = ''.join(ch for ch, _ in row[start:x])
+            try:
+                self.screen.addnstr(y, start, text, len(text), attr)
+            except curses.error:
+                # writing to the bottom right corner moves the cursor off the screen
+                pass
 
 
 class CursesOutput(object):
@@ -49,11 +318,17 @@ class CursesOutput(object):
 
     def __init__(self, screen):
         super(CursesOutput, self)
-        self.screen = screen
+        self.screen = FrameBuffer(screen)
         self.data = {}
         self.output_order = []
+        # collectors that can be scrolled through and sorted, the keys apply to the focused one
+        self.panels = []
         self.show_help = False
         self.is_color_supported = True
+        # the player of the recording shown instead of the live data, if any
+        self.replay = None
+        # False for a viewer attached to another collector, the keys pausing the collectors don't apply to it
+        self.collecting = True
 
         self._init_display()
 
@@ -97,16 +372,33 @@ class CursesOutput(object):
     def toggle_help(self):
         self.show_help = self.show_help is False
 
+    def focused_panel(self):
+        if not self.panels:
+            return None
+        return self.panels[flags.focus % len(self.panels)]
+
+    def sort_keys(self, panel):
+        """ the orders the panel supports, None stands for the default one """
+        return [None] + self.data[panel].get('sort', {}).get('keys', [])
+
+    def cursor(self, panel):
+        """ the row of the panel the Enter key applies to, if it supports any """
+        return self.data[panel].get('cursor')
+
+    def group_columns(self, panel):
+        """ the columns the rows of the panel can be grouped by, None stands for no grouping """
+        return [None] + self.data[panel].get('group', {}).get('columns', [])
+
     def refresh(self):
         """ actual data output goes here """
 
         self.next_y = 0
 
-        # ncurses doesn't erase the old contents when the screen is refreshed,
-        # hence, we need to do it manually here.
+        # start a new frame, the screen is only updated where it differs from the previous one.
         # update screen coordinates
         self.screen.erase()
         self.update_screen_metrics()
+        self.panels = [name for name in self.output_order if 'viewport' in self.data[name]]
         if not self.show_help:
             for collector in self.output_order:
                 if self.next_y < self.screen_y - 2:
@@ -126,6 +418,14 @@ class CursesOutput(object):
         self.screen.refresh()
         pass
 
+    def page_length(self):
+        """ number of rows to scroll through with page up/down """
+        return max(self.screen.getmaxyx()[0] // 2, 1)
+
+    def rows_limit(self):
+        """ no collector can possibly show more rows than the screen has """
+        return self.screen.getmaxyx()[0]
+
     def update_screen_metrics(self):
         self.screen_y, self.screen_x = self.screen.getmaxyx()
 
@@ -163,8 +463,24 @@ class CursesOutput(object):
             ('a', 'autohide', flags.autohide_fields),
             ('t', 'trimming', flags.notrim),
             ('r', 'realtime', flags.realtime),
+            ('c', 'clusters', flags.summary),
             ('h', 'help', self.show_help),
         )
+        if not self.collecting:
+            menu_items = tuple(item for item in menu_items if item[0] != 'r')
+        elif flags.disabled:
+            # the paused collectors, the number keys toggle them
+            menu_items += (('1-{0}'.format(len(COLLECTOR_NAMES)),
+                            'off:' + ','.join(name for name in COLLECTOR_NAMES if name in flags.disabled), True),)
+        if self.replay is not None:
+            menu_items += (('space', 'replay:x{0}'.format(self.replay.speed), self.replay.paused),)
+        panel = self.focused_panel()
+        if panel is not None and self.data[panel].get('sort'):
+            sort = self.data[panel]['sort']
+            menu_items += (('o', 'sort:{0}'.format(sort['key'] or sort['default']), sort['key'] is not None),)
+        if panel is not None and self.data[panel].get('group'):
+            column = self.data[panel]['group']['column']
+            menu_items += (('g', 'group:{0}'.format(column or 'none'), column is not None),)
 
         next_x = 0
         for item in menu_items:
@@ -182,7 +498,7 @@ class CursesOutput(object):
                 clean = False
                 break
         if clean:
-            clock_str = time.strftime(self.CLOCK_FORMAT, time.localtime())
+            clock_str = time.strftime(self.CLOCK_FORMAT, time.localtime(self.replay.time() if self.replay else None))
             self.screen.addnstr(0, self.screen_x - clock_str_len, clock_str, clock_str_len)
 
     def _status_to_color(self, status, highlight):
@@ -291,8 +607,35 @@ class CursesOutput(object):
         x = self.print_text(y, 5, 't: ', self.COLOR_NORMAL | curses.A_BOLD)
         self.print_text(y, x, 'toggle trimming of attributes in the middle (user and database names)')
         y += 1
-        x = self.print_text(y, 5, 'r: ', self.COLOR_NORMAL | curses.A_BOLD)
-        self.print_text(y, x, 'update information in real time (may cause additional load)')
+        if self.collecting:
+            x = self.print_text(y, 5, 'r: ', self.COLOR_NORMAL | curses.A_BOLD)
+            self.print_text(y, x, 'update information in real time (may cause additional load)')
+            y += 1
+        x = self.print_text(y, 5, 'arrows, PgUp/PgDn, Home: ', self.COLOR_NORMAL | curses.A_BOLD)
+        self.print_text(y, x, 'scroll through the processes')
+        y += 1
+        x = self.print_text(y, 5, 'o: ', self.COLOR_NORMAL | curses.A_BOLD)
+        self.print_text(y, x, 'sort the processes by age, cpu, read, write or uss')
+        y += 1
+        x = self.print_text(y, 5, 'g: ', self.COLOR_NORMAL | curses.A_BOLD)
+        self.print_text(y, x, 'group the processes by database, user, client address or application name')
+        y += 1
+        x = self.print_text(y, 5, 'c: ', self.COLOR_NORMAL | curses.A_BOLD)
+        self.print_text(y, x, 'show one line per cluster, Enter shows the details of the one on top')
+        y += 1
+        if self.collecting:
+            x = self.print_text(y, 5, '1-{0}: '.format(len(COLLECTOR_NAMES)), self.COLOR_NORMAL | curses.A_BOLD)
+            self.print_text(y, x, 'pause/resume collecting the {0} statistics'.format(', '.join(COLLECTOR_NAMES)))
+            y += 1
+        if self.replay is not None:
+            x = self.print_text(y, 5, 'space, . and ,: ', self.COLOR_NORMAL | curses.A_BOLD)
+            self.print_text(y, x, 'pause the replay, step forward and back')
+            y += 1
+            x = self.print_text(y, 5, '[ ] { } < >: ', self.COLOR_NORMAL | curses.A_BOLD)
+            self.print_text(y, x, 'move the replay a minute or ten back and forth, change its speed')
+            y += 1
+        x = self.print_text(y, 5, 'TAB: ', self.COLOR_NORMAL | curses.A_BOLD)
+        self.print_text(y, x, 'switch between the clusters the keys above apply to')
         y += 1
         x = self.print_text(y, 5, 'q: ', self.COLOR_NORMAL | curses.A_BOLD)
         self.print_text(y, x, 'exit program')
@@ -311,6 +654,10 @@ class CursesOutput(object):
         prepend_column_headers = self.data[collector].get('prepend_column_headers', False)
         highlights = self.data[collector]['highlights']
         types = self.data[collector]['types']
+        # rows of a collector that missed its deadline are left from the previous refresh
+        dim = curses.A_DIM if self.data[collector].get('stale') else 0
+        # the first row is the one the Enter key applies to
+        cursor = self.data[collector].get('cursor') is not None and collector == self.focused_panel()
 
         start_x = 1
 
@@ -328,7 +675,9 @@ class CursesOutput(object):
         layout = self.calculate_fields_position(collector, start_x)
 
         if header:
-            self.display_header(layout, align, types)
+            # underline the header of the panel the keys apply to, unless there is no choice
+            focused = len(self.panels) > 1 and collector == self.focused_panel()
+            self.display_header(layout, align, types, curses.A_UNDERLINE if focused else 0)
             self.next_y += 1
 
         for i, (row, status) in enumerate(zip(rows, statuses)):
@@ -339,6 +688,7 @@ class CursesOutput(object):
                     self.next_y += 1
                 break
             self.show_status_of_invisible_fields(layout, status, 0)
+            attr = dim | (curses.A_REVERSE if cursor and i == 0 else 0)
             for field in layout:
                 # calculate colors and alignment for the data value
                 column_alignment = (align.get(field,
@@ -358,7 +708,7 @@ class CursesOutput(object):
                                                text, header, row[field].header_position)
                 for f in color_fields:
                     self.screen.addnstr(self.next_y, layout[field]['start'] + f['start'], f['word'], f['width'],
-                                        f['color'])
+                                        f['color'] | attr)
             self.next_y += 1
 
     def truncate_column_value(self, cv, maxlen, ellipsis=True):
@@ -410,12 +760,12 @@ class CursesOutput(object):
         else:
             return 0
 
-    def display_header(self, layout, align, types):
+    def display_header(self, layout, align, types, attr=0):
         for field in layout:
             text = self._align_field(field, '', layout[field]['width'], align.get(field, COLALIGN.ca_none),
                                      types.get(field, COLTYPES.ct_string))
             self.screen.addnstr(self.next_y, layout[field]['start'], text, layout[field]['width'], self.COLOR_NORMAL |
-                                curses.A_BOLD)
+                                curses.A_BOLD | attr)
 
     def calculate_fields_position(self, collector, xstart):
         width = self.data[collector]['w']
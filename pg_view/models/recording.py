@@ -0,0 +1,263 @@
+import bisect
+import datetime
+import json
+import struct
+import time
+import zlib
+from decimal import Decimal
+from threading import Condition, Lock
+
+from pg_view.models.scheduler import SnapshotPublisher
+
+MAGIC = b'PGVIEW-RECORDING 1\n'
+# length of the description of the collectors that follows the magic
+LENGTH = struct.Struct('>I')
+# compressed length of a chunk, the number of ticks in it and the time of the first and the last one
+CHUNK_HEADER = struct.Struct('>IIdd')
+
+
+def encode_value(value):
+    """ the rows come straight from the database and /proc, some values have no JSON counterpart """
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+ENCODER = json.JSONEncoder(separators=(',', ':'), default=encode_value)
+
+
+def describe(st):
+    """ what it takes to create the collector again for the playback """
+    return {'name': st.NAME, 'ident': st.ident(), 'dbname': getattr(st, 'dbname', None),
+            'dbver': getattr(st, 'dbver', None), 'work_directory': getattr(st, 'work_directory', None)}
+
+
+def parse_start(value, start_time):
+    """ Turn the time to start the playback at, given either as seconds since the start of the
+        recording or as a time of the day, into a timestamp. The time of the day is the first
+        one on or after the start of the recording.
+
+    >>> start = time.mktime((2016, 12, 3, 23, 0, 0, 0, 0, -1))
+    >>> parse_start('90', start) - start
+    90.0
+    >>> parse_start('23:30', start) - start
+    1800.0
+    >>> parse_start('0:15:30', start) - start
+    4530.0
+    >>> parse_start('noon', start)
+    Traceback (most recent call last):
+    ...
+    ValueError: noon
+    """
+    try:
+        if ':' not in value:
+            return start_time + float(value)
+        parts = [int(part) for part in value.split(':')]
+    except ValueError:
+        raise ValueError(value)
+    if len(parts) not in (2, 3):
+        raise ValueError(value)
+    start = datetime.datetime.fromtimestamp(start_time)
+    result = datetime.datetime.combine(start.date(), datetime.time(*parts))
+    if result < start.replace(microsecond=0):
+        result += datetime.timedelta(days=1)
+    return time.mktime(result.timetuple())
+
+
+class Recorder(object):
+    """ Writes the rows of the collectors from every snapshot to a file, as they are, rather than their
+        rendered output. The ticks are grouped into chunks compressed one by one, each preceded by
+        the time of its first and last tick, so that the player can find its way without reading
+        them all. A chunk is complete on its own, a crash only loses the ticks not written yet.
+    """
+
+    def __init__(self, path, collectors, ticks_per_chunk=60):
+        self.file = open(path, 'wb')
+        self.ticks_per_chunk = ticks_per_chunk
+        self.ticks = []
+        # the sampler records, while the main thread closes the file on exit
+        self.lock = Lock()
+        description = ENCODER.encode({'collectors': [describe(st) for st in collectors]}).encode('utf-8')
+        self.file.write(MAGIC + LENGTH.pack(len(description)) + description)
+        self.file.flush()
+
+    def record(self, snapshot, now=None):
+        tick = [now if now is not None else time.time(),
+                dict((st.ident(), {'rows': rows, 'state': st.recorded_state()}) for st, rows in snapshot.rows.items())]
+        with self.lock:
+            if self.file.closed:
+                return
+            self.ticks.append(tick)
+            if len(self.ticks) >= self.ticks_per_chunk:
+                self._write_chunk()
+
+    def _write_chunk(self):
+        if not self.ticks:
+            return
+        data = zlib.compress(ENCODER.encode(self.ticks).encode('utf-8'))
+        self.file.write(CHUNK_HEADER.pack(len(data), len(self.ticks), self.ticks[0][0], self.ticks[-1][0]) + data)
+        self.file.flush()
+        self.ticks = []
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self._write_chunk()
+                self.file.close()
+
+
+class Recording(object):
+    """ Reads the file written by the Recorder. Only the chunk headers are read when it is opened, they
+        make up the time index: finding a tick takes a binary search and decompressing a single chunk.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('{0} is not a pg_view recording'.format(path))
+        length, = LENGTH.unpack(self.file.read(LENGTH.size))
+        self.collectors = json.loads(self.file.read(length).decode('utf-8'))['collectors']
+        # offset in the file, the number of the first tick and the time of the first tick of each chunk
+        self.offsets = []
+        self.starts = []
+        self.times = []
+        self.length = 0
+        self.end_time = None
+        self._read_index()
+        self.chunk = None
+        self.chunk_ticks = []
+
+    def _read_index(self):
+        position = self.file.tell()
+        self.file.seek(0, 2)
+        size = self.file.tell()
+        self.file.seek(position)
+        while True:
+            header = self.file.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                break
+            length, count, first, last = CHUNK_HEADER.unpack(header)
+            offset = self.file.tell()
+            # the recording might have been cut short in the middle of the last chunk
+            if offset + length > size:
+                break
+            self.offsets.append(offset)
+            self.starts.append(self.length)
+            self.times.append(first)
+            self.length += count
+            self.end_time = last
+            self.file.seek(offset + length)
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def start_time(self):
+        return self.times[0] if self.times else None
+
+    def _chunk(self, number):
+        if self.chunk != number:
+            self.file.seek(self.offsets[number] - CHUNK_HEADER.size)
+            length = CHUNK_HEADER.unpack(self.file.read(CHUNK_HEADER.size))[0]
+            self.chunk_ticks = json.loads(zlib.decompress(self.file.read(length)).decode('utf-8'))
+            self.chunk = number
+        return self.chunk_ticks
+
+    def tick(self, number):
+        """ the time of the given tick and the rows and the state of each collector, by its ident """
+        chunk = bisect.bisect_right(self.starts, number) - 1
+        return self._chunk(chunk)[number - self.starts[chunk]]
+
+    def find(self, when):
+        """ number of the last tick recorded at or before the given time, the first one if none is """
+        chunk = bisect.bisect_right(self.times, when) - 1
+        if chunk < 0:
+            return 0
+        ticks = self._chunk(chunk)
+        return self.starts[chunk] + max(bisect.bisect_right([tick[0] for tick in ticks], when) - 1, 0)
+
+    def close(self):
+        self.file.close()
+
+
+class Player(SnapshotPublisher):
+    """ Plays a recording back through the collectors in place of the sampler, the UI renders the
+        snapshots the same way as the live ones. The ticks follow each other as far apart as they
+        were recorded, divided by the speed. The playback can be paused, moved a tick at a time
+        or to any time of the recording.
+    """
+
+    SPEEDS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+
+    def __init__(self, recording, collectors):
+        super(Player, self).__init__(collectors, name='player')
+        self.recording = recording
+        self.by_ident = dict((st.ident(), st) for st in collectors)
+        self.position = 0
+        self.speed = 1
+        self.paused = False
+        # guards the position, every change of it wakes up the playback
+        self.control = Condition()
+        self.changes = 0
+        # the time of the tick shown, the UI reads it without touching the recording the playback reads from
+        self.tick_time = None
+
+    def run(self):
+        with self.control:
+            self._show(self.position)
+            while not self.stopped.is_set():
+                if self.paused or self.position >= len(self.recording) - 1:
+                    self.control.wait()
+                    continue
+                changes = self.changes
+                delay = self.recording.tick(self.position + 1)[0] - self.recording.tick(self.position)[0]
+                self.control.wait(max(delay, 0) / self.speed)
+                # nothing has moved us elsewhere in the meantime
+                if changes == self.changes and not self.stopped.is_set():
+                    self._show(self.position + 1)
+
+    def _show(self, position):
+        self.position = max(min(position, len(self.recording) - 1), 0)
+        self.tick_time, data = self.recording.tick(self.position)
+        for ident, st in self.by_ident.items():
+            recorded = data.get(ident, {})
+            st.set_rows_snapshot(recorded.get('rows', []))
+            st.restore_state(recorded.get('state', {}))
+        self.publish()
+
+    def _change(self, fn):
+        with self.control:
+            fn()
+            self.changes += 1
+            self.control.notify_all()
+
+    def stop(self):
+        super(Player, self).stop()
+        self._change(lambda: None)
+
+    def time(self):
+        """ the time the current tick was recorded at """
+        return self.tick_time
+
+    def toggle_pause(self):
+        self._change(lambda: setattr(self, 'paused', not self.paused))
+
+    def step(self, ticks):
+        """ pause and move the given number of ticks forward, or back if negative """
+        def move():
+            self.paused = True
+            self._show(self.position + ticks)
+        self._change(move)
+
+    def seek(self, when):
+        self._change(lambda: self._show(self.recording.find(when)))
+
+    def skip(self, seconds):
+        self._change(lambda: self._show(self.recording.find(self.time() + seconds)))
+
+    def change_speed(self, steps):
+        """ move the given number of steps up or down the list of speeds """
+        index = self.SPEEDS.index(self.speed) + steps
+        self._change(lambda: setattr(self, 'speed', self.SPEEDS[max(min(index, len(self.SPEEDS) - 1), 0)]))
@@ -0,0 +1,278 @@
+import errno
+import fcntl
+import os
+import select
+import sys
+import time
+import traceback
+from collections import namedtuple
+from threading import Condition, Event, Thread
+
+from pg_view import consts, flags
+from pg_view.loggers import logger
+from pg_view.utils import process_single_collector, monotonic
+
+if sys.hexversion >= 0x03000000:
+    from queue import Queue
+else:
+    from Queue import Queue
+
+
+class CollectorPool(object):
+    """ Refreshes collectors concurrently, each one in its own worker thread. The caller waits
+        for the workers until the deadline: collectors that haven't finished by then are marked
+        as stale and keep displaying their previous snapshot, without delaying the others.
+    """
+
+    def __init__(self, collectors):
+        self.collectors = collectors
+        self.busy = set()
+        self.cond = Condition()
+        self.tasks = {}
+        for st in collectors:
+            self.tasks[st] = Queue()
+            worker = Thread(target=self._work, args=(st, self.tasks[st]), name='collector-{0}'.format(st.ident()))
+            worker.daemon = True
+            worker.start()
+
+    def _work(self, st, tasks):
+        while True:
+            tasks.get()
+            try:
+                process_single_collector(st)
+            except Exception:
+                logger.error('collector {0} failed: {1}'.format(st.ident(), traceback.format_exc()))
+            with self.cond:
+                st.take_snapshot()
+                self.busy.discard(st)
+                self.cond.notify_all()
+
+    def process(self, timeout):
+        """ Refresh all collectors that are not busy since the previous round and wait
+            at most timeout seconds for them. Returns the list of stale collectors.
+        """
+
+        deadline = monotonic() + timeout
+        with self.cond:
+            for st in self.collectors:
+                # a collector that missed its previous deadline is still working on it,
+                # there is no point in queueing another refresh behind the hung one.
+                if st not in self.busy:
+                    self.busy.add(st)
+                    self.tasks[st].put(True)
+            while self.busy:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            stale = []
+            for st in self.collectors:
+                st.stale = st in self.busy
+                if st.stale:
+                    stale.append(st)
+        for st in stale:
+            logger.info('collector {0} missed its deadline, showing stale data'.format(st.ident()))
+        return stale
+
+
+class TickScheduler(object):
+    """ Schedules ticks at fixed deadlines on the monotonic clock. The time spent working
+        during the tick is subtracted from the sleep, so the interval doesn't stretch under
+        load. When we are late by one or more whole intervals, the missed ticks are skipped
+        and the next one runs immediately instead of running the missed ones back-to-back.
+    """
+
+    def __init__(self, interval, clock=monotonic, sleep=time.sleep):
+        self.interval = interval
+        self.clock = clock
+        self.sleep = sleep
+        self.next_tick = None
+        self.missed = 0
+
+    def start(self):
+        self.next_tick = self.clock()
+
+    def time_left(self):
+        """ seconds left until the next deadline """
+        return max(self.next_tick + self.interval - self.clock(), 0)
+
+    def wait(self):
+        """ Sleep until the next deadline, return the number of ticks skipped on the way """
+        if self.next_tick is None:
+            self.start()
+        self.next_tick += self.interval
+        now = self.clock()
+        if now < self.next_tick:
+            self.sleep(self.next_tick - now)
+            return 0
+        skipped = int((now - self.next_tick) / self.interval)
+        if skipped > 0:
+            # merge the missed ticks into the current one, keeping the deadlines aligned
+            self.next_tick += skipped * self.interval
+            self.missed += skipped
+            logger.info('tick is late, skipped {0} tick(s)'.format(skipped))
+        return skipped
+
+
+class Snapshot(namedtuple('Snapshot', 'version rows')):
+    """ rows of each collector aggregated since the previous snapshot, the version grows with each one """
+    __slots__ = ()
+
+
+class SnapshotPublisher(Thread):
+    """ Publishes the rows of the collectors as snapshots from its own thread. The UI renders the latest
+        snapshot at its own pace and is woken up through a pipe, so that it can wait for the new snapshots
+        and the keypresses at the same time.
+    """
+
+    def __init__(self, collectors, name):
+        super(SnapshotPublisher, self).__init__(name=name)
+        self.daemon = True
+        self.collectors = collectors
+        self.stopped = Event()
+        self.cond = Condition()
+        self.snapshot = Snapshot(0, {})
+        # the first snapshot with the rates of every collector, the ones before it only have the absolute values
+        self.rates_version = 0
+        self.read_fd, self.write_fd = os.pipe()
+        # a UI that is not listening on the pipe should never block the publisher
+        fcntl.fcntl(self.write_fd, fcntl.F_SETFL, fcntl.fcntl(self.write_fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+    def fileno(self):
+        """ becomes readable whenever a new snapshot is published """
+        return self.read_fd
+
+    def stop(self):
+        self.stopped.set()
+
+    def publish(self):
+        with self.cond:
+            self.snapshot = Snapshot(self.snapshot.version + 1,
+                                     dict((st, st.rows_snapshot) for st in self.collectors))
+            self.cond.notify_all()
+        try:
+            os.write(self.write_fd, b'.')
+        except OSError as e:
+            # the pipe is full, the UI will pick up the latest snapshot anyway
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def latest(self):
+        """ return the latest snapshot and clear the pending wakeups """
+        while wait_for_input([self.read_fd], 0):
+            os.read(self.read_fd, 4096)
+        return self.snapshot
+
+    def wait_for_snapshot(self, version, timeout=None):
+        """ Block until there is a snapshot newer than version and return it """
+        with self.cond:
+            if self.snapshot.version <= version:
+                self.cond.wait(timeout)
+            return self.snapshot
+
+
+class SnapshotConsumer(Thread):
+    """ Takes each new snapshot of a publisher in a thread of its own, so that neither the publisher nor
+        the UI ever wait for it. A snapshot that fails is logged and skipped, and the one published
+        last is taken on close even if it came after the thread has stopped.
+    """
+
+    # seconds to wait on close for the snapshot being consumed, i.e. written to a stalled pipe
+    CLOSE_TIMEOUT = 5
+
+    def __init__(self, publisher, name):
+        super(SnapshotConsumer, self).__init__(name=name)
+        self.daemon = True
+        self.sampler = publisher
+        self.version = 0
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            snapshot = self.sampler.wait_for_snapshot(self.version, consts.MIN_TICK_LENGTH)
+            if snapshot.version != self.version:
+                self._consume(snapshot)
+
+    def consume(self, snapshot):
+        raise NotImplementedError('consume must be implemented by the subclass')
+
+    def _consume(self, snapshot):
+        self.version = snapshot.version
+        try:
+            self.consume(snapshot)
+        except Exception:
+            logger.error('{0} is unable to take the snapshot: {1}'.format(self.name, traceback.format_exc()))
+
+    def close(self):
+        self.stopped.set()
+        # the consumer has been started
+        if self.ident is not None:
+            self.join(self.CLOSE_TIMEOUT)
+            if self.is_alive():
+                logger.warning('{0} is stuck taking a snapshot, giving up on it'.format(self.name))
+                return
+            if self.sampler.snapshot.version != self.version:
+                self._consume(self.sampler.snapshot)
+
+
+class Sampler(SnapshotPublisher):
+    """ Samples the collectors on schedule in its own thread and publishes the results as snapshots.
+        The UI renders the latest snapshot at its own pace, so a slow terminal or a large redraw
+        never shifts the sampling moments and distorts the rates.
+    """
+
+    MAX_SNAPSHOTS_WITHOUT_RATES = 5
+
+    def __init__(self, collectors, consumer, interval_fn, ticks_per_display=1, deadline=None):
+        super(Sampler, self).__init__(collectors, name='sampler')
+        self.consumer = consumer
+        self.interval_fn = interval_fn
+        self.ticks_per_display = ticks_per_display
+        self.deadline = deadline
+        self.pool = CollectorPool(collectors)
+        # writes every snapshot to a file, when set
+        self.recorder = None
+        self.rates_version = None
+
+    def run(self):
+        scheduler = TickScheduler(self.interval_fn())
+        scheduler.start()
+        samples = 0
+        while not self.stopped.is_set():
+            # the disk collector process waits for us to take its results before running du again
+            if 'partitions' not in flags.disabled:
+                self.consumer.consume()
+            # refresh all collectors at once, a slow one shouldn't hold back the rest
+            self.pool.process(self.deadline or scheduler.time_left())
+            samples += 1
+            # sample on every tick, but publish only once per display interval (or right away in the realtime mode)
+            if samples >= self.ticks_per_display or flags.realtime:
+                samples = 0
+                # flush all collectors, but don't bother the UI if none of them has got anything new
+                if any([st.flush_samples() for st in self.collectors]):
+                    self.publish()
+            scheduler.interval = self.interval_fn()
+            scheduler.wait()
+
+    def publish(self):
+        # a collector that fails on every refresh doesn't hold up the ones waiting for the rates for long
+        if self.rates_version is None and (all(st.has_rates() for st in self.collectors if st.enabled) or
+                                           self.snapshot.version + 1 >= self.MAX_SNAPSHOTS_WITHOUT_RATES):
+            # the snapshot about to be published, nobody else publishes
+            self.rates_version = self.snapshot.version + 1
+        super(Sampler, self).publish()
+        if self.recorder is not None:
+            self.recorder.record(self.snapshot)
+
+
+def wait_for_input(fds, timeout=None):
+    """ Block until some of fds become readable and return them. The result is empty on timeout
+        or when the wait is interrupted by a signal, i.e. SIGHUP (python 2 doesn't retry on its own).
+    """
+    try:
+        readable, _, _ = select.select(fds, [], [], timeout)
+    except select.error as e:
+        if e.args[0] != errno.EINTR:
+            raise
+        return []
+    return readable
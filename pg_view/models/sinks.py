@@ -0,0 +1,21 @@
+from pg_view.models.scheduler import SnapshotConsumer
+
+
+class OutputSink(SnapshotConsumer):
+    """ Writes the snapshots published by the sampler with an output method of its own, next to the main
+        output, so that a single collection pass feeds the screen, the files and the exporters at once.
+        The sink formats nothing but the collectors it subscribes to, once for every new snapshot and
+        in its own thread: a slow disk holds up neither the sampler nor the screen.
+    """
+
+    def __init__(self, sampler, output, view, render_fn, name):
+        super(OutputSink, self).__init__(sampler, name='sink-{0}'.format(name))
+        self.output = output
+        # the display options and the names of the collectors to render, they stay as they are at the start
+        self.view = view
+        self.render_fn = render_fn
+
+    def consume(self, snapshot):
+        for result in self.render_fn(snapshot, self.view):
+            self.output.display(result)
+        self.output.refresh()
@@ -10,6 +10,12 @@ if sys.hexversion >= 0x03000000:
 else:
     import ConfigParser
 
+try:
+    from time import monotonic
+except ImportError:
+    # python 2 has no monotonic clock in the standard library
+    from time import time as monotonic  # noqa
+
 
 def enum(**enums):
     return type('Enum', (), enums)
@@ -18,7 +24,8 @@ def enum(**enums):
 STAT_FIELD = enum(st_pid=0, st_process_name=1, st_state=2, st_ppid=3, st_start_time=21)
 BLOCK_SIZE = 1024
 MEM_PAGE_SIZE = resource.getpagesize()
-OUTPUT_METHOD = enum(console='console', json='json', curses='curses')
+OUTPUT_METHOD = enum(console='console', json='json', ndjson='ndjson', csv='csv', tsv='tsv', curses='curses')
+COLLECTOR_NAMES = ('host', 'system', 'memory', 'partitions', 'postgres')
 
 
 def get_valid_output_methods():
@@ -40,6 +47,104 @@ def output_method_is_valid(method):
     return method in get_valid_output_methods()
 
 
+def parse_refresh_intervals(values):
+    """ parse a list of name=seconds refresh intervals of the collectors
+
+    >>> sorted(parse_refresh_intervals(['memory=5', 'partitions=2.5']).items())
+    [('memory', 5.0), ('partitions', 2.5)]
+    >>> parse_refresh_intervals(['foo=1'])
+    Traceback (most recent call last):
+    ...
+    ValueError: unknown collector foo
+    """
+    result = {}
+    for value in values:
+        name, _, seconds = value.partition('=')
+        if name not in COLLECTOR_NAMES:
+            raise ValueError('unknown collector {0}'.format(name))
+        try:
+            result[name] = float(seconds)
+        except ValueError:
+            raise ValueError('refresh interval of {0} is not a number: {1}'.format(name, seconds))
+        if result[name] <= 0:
+            raise ValueError('refresh interval of {0} should be positive'.format(name))
+    return result
+
+
+def parse_sink(value):
+    """ parse the METHOD[:COLLECTOR,...]=FILE of an additional output, it gets all the collectors by default
+
+    >>> parse_sink('ndjson=/var/log/pg_view.ndjson')
+    ('ndjson', None, '/var/log/pg_view.ndjson')
+    >>> parse_sink('csv:memory,postgres=/tmp/pg_view.csv')
+    ('csv', ['memory', 'postgres'], '/tmp/pg_view.csv')
+    >>> parse_sink('curses=/tmp/pg_view.txt')
+    Traceback (most recent call last):
+    ...
+    ValueError: curses output can't be written to a file
+    >>> parse_sink('json:disks=/tmp/pg_view.json')
+    Traceback (most recent call last):
+    ...
+    ValueError: unknown collector disks
+    """
+    spec, _, path = value.partition('=')
+    if not path:
+        raise ValueError('no file to write to in {0}'.format(value))
+    method, _, names = spec.partition(':')
+    if not output_method_is_valid(method):
+        raise ValueError('unknown output method {0}'.format(method))
+    if method == OUTPUT_METHOD.curses:
+        raise ValueError('curses output can\'t be written to a file')
+    if not names:
+        return method, None, path
+    names = names.split(',')
+    for name in names:
+        if name not in COLLECTOR_NAMES:
+            raise ValueError('unknown collector {0}'.format(name))
+    return method, names, path
+
+
+def parse_listen_address(value):
+    """ parse the [host:]port to serve the metrics on, only the local host listens by default
+
+    >>> parse_listen_address('9187')
+    ('127.0.0.1', 9187)
+    >>> parse_listen_address('0.0.0.0:9187')
+    ('0.0.0.0', 9187)
+    >>> parse_listen_address('localhost:http')
+    Traceback (most recent call last):
+    ...
+    ValueError: port is not a number: http
+    """
+    host, _, port = value.rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError('port is not a number: {0}'.format(port))
+    if not 0 < port < 65536:
+        raise ValueError('port is out of range: {0}'.format(port))
+    return host or '127.0.0.1', port
+
+
+def parse_graphite_address(value):
+    """ parse the address of the graphite receiver, either unix:PATH or [host:]port of its plaintext listener
+
+    >>> parse_graphite_address('unix:/run/carbon.sock')
+    '/run/carbon.sock'
+    >>> parse_graphite_address('graphite.example.com:2003')
+    ('graphite.example.com', 2003)
+    >>> parse_graphite_address('unix:')
+    Traceback (most recent call last):
+    ...
+    ValueError: socket path is empty
+    """
+    if value.startswith('unix:'):
+        if not value[5:]:
+            raise ValueError('socket path is empty')
+        return value[5:]
+    return parse_listen_address(value)
+
+
 def read_configuration(config_file_name):
     # read PostgreSQL connection options
     config_data = {}
@@ -73,13 +178,15 @@ def process_single_collector(st):
     """ perform all heavy-lifting for a single collector, i.e. data collection,
         diff calculation, etc. This is meant to be run in a separate thread.
     """
-    from pg_view.collectors.pg_collector import PgstatCollector
-    if isinstance(st, PgstatCollector):
-        st.set_aux_processes_filter(flags.filter_aux)
+    if st.NAME in flags.disabled:
+        # paused from the command line or the keyboard, don't touch the system at all
+        st.disable()
+        return
+    st.enable()
     st.tick()
-    if not flags.freeze:
-        if st.needs_refresh():
-            st.refresh()
+    # collectors with a longer refresh interval keep their previous diffs between refreshes
+    if not flags.freeze and st.needs_refresh():
+        st.refresh()
         if st.needs_diffs():
             st.diff()
         else:
@@ -47,7 +47,7 @@ CLASSIFIERS = [
     'Topic :: Database'
 ]
 
-CONSOLE_SCRIPTS = ['pg_view = pg_view:main']
+CONSOLE_SCRIPTS = ['pg_view = pg_view:main', 'pg_view_undelta = pg_view.models.delta:main']
 
 
 class PyTest(TestCommand):
@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+import mock
+
+import pg_view
+from pg_view.models.scheduler import Snapshot
+from pg_view.utils import OUTPUT_METHOD
+
+
+class BatchModeTest(TestCase):
+    def setUp(self):
+        super(BatchModeTest, self).setUp()
+        self.sampler = mock.Mock(name='sampler', collectors=[], rates_version=1)
+        self.snapshots = [Snapshot(version, {}) for version in range(1, 100)]
+        self.sampler.latest.side_effect = lambda: self.snapshots[self.sampler.wait_for_snapshot.call_count - 1]
+
+    def _run(self, iterations=None, duration=None):
+        options = mock.Mock(iterations=iterations, duration=duration, delta=None, queue_size=10, queue_policy='block')
+        with mock.patch('pg_view.options', options), mock.patch('pg_view.display_collectors') as mocked_display:
+            pg_view.do_loop(None, OUTPUT_METHOD.json, self.sampler, {})
+        return mocked_display
+
+    def test_loop_should_exit_after_the_iterations(self):
+        self.assertEqual(3, self._run(iterations=3).call_count)
+        self.sampler.stop.assert_called_once_with()
+
+    @mock.patch('pg_view.monotonic')
+    def test_loop_should_exit_after_the_duration(self, mocked_monotonic):
+        mocked_monotonic.side_effect = [100, 100, 101, 102, 103, 104]
+        self.assertEqual(2, self._run(duration=2.5).call_count)
+        # never wait past the end of the run
+        self.assertEqual([1, 0], [c[0][1] for c in self.sampler.wait_for_snapshot.call_args_list])
+        self.sampler.stop.assert_called_once_with()
+
+    def test_loop_should_only_count_the_snapshots_with_rates(self):
+        # the first refresh of the collectors has nothing to calculate the rates against
+        self.sampler.rates_version = 2
+        mocked_display = self._run(iterations=1)
+        self.assertEqual(1, mocked_display.call_count)
+        self.assertEqual(2, mocked_display.call_args[0][4].version)
@@ -0,0 +1,205 @@
+from unittest import TestCase
+
+import mock
+
+from pg_view import flags
+from pg_view.collectors.base_collector import SampleAggregator, StatCollector
+from pg_view.collectors.host_collector import HostStatCollector
+from pg_view.collectors.memory_collector import MemoryStatCollector
+from pg_view.collectors.system_collector import SystemStatCollector
+from pg_view.utils import OUTPUT_METHOD, process_single_collector
+
+
+class StatCollectorRefreshTest(TestCase):
+    def setUp(self):
+        super(StatCollectorRefreshTest, self).setUp()
+        self.collector = StatCollector()
+
+    def _refreshed_ticks(self, ticks):
+        result = []
+        for tick in range(1, ticks + 1):
+            self.collector.tick()
+            if self.collector.needs_refresh():
+                result.append(tick)
+        return result
+
+    def test_needs_refresh_should_refresh_every_tick_by_default(self):
+        self.assertEqual([1, 2, 3], self._refreshed_ticks(3))
+
+    def test_needs_refresh_should_refresh_on_first_tick_when_interval_is_longer(self):
+        self.collector.set_refresh_interval(3, 1)
+        self.assertEqual([1, 4, 7], self._refreshed_ticks(7))
+
+    def test_set_refresh_interval_should_round_to_ticks(self):
+        self.collector.set_refresh_interval(1, 0.3)
+        self.assertEqual(3, self.collector.ticks_per_refresh)
+        self.collector.set_refresh_interval(0.1, 1)
+        self.assertEqual(1, self.collector.ticks_per_refresh)
+
+
+class StatCollectorDisableTest(TestCase):
+    def setUp(self):
+        super(StatCollectorDisableTest, self).setUp()
+        self.collector = SystemStatCollector()
+        self.collector.refresh = mock.Mock(side_effect=lambda: self.collector._do_refresh([{'cpu': 1}]))
+        self.collector.diff = mock.Mock()
+        self.addCleanup(setattr, flags, 'disabled', set())
+
+    def test_disabled_collector_should_not_refresh_and_start_over_when_enabled(self):
+        process_single_collector(self.collector)
+        process_single_collector(self.collector)
+        self.assertEqual(1, self.collector.diff.call_count)
+        self.collector.take_snapshot()
+        self.collector.flush_samples()
+
+        flags.disabled = set(['system'])
+        process_single_collector(self.collector)
+        self.assertEqual(2, self.collector.refresh.call_count)
+        self.assertEqual(([], [], []), (self.collector.rows_prev, self.collector.rows_cur,
+                                        self.collector.rows_snapshot))
+
+        flags.disabled = set()
+        self.collector.set_refresh_interval(10, 1)
+        process_single_collector(self.collector)
+        # refreshed right away, but there is nothing to diff against yet
+        self.assertEqual(3, self.collector.refresh.call_count)
+        self.assertEqual(1, self.collector.diff.call_count)
+        self.assertFalse(self.collector.has_rates())
+        self.collector.set_refresh_interval(1, 1)
+        process_single_collector(self.collector)
+        self.assertTrue(self.collector.has_rates())
+
+
+class StatCollectorViewportTest(TestCase):
+    def setUp(self):
+        super(StatCollectorViewportTest, self).setUp()
+        self.collector = StatCollector()
+        self.collector.ncurses_filter_row = lambda row: row['type'] == 'aux'
+        self.rows = [{'pid': pid, 'type': 'aux' if pid % 2 else 'backend'} for pid in range(10)]
+
+    def test_rows_in_viewport_should_filter_before_limiting(self):
+        self.collector.set_viewport(3, 2)
+        rows, offset, total = self.collector._rows_in_viewport(self.rows)
+        self.assertEqual([0, 2], [r['pid'] for r in rows])
+        self.assertEqual((0, 5), (offset, total))
+
+    def test_rows_in_viewport_should_scroll_scrollable_collectors_up_to_the_last_row(self):
+        self.collector.SCROLLABLE = True
+        self.collector.set_viewport(3, 2)
+        rows, offset, total = self.collector._rows_in_viewport(self.rows)
+        self.assertEqual([6, 8], [r['pid'] for r in rows])
+        self.collector.set_viewport(100, 2)
+        rows, offset, total = self.collector._rows_in_viewport(self.rows)
+        self.assertEqual([8], [r['pid'] for r in rows])
+        self.assertEqual(4, offset)
+
+
+class StatCollectorCachedOutputTest(TestCase):
+    def setUp(self):
+        super(StatCollectorCachedOutputTest, self).setUp()
+        self.collector = MemoryStatCollector()
+        self.collector.set_rows_snapshot(self._rows(2048, 1024))
+        self.output = mock.patch.object(self.collector, 'output', wraps=self.collector.output).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def _rows(self, total, free):
+        row = dict((col.get('in', col['out']), 0) for col in self.collector.output_transform_data)
+        row.update(total=total, free=free)
+        return [row]
+
+    def _flush(self, rows):
+        self.collector.samples.add(rows)
+        self.collector.flush_samples()
+        return self.collector.rows_snapshot
+
+    def test_flush_samples_should_keep_the_version_while_the_rows_stay_the_same(self):
+        rows = self.collector.rows_snapshot
+        self.assertIs(rows, self._flush(self._rows(2048, 1024)))
+        self.assertEqual(1, self.collector.content_version)
+        self._flush(self._rows(2048, 512))
+        self.assertEqual(2, self.collector.content_version)
+
+    def test_flush_samples_should_keep_the_version_while_the_values_shown_stay_the_same(self):
+        rows = self._flush(self._rows(2049, 1024))
+        self.assertEqual(1, self.collector.content_version)
+        # the raw values are replaced all the same, for the csv output, the recording and the exporters
+        self.assertEqual(2049, self.collector.rows_snapshot[0]['total'])
+        table = self.collector.cached_output(OUTPUT_METHOD.csv, rows)
+        self.assertEqual(2049, table['rows'][0][table['header'].index('total KB')])
+
+    def test_cached_output_should_format_the_same_rows_once(self):
+        rows = self.collector.rows_snapshot
+        first = self.collector.cached_output(OUTPUT_METHOD.console, rows)
+        self._flush(self._rows(2048, 1024))
+        self.assertIs(first, self.collector.cached_output(OUTPUT_METHOD.console, rows))
+        self.assertEqual(1, self.output.call_count)
+        # every method is cached on its own
+        self.collector.cached_output(OUTPUT_METHOD.json, rows)
+        self.assertIs(first, self.collector.cached_output(OUTPUT_METHOD.console, rows))
+        self.assertEqual(2, self.output.call_count)
+
+    def test_cached_output_should_format_again_on_changes(self):
+        rows = self.collector.rows_snapshot
+        self.collector.cached_output(OUTPUT_METHOD.console, rows)
+        self.collector.set_units_display(True)
+        self.assertIn('MB', self.collector.cached_output(OUTPUT_METHOD.console, rows))
+        self.collector.stale = True
+        self.assertIn('(stale)', self.collector.cached_output(OUTPUT_METHOD.console, rows))
+        rows = self._flush(self._rows(4096, 1024))
+        self.assertIn('4.0', self.collector.cached_output(OUTPUT_METHOD.console, rows))
+        self.assertEqual(4, self.output.call_count)
+
+    def test_cached_output_should_always_format_the_rows_of_others(self):
+        rows = self._rows(2048, 1024)
+        self.collector.cached_output(OUTPUT_METHOD.console, rows)
+        self.collector.cached_output(OUTPUT_METHOD.console, rows)
+        self.assertEqual(2, self.output.call_count)
+
+
+class SampleAggregatorTest(TestCase):
+    def setUp(self):
+        super(SampleAggregatorTest, self).setUp()
+        self.aggregator = SampleAggregator(['read'], lambda idx, row: row['pid'])
+
+    def test_result_should_return_single_sample_as_is(self):
+        self.aggregator.add([{'pid': 1, 'read': 2}])
+        self.assertEqual([{'pid': 1, 'read': 2}], self.aggregator.result())
+
+    def test_result_should_average_samples_and_keep_extremes(self):
+        self.aggregator.add([{'pid': 1, 'read': 1, 'state': 'idle'}])
+        self.aggregator.add([{'pid': 1, 'read': 5, 'state': 'active'}])
+        row = self.aggregator.result()[0]
+        self.assertEqual(3, row['read'])
+        self.assertEqual('active', row['state'])
+        self.assertEqual({'read': 1}, row['_min'])
+        self.assertEqual({'read': 5}, row['_max'])
+
+    def test_result_should_keep_rows_gone_since_earlier_samples(self):
+        self.aggregator.add([{'pid': 1, 'read': 1}, {'pid': 2, 'read': 2}])
+        self.aggregator.add([{'pid': 3, 'read': 3}, {'pid': 1, 'read': 1}])
+        self.assertEqual([3, 1, 2], [row['pid'] for row in self.aggregator.result()])
+
+    def test_result_should_keep_rows_gone_since_earlier_samples_where_they_were(self):
+        self.aggregator.add([{'pid': 1, 'read': 1}, {'pid': 2, 'read': 2, 'locked_by': '1'}, {'pid': 3, 'read': 3}])
+        self.aggregator.add([{'pid': 1, 'read': 1}, {'pid': 3, 'read': 3}])
+        self.assertEqual([1, 2, 3], [row['pid'] for row in self.aggregator.result()])
+
+    def test_reset_should_forget_samples(self):
+        self.aggregator.add([{'pid': 1, 'read': 1}])
+        self.aggregator.reset()
+        self.assertEqual([], self.aggregator.result())
+
+
+class HostStatCollectorStaticDataTest(TestCase):
+    @mock.patch('pg_view.collectors.host_collector.HostStatCollector._read_uname', return_value={'sysname': 'Linux'})
+    @mock.patch('pg_view.collectors.host_collector.HostStatCollector._read_uptime', return_value={'uptime': '1:00'})
+    def test_refresh_should_read_static_data_once_until_invalidated(self, mocked_uptime, mocked_uname):
+        collector = HostStatCollector()
+        collector.refresh()
+        collector.refresh()
+        self.assertEqual(1, mocked_uname.call_count)
+        self.assertEqual(2, mocked_uptime.call_count)
+        self.assertEqual('Linux', collector.rows_cur[0]['sysname'])
+        collector.invalidate_static_data()
+        collector.refresh()
+        self.assertEqual(2, mocked_uname.call_count)
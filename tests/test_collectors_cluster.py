@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+import mock
+
+from pg_view.collectors.cluster_collector import ClusterStatCollector
+from pg_view.collectors.pg_collector import PgstatCollector
+from pg_view.utils import OUTPUT_METHOD
+
+
+class ClusterStatCollectorTest(TestCase):
+    def setUp(self):
+        super(ClusterStatCollectorTest, self).setUp()
+        self.main = self._group('main', 'master', 10, 2)
+        self.replica = self._group('replica', 'standby', 3, 0)
+        self.collector = ClusterStatCollector({'/data/main': self.main, '/data/replica': self.replica})
+
+    @staticmethod
+    def _group(name, role, conns, active):
+        pg = mock.Mock(dbname=name, dbver=9.6, total_connections=conns, active_connections=active)
+        pg.role.return_value = role
+        pg.ident.return_value = 'postgres ({0}/9.6)'.format(name)
+        return {'pg': pg, 'partitions': mock.Mock()}
+
+    def test_aggregate_should_sum_up_each_cluster(self):
+        rows = {
+            self.main['pg']: [{'utime': 0.5, 'stime': 0.1, 'read_bytes': 10, 'write_bytes': 1, 'waiting': True},
+                              {'utime': 0.2, 'stime': None, 'read_bytes': 5, 'write_bytes': None, 'waiting': False}],
+            self.main['partitions']: [{'type': 'data', 'space_left': 1024, 'time_until_full': None},
+                                      {'type': 'xlog', 'space_left': 1, 'time_until_full': 60}],
+            self.replica['partitions']: [{'type': 'data', 'space_left': 2048, 'time_until_full': 600}],
+        }
+        main, replica = self.collector.aggregate(rows)
+        self.assertEqual(('main/9.6', 'master', 10, 2, 1),
+                         (main['cluster'], main['role'], main['conns'], main['active'], main['waiting']))
+        self.assertAlmostEqual(0.8, main['cpu'])
+        self.assertEqual((15, 1, 1024, 'warning'), (main['read_bytes'], main['write_bytes'], main['space_left'],
+                                                    main['status']))
+        self.assertEqual(('replica/9.6', 0, 'critical'), (replica['cluster'], replica['waiting'], replica['status']))
+
+    def test_output_should_point_the_cursor_at_the_top_row(self):
+        self.main['pg'].role.return_value = 'offline'
+        self.collector.set_viewport(1, None)
+        result = self.collector.output(OUTPUT_METHOD.curses, rows=self.collector.aggregate({}))['clusters']
+        self.assertEqual('postgres (replica/9.6)', result['cursor'])
+        self.collector.set_viewport(0, None)
+        result = self.collector.output(OUTPUT_METHOD.curses, rows=self.collector.aggregate({}))['clusters']
+        self.assertEqual('offline', result['rows'][0]['role'].value)
+
+
+class PgstatCollectorDetailsTest(TestCase):
+    def setUp(self):
+        super(PgstatCollectorDetailsTest, self).setUp()
+        self.collector = PgstatCollector(mock.MagicMock(), mock.Mock(), 1049, 'main', 9.6, [])
+
+    @mock.patch.object(PgstatCollector, '_read_proc')
+    @mock.patch.object(PgstatCollector, '_read_active_backends')
+    @mock.patch.object(PgstatCollector, '_read_pg_stat_activity')
+    @mock.patch.object(PgstatCollector, 'get_subprocesses_pid')
+    def test_refresh_should_only_read_active_backends_unless_details_are_requested(
+            self, mocked_pids, mocked_full, mocked_active, mocked_proc):
+        mocked_active.return_value = {5: {'pid': 5, 'waiting': False}}
+        mocked_proc.return_value = {'state': 'R'}
+        self.collector.details_until = 0
+        self.collector.refresh()
+        mocked_pids.assert_not_called()
+        mocked_full.assert_not_called()
+        mocked_proc.assert_called_once_with(5, True, True)
+        self.assertEqual([{'pid': 5, 'waiting': False, 'state': 'R'}], self.collector.rows_cur)
+
+        self.collector.request_details()
+        self.collector.refresh()
+        mocked_pids.assert_called_once_with()
+        mocked_full.assert_called_once_with()
+
+    @mock.patch('pg_view.collectors.pg_collector.monotonic')
+    def test_details_should_outlive_the_lease_when_kept(self, mocked_monotonic):
+        mocked_monotonic.return_value = 100
+        self.collector.details_until = 0
+        self.collector.keep_details()
+        # i.e. the viewer of a recording collector looks at the processes for a while
+        self.collector.request_details()
+        mocked_monotonic.return_value += 10 * self.collector.details_lease
+        self.assertTrue(self.collector.details_requested())
@@ -0,0 +1,66 @@
+import json
+from unittest import TestCase
+
+import mock
+
+from pg_view.collectors.pg_collector import PgstatCollector
+from pg_view.utils import OUTPUT_METHOD
+
+
+class PgstatCollectorGroupTest(TestCase):
+    def setUp(self):
+        super(PgstatCollectorGroupTest, self).setUp()
+        self.collector = PgstatCollector(mock.MagicMock(), mock.Mock(), 1049, 'main', 9.6, [])
+        self.collector.set_aux_processes_filter(False)
+        self.rows = [
+            self._row(1, 'db1', 'active', utime=2, read_bytes=10),
+            self._row(2, 'db1', 'idle'),
+            self._row(3, 'db2', 'idle in transaction', waiting=True),
+            self._row(4, 'db1', 'idle in transaction (aborted)', utime=1, read_bytes=5),
+            self._row(5, 'db2', 'idle'),
+            self._row(6, 'db1', 'idle'),
+            dict(self._row(7, None, 'autovacuum'), type='autovacuum'),
+        ]
+
+    @staticmethod
+    def _row(pid, datname, query, utime=0, read_bytes=0, waiting=False):
+        return {'pid': pid, 'type': 'backend', 'datname': datname, 'usename': 'postgres', 'client_addr': 'local',
+                'application_name': 'psql', 'query': query, 'waiting': waiting, 'utime': utime, 'stime': 0,
+                'read_bytes': read_bytes, 'write_bytes': 0, 'uss': 0, 'locked_by': None}
+
+    def test_aggregate_should_count_backends_per_group(self):
+        groups = self.collector.grouped.aggregate(self.rows)
+        self.assertEqual(['db1', 'db2'], [g['group'] for g in groups])
+        db1, db2 = groups
+        self.assertEqual((4, 1, 2, 1, 0), (db1['count'], db1['active'], db1['idle'], db1['idle_tx'], db1['waiting']))
+        self.assertEqual((2, 0, 1, 1, 1), (db2['count'], db2['active'], db2['idle'], db2['idle_tx'], db2['waiting']))
+        self.assertEqual((3, 15), (db1['cpu'], db1['read_bytes']))
+
+    def test_output_should_hide_idle_processes_unless_grouped(self):
+        result = self.collector.output(OUTPUT_METHOD.curses, rows=self.rows)[self.collector.ident()]
+        self.assertEqual(['1', '3', '4', '7'], [row['pid'].value for row in result['rows']])
+        self.assertEqual({'column': None, 'columns': ['datname', 'usename', 'client_addr', 'application_name']},
+                         result['group'])
+
+    def test_set_group_by_should_switch_to_the_grouped_view(self):
+        self.collector.set_group_by('application_name')
+        result = self.collector.output(OUTPUT_METHOD.curses, rows=self.rows)[self.collector.ident()]
+        self.assertEqual(['psql'], [row['app'].value for row in result['rows']])
+        self.assertEqual('6', result['rows'][0]['count'].value)
+        self.assertEqual('application_name', result['group']['column'])
+        self.collector.set_group_by('foo')
+        self.assertIsNone(self.collector.group_by)
+
+    def test_json_output_should_name_the_grouped_view_and_its_cluster(self):
+        self.collector.set_group_by('datname')
+        result = json.loads(self.collector.output(OUTPUT_METHOD.json, rows=self.rows))
+        self.assertEqual(('pggroup', 'main/9.6'), (result['type'], result['name']))
+
+    def test_cached_output_should_follow_the_aux_processes_filter(self):
+        self.collector.set_rows_snapshot(self.rows + [dict(self._row(8, None, 'active'), type='checkpointer')])
+        rows = self.collector.rows_snapshot
+        result = self.collector.cached_output(OUTPUT_METHOD.curses, rows)[self.collector.ident()]
+        self.assertIn('8', [row['pid'].value for row in result['rows']])
+        self.collector.set_aux_processes_filter(True)
+        result = self.collector.cached_output(OUTPUT_METHOD.curses, rows)[self.collector.ident()]
+        self.assertNotIn('8', [row['pid'].value for row in result['rows']])
@@ -0,0 +1,41 @@
+from unittest import TestCase
+
+import mock
+
+from pg_view.collectors.pg_collector import PgstatCollector
+from pg_view.utils import OUTPUT_METHOD
+
+
+class PgstatCollectorIdleBudgetTest(TestCase):
+    def setUp(self):
+        super(PgstatCollectorIdleBudgetTest, self).setUp()
+        self.collector = PgstatCollector(mock.MagicMock(), mock.Mock(), 1049, 'main', 9.6, [7], idle_budget=2)
+        self.stat_data = dict((pid, {'pid': pid, 'query': 'idle'}) for pid in range(1, 8))
+        self.stat_data[3]['query'] = 'select 1'
+
+    @mock.patch.object(PgstatCollector, '_read_idle_proc')
+    @mock.patch.object(PgstatCollector, '_read_proc')
+    @mock.patch.object(PgstatCollector, '_read_pg_stat_activity')
+    @mock.patch.object(PgstatCollector, 'get_subprocesses_pid')
+    def test_refresh_should_sample_idle_backends_in_turns(self, mocked_pids, mocked_stat, mocked_proc, mocked_idle):
+        self.collector.pids = sorted(self.stat_data)
+        mocked_stat.return_value = self.stat_data
+        mocked_proc.return_value = {'state': 'R'}
+        mocked_idle.side_effect = lambda pid: {'state': 'S', 'uss': pid}
+        sampled = []
+        for _ in range(3):
+            mocked_idle.reset_mock()
+            self.collector.refresh()
+            sampled.append([c[0][0] for c in mocked_idle.call_args_list])
+        # the active backend and the tracked one are read on every tick
+        self.assertEqual([3, 7], sorted(c[0][0] for c in mocked_proc.call_args_list[-2:]))
+        self.assertEqual([[1, 2], [4, 5], [6, 1]], sampled)
+        rows = dict((row['pid'], row) for row in self.collector.rows_cur)
+        self.assertEqual(7, len(rows))
+        self.assertEqual({'pid': 4, 'type': 'backend', 'state': 'S', 'uss': 4, 'query': 'idle'}, rows[4])
+
+    def test_output_should_collapse_idle_backends_into_a_summary_row(self):
+        rows = [dict(row, type='backend', locked_by=None, uss=1) for row in self.stat_data.values()]
+        result = self.collector.output(OUTPUT_METHOD.curses, rows=rows)[self.collector.ident()]
+        self.assertEqual(['3', '7', ''], [row['pid'].value for row in result['rows']])
+        self.assertEqual('5 idle backends', result['rows'][-1]['query'].value)
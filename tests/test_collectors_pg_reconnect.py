@@ -0,0 +1,67 @@
+import threading
+from unittest import TestCase
+
+import mock
+import psycopg2
+
+from pg_view.collectors.pg_collector import PgstatCollector
+
+
+class PgstatCollectorReconnectTest(TestCase):
+    def setUp(self):
+        super(PgstatCollectorReconnectTest, self).setUp()
+        self.reconnect = mock.Mock()
+        self.collector = PgstatCollector(mock.MagicMock(), self.reconnect, 1049, 'main', 9.6, [])
+        self.collector.pgcon = None
+
+    def _wait_for_worker(self):
+        self.collector.reconnect_worker.join(1)
+
+    def test_check_reconnect_should_not_block_when_connecting(self):
+        release = threading.Event()
+        self.reconnect.side_effect = lambda: release.wait()
+        self.assertFalse(self.collector._check_reconnect())
+        self.assertFalse(self.collector._check_reconnect())
+        self.assertIn('(offline, reconnecting)', self.collector.ncurses_produce_prefix())
+        release.set()
+
+    @mock.patch('pg_view.collectors.pg_collector.random.uniform', return_value=1)
+    def test_check_reconnect_should_back_off_when_connection_fails(self, mocked_uniform):
+        self.reconnect.side_effect = psycopg2.OperationalError('down')
+        self.assertFalse(self.collector._check_reconnect())
+        self._wait_for_worker()
+        with mock.patch('pg_view.collectors.pg_collector.monotonic', return_value=100):
+            self.assertFalse(self.collector._check_reconnect())
+            self.assertEqual(101, self.collector.next_reconnect_time)
+            self.assertIn('reconnecting in 1s', self.collector.ncurses_produce_prefix())
+            # no new attempt before the delay expires
+            self.assertFalse(self.collector._check_reconnect())
+            self.assertIsNone(self.collector.reconnect_worker)
+        with mock.patch('pg_view.collectors.pg_collector.monotonic', return_value=101):
+            self.collector._check_reconnect()
+            self._wait_for_worker()
+            self.collector._check_reconnect()
+        self.assertEqual(103, self.collector.next_reconnect_time)
+
+    @mock.patch('pg_view.collectors.pg_collector.dbversion_as_float', return_value=9.6)
+    def test_check_reconnect_should_restore_connection_when_succeeded(self, mocked_dbversion):
+        pgcon = mock.MagicMock()
+        pgcon.get_backend_pid.return_value = 42
+        self.reconnect.return_value = (pgcon, 1050)
+        self.collector.reconnect_failures = 3
+        self.collector._check_reconnect()
+        self._wait_for_worker()
+        self.assertTrue(self.collector._check_reconnect())
+        self.assertEqual(pgcon, self.collector.pgcon)
+        self.assertEqual(1050, self.collector.postmaster_pid)
+        self.assertEqual(42, self.collector.connection_pid)
+        self.assertEqual(0, self.collector.reconnect_failures)
+
+    def test_reconnect_should_close_the_connection_when_reading_its_invariants_fails(self):
+        pgcon = mock.MagicMock()
+        pgcon.get_backend_pid.side_effect = psycopg2.OperationalError('gone again')
+        self.reconnect.return_value = (pgcon, 1050)
+        self.collector._check_reconnect()
+        self._wait_for_worker()
+        self.assertFalse(self.collector._check_reconnect())
+        pgcon.close.assert_called_once_with()
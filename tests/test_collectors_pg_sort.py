@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+import mock
+
+from pg_view.collectors.pg_collector import PgstatCollector
+
+
+class PgstatCollectorSortTest(TestCase):
+    def setUp(self):
+        super(PgstatCollectorSortTest, self).setUp()
+        self.collector = PgstatCollector(mock.MagicMock(), mock.Mock(), 1049, 'main', 9.6, [])
+        self.collector.set_aux_processes_filter(False)
+        # ordered by age, 4 is blocked by 3 and 5 by 4
+        self.rows = [
+            self._row(1, utime=1),
+            self._row(2, utime=5),
+            self._row(3, utime=0),
+            self._row(4, utime=9, locked_by='3'),
+            self._row(5, utime=0, locked_by='4'),
+            self._row(6, utime=7),
+        ]
+
+    @staticmethod
+    def _row(pid, utime, locked_by=None):
+        return {'pid': pid, 'type': 'backend', 'utime': utime, 'stime': 0, 'read_bytes': pid, 'locked_by': locked_by}
+
+    def _pids(self, offset, limit):
+        self.collector.set_viewport(offset, limit)
+        rows, _, _ = self.collector._rows_in_viewport(self.rows)
+        return [r['pid'] for r in rows]
+
+    def test_rows_should_keep_collector_order_by_default(self):
+        self.assertEqual([1, 2, 3], self._pids(0, 3))
+
+    def test_rows_should_be_sorted_with_blocked_processes_under_the_blocker(self):
+        self.collector.set_sort_key('cpu')
+        self.assertEqual([3, 4, 5, 6, 2, 1], self._pids(0, None))
+        self.assertEqual([3, 4], self._pids(0, 2))
+        self.assertEqual([6, 2], self._pids(3, 2))
+
+    def test_rows_should_keep_blocked_processes_gone_since_under_the_blocker(self):
+        # 4 is gone by the end of the interval, so the aggregated rows have it after the blocker's successor
+        self.rows = [self._row(1, utime=1), self._row(3, utime=0), self._row(6, utime=7),
+                     self._row(4, utime=9, locked_by='3')]
+        self.collector.set_sort_key('cpu')
+        self.assertEqual([3, 4, 6, 1], self._pids(0, None))
+
+    def test_set_sort_key_should_ignore_unknown_keys(self):
+        self.collector.set_sort_key('read')
+        self.assertEqual([6, 3, 4], self._pids(0, 3))
+        self.collector.set_sort_key('foo')
+        self.assertEqual([1, 2, 3], self._pids(0, 3))
@@ -0,0 +1,27 @@
+from unittest import TestCase
+
+import mock
+
+import pg_view
+from pg_view import flags
+
+
+class ProcessKeyTest(TestCase):
+    def setUp(self):
+        super(ProcessKeyTest, self).setUp()
+        self.output = mock.Mock(name='output', collecting=True, **{'focused_panel.return_value': None})
+        for name, value in ('disabled', set()), ('realtime', False), ('display_units', False):
+            patcher = mock.patch.object(flags, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_keys_should_pause_the_collectors_and_switch_to_realtime(self):
+        self.assertTrue(pg_view.process_key(ord('2'), self.output))
+        pg_view.process_key(ord('r'), self.output)
+        self.assertEqual((set(['system']), True), (flags.disabled, flags.realtime))
+
+    def test_viewer_should_only_change_its_display_options(self):
+        self.output.collecting = False
+        for key in '2ru':
+            pg_view.process_key(ord(key), self.output)
+        self.assertEqual((set(), False, True), (flags.disabled, flags.realtime, flags.display_units))
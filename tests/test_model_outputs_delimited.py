@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+import mock
+
+from pg_view.collectors.memory_collector import MemoryStatCollector
+from pg_view.models.outputs import DelimitedOutput
+from pg_view.utils import OUTPUT_METHOD
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class DelimitedOutputTest(TestCase):
+    def setUp(self):
+        super(DelimitedOutputTest, self).setUp()
+        self.collector = MemoryStatCollector()
+        self.rows = [{'total': 2048, 'free': 1024, 'dirty': 4}]
+
+    def test_collector_output_should_skip_the_widths_and_cooking(self):
+        with mock.patch.object(MemoryStatCollector, '_calculate_dynamic_width') as mocked_width:
+            result = self.collector.output(OUTPUT_METHOD.csv, rows=self.rows)
+        self.assertFalse(mocked_width.called)
+        self.assertEqual('memory', result['collector'])
+        self.assertEqual(len(result['header']), len(result['rows'][0]))
+        self.assertEqual(2048, result['rows'][0][result['header'].index('total KB')])
+
+    def test_collector_output_should_name_the_units_of_the_raw_values(self):
+        self.assertEqual('read B/s', self.collector._produce_table_name({'out': 'read', 'units': 'MB/s',
+                                                                        'fn': MemoryStatCollector.bytes_to_mbytes}))
+        self.assertEqual('age s', self.collector._produce_table_name({'out': 'age',
+                                                                      'fn': MemoryStatCollector.time_pretty_print}))
+        self.assertEqual('pid', self.collector._produce_table_name({'out': 'pid', 'fn': int}))
+
+    @mock.patch('pg_view.models.outputs.time.time', return_value=1.5)
+    def test_refresh_should_write_the_header_once_per_collector(self, _):
+        stream = StringIO()
+        output = DelimitedOutput(stream, '\t')
+        for tick in range(2):
+            output.display({'collector': 'postgres (main/9.6)', 'header': ['pid', 'query'],
+                            'rows': [[1, 'select\t1'], [2, None]]})
+            output.refresh()
+        rows = ['1.500\tpostgres (main/9.6)\t1\t"select\t1"', '1.500\tpostgres (main/9.6)\t2\t']
+        self.assertEqual(['time\tcollector\tpid\tquery'] + rows * 2, stream.getvalue().splitlines())
+
+    @mock.patch('pg_view.models.outputs.time.time', return_value=1.5)
+    def test_refresh_should_write_a_file_per_collector(self, _):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = DelimitedOutput(None, ',', directory)
+        output.display({'collector': 'memory', 'header': ['free'], 'rows': [[1]]})
+        output.display({'collector': 'postgres (main/9.6)', 'header': ['pid'], 'rows': [[1], [2]]})
+        output.refresh()
+        self.assertEqual(['memory.csv', 'postgres_main_9.6.csv'], sorted(os.listdir(directory)))
+        with open(os.path.join(directory, 'postgres_main_9.6.csv')) as f:
+            self.assertEqual('time,pid\n1.500,1\n1.500,2\n', f.read())
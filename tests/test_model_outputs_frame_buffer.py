@@ -0,0 +1,46 @@
+from unittest import TestCase
+
+import mock
+
+from pg_view.models.outputs import FrameBuffer
+
+
+class FrameBufferTest(TestCase):
+    def setUp(self):
+        super(FrameBufferTest, self).setUp()
+        self.screen = mock.Mock()
+        self.screen.getmaxyx.return_value = (25, 80)
+        self.frame = FrameBuffer(self.screen)
+
+    def _draw(self, *texts):
+        self.screen.reset_mock()
+        self.frame.erase()
+        for y, x, text, attr in texts:
+            self.frame.addnstr(y, x, text, len(text), attr)
+        self.frame.refresh()
+        return self.screen.addnstr.call_args_list
+
+    def test_refresh_should_draw_runs_of_same_attribute(self):
+        calls = self._draw((0, 2, 'ab', 1), (0, 4, 'cd', 2))
+        self.assertEqual([mock.call(0, 2, 'ab', 2, 1), mock.call(0, 4, 'cd', 2, 2)], calls)
+        self.screen.refresh.assert_called_once_with()
+
+    def test_refresh_should_skip_unchanged_cells(self):
+        self._draw((0, 0, 'cpu 10', 1), (1, 0, 'mem 20', 1))
+        self.assertEqual([], self._draw((0, 0, 'cpu 10', 1), (1, 0, 'mem 20', 1)))
+        self.assertEqual([mock.call(1, 5, '5', 1, 1)], self._draw((0, 0, 'cpu 10', 1), (1, 0, 'mem 25', 1)))
+
+    def test_refresh_should_blank_cells_that_are_gone(self):
+        self._draw((0, 0, 'abc', 1), (1, 0, 'x', 1))
+        self.assertEqual([mock.call(0, 2, ' ', 1, 0), mock.call(1, 0, ' ', 1, 0)], self._draw((0, 0, 'ab', 1)))
+
+    def test_refresh_should_redraw_everything_after_resize(self):
+        self._draw((0, 0, 'abc', 1))
+        self.screen.getmaxyx.return_value = (30, 100)
+        self.assertEqual([mock.call(0, 0, 'abc', 3, 1)], self._draw((0, 0, 'abc', 1)))
+        self.screen.erase.assert_called_once_with()
+
+    def test_inch_should_read_the_frame_being_drawn(self):
+        self.frame.addnstr(0, 1, 'a', 1, 256)
+        self.assertEqual(ord('a') | 256, self.frame.inch(0, 1))
+        self.assertEqual(ord(' '), self.frame.inch(0, 5))
@@ -0,0 +1,101 @@
+import errno
+import json
+from threading import Event, Thread
+from unittest import TestCase
+
+import mock
+
+import pg_view
+from pg_view.models.outputs import FrameQueue
+from pg_view.utils import OUTPUT_METHOD
+
+
+class StalledReader(object):
+    """ the standard output of a reader that doesn't read until released """
+
+    def __init__(self):
+        self.started = Event()
+        self.released = Event()
+        self.data = []
+
+    def write(self, text):
+        self.started.set()
+        self.released.wait(5)
+        self.data.append(text)
+
+    def flush(self):
+        pass
+
+
+class FrameQueueTest(TestCase):
+    def setUp(self):
+        super(FrameQueueTest, self).setUp()
+        self.reader = StalledReader()
+
+    def _queue(self, policy):
+        queue = FrameQueue(self.reader, 2, policy)
+        self.addCleanup(queue.close)
+        self.addCleanup(self.reader.released.set)
+        return queue
+
+    def _send(self, queue, *frames):
+        for frame in frames:
+            queue.write(frame)
+            queue.flush()
+            queue.end_frame()
+            # the writer is stuck with the first frame, the rest wait in the queue
+            self.reader.started.wait(5)
+
+    def _written(self, queue):
+        self.reader.released.set()
+        queue.close()
+        return self.reader.data
+
+    def test_drop_oldest_should_make_room_for_the_new_frame(self):
+        queue = self._queue('drop-oldest')
+        self._send(queue, '1', '2', '3', '4')
+        self.assertEqual(1, queue.dropped)
+        self.assertEqual(['1', '3', '4'], self._written(queue))
+
+    def test_drop_newest_should_keep_the_queued_frames(self):
+        queue = self._queue('drop-newest')
+        self._send(queue, '1', '2', '3', '4', '5')
+        self.assertEqual(2, queue.dropped)
+        self.assertEqual(['1', '2', '3'], self._written(queue))
+
+    def test_block_should_wait_for_room_in_the_queue(self):
+        queue = self._queue('block')
+        self._send(queue, '1', '2', '3')
+        sender = Thread(target=self._send, args=(queue, '4'))
+        sender.start()
+        sender.join(0.1)
+        self.assertTrue(sender.is_alive())
+        self.reader.released.set()
+        sender.join()
+        self.assertEqual(['1', '2', '3', '4'], self._written(queue))
+        self.assertEqual(0, queue.dropped)
+
+    def test_frames_should_be_refused_once_the_reader_is_gone(self):
+        stream = mock.Mock(name='stream')
+        stream.write.side_effect = IOError(errno.EPIPE, 'Broken pipe')
+        queue = FrameQueue(stream, 2, 'block')
+        queue.end_frame()
+        queue.writer.join(5)
+        self.assertRaises(IOError, queue.end_frame)
+
+
+class DroppedNoticeTest(TestCase):
+    def test_next_frame_should_lead_with_the_dropped_frames(self):
+        output = mock.Mock(name='output')
+        queue = mock.Mock(name='queue', dropped=3)
+        with mock.patch('pg_view.output_queue', queue), mock.patch('pg_view.options', mock.Mock(clear_screen=False)):
+            pg_view.show_output(output, OUTPUT_METHOD.ndjson, ['{"type":"memory"}'])
+        self.assertEqual([mock.call('{"type":"dropped","frames":3}'), mock.call('{"type":"memory"}')],
+                         output.display.call_args_list)
+        output.refresh.assert_called_once_with()
+        queue.end_frame.assert_called_once_with()
+
+    def test_notice_should_follow_the_output_format(self):
+        self.assertEqual({'type': 'dropped', 'frames': 2}, json.loads(pg_view.dropped_notice(OUTPUT_METHOD.json, 2)))
+        self.assertEqual([[2]], pg_view.dropped_notice(OUTPUT_METHOD.csv, 2)['rows'])
+        self.assertIn('2 frames dropped', pg_view.dropped_notice(OUTPUT_METHOD.console, 2))
@@ -0,0 +1,51 @@
+import json
+from unittest import TestCase
+
+import mock
+
+from pg_view.collectors.memory_collector import MemoryStatCollector
+from pg_view.collectors.system_collector import SystemStatCollector
+from pg_view.models.outputs import NdjsonOutput
+from pg_view.utils import OUTPUT_METHOD
+
+
+class NdjsonOutputTest(TestCase):
+    def setUp(self):
+        super(NdjsonOutputTest, self).setUp()
+        self.collector = MemoryStatCollector()
+        self.rows = [{'total': 2048, 'free': 1024, 'dirty': 4}]
+
+    def test_collector_output_should_match_the_json_output(self):
+        line = self.collector.output(OUTPUT_METHOD.ndjson, rows=self.rows)
+        self.assertNotIn(' ', line)
+        self.assertEqual(json.loads(self.collector.output(OUTPUT_METHOD.json, rows=self.rows)), json.loads(line))
+        self.assertTrue(line.startswith('{"type":"memory","data":[{"total":"2.0MB","free":"1024KB",'))
+
+    def test_collector_output_should_follow_the_units_setting(self):
+        self.collector.set_units_display(True)
+        self.assertIn('"total MB"', self.collector.output(OUTPUT_METHOD.ndjson, rows=self.rows))
+        self.collector.set_units_display(False)
+        self.assertNotIn('"total MB"', self.collector.output(OUTPUT_METHOD.ndjson, rows=self.rows))
+
+    def test_collector_output_should_include_aggregated_samples(self):
+        collector = SystemStatCollector()
+        collector.samples.add([{'utime': 0.1}])
+        collector.samples.add([{'utime': 0.3}])
+        data = json.loads(collector.output(OUTPUT_METHOD.ndjson, rows=collector.samples.result()))['data'][0]
+        self.assertEqual((10.0, 30.0), (data['min']['utime'], data['max']['utime']))
+
+    def test_refresh_should_write_a_single_line_per_tick(self):
+        stream = mock.Mock()
+        output = NdjsonOutput(stream)
+        output.display('{"type":"memory"}')
+        output.display('{"type":"system"}')
+        output.refresh()
+        stream.flush.assert_called_once_with()
+        (line,), _ = stream.write.call_args
+        self.assertTrue(line.endswith('\n'))
+        self.assertEqual(1, line.count('\n'))
+        result = json.loads(line)
+        self.assertEqual([{'type': 'memory'}, {'type': 'system'}], result['collectors'])
+        self.assertIn('monotonic', result)
+        output.refresh()
+        self.assertEqual('[]', stream.write.call_args[0][0].split('"collectors":')[1][:2])
@@ -0,0 +1,112 @@
+import os
+import stat
+import shutil
+import socket
+import tempfile
+from unittest import TestCase
+
+import mock
+
+from pg_view.models.daemon import LineChannel, SnapshotServer, SnapshotViewer, SocketUnavailable, \
+    collector_is_serving, decode_curses_output, default_socket_path
+from pg_view.models.outputs import ColumnType
+from pg_view.models.scheduler import Sampler, wait_for_input
+
+
+class LineChannelTest(TestCase):
+    def setUp(self):
+        super(LineChannelTest, self).setUp()
+        left, right = socket.socketpair()
+        self.addCleanup(left.close)
+        self.addCleanup(right.close)
+        self.left, self.right = LineChannel(left), LineChannel(right)
+
+    def test_receive_should_return_complete_messages_only(self):
+        self.left.sock.sendall(b'{"a": 1}\n{"b"')
+        self.assertEqual([{'a': 1}], self.right.receive())
+        self.left.sock.sendall(b': 2}\n')
+        self.assertEqual([{'b': 2}], self.right.receive())
+
+    def test_receive_should_return_none_when_peer_is_gone(self):
+        self.left.sock.close()
+        self.assertIsNone(self.right.receive())
+
+
+class DecodeCursesOutputTest(TestCase):
+    def test_decode_should_restore_column_types_and_word_numbers(self):
+        data = {'memory': {'rows': [{'free': ['1GB', 'free', 1]}], 'statuses': [{'free': {'-1': 0, '0': 2}}]}}
+        result = decode_curses_output(data)['memory']
+        self.assertEqual(ColumnType('1GB', 'free', 1), result['rows'][0]['free'])
+        self.assertEqual({-1: 0, 0: 2}, result['statuses'][0]['free'])
+
+
+class DefaultSocketPathTest(TestCase):
+    @mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': '/run/user/1000'})
+    def test_default_socket_path_should_prefer_runtime_directory(self):
+        self.assertEqual('/run/user/1000', os.path.dirname(default_socket_path()))
+
+    @mock.patch.dict(os.environ, {'XDG_RUNTIME_DIR': ''})
+    def test_default_socket_path_should_fall_back_to_temporary_directory(self):
+        self.assertEqual(tempfile.gettempdir(), os.path.dirname(default_socket_path()))
+
+
+class SnapshotServerTest(TestCase):
+    def setUp(self):
+        super(SnapshotServerTest, self).setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'pg_view.sock')
+        self.collector = mock.Mock(name='collector')
+        self.collector.rows_snapshot = [{'pid': 1}]
+        self.sampler = Sampler([self.collector], mock.Mock(name='consumer'), lambda: 1)
+        self.server = SnapshotServer(self.path, self.sampler, self._render)
+        self.addCleanup(self.server.close)
+        self.server.start()
+
+    def _render(self, snapshot, view):
+        return ['{0} {1} {2}'.format(view['method'], view['units'], snapshot.rows[self.collector][0]['pid'])]
+
+    def _receive(self, viewer):
+        self.assertTrue(wait_for_input([viewer], 1))
+        return viewer.receive()
+
+    def test_viewer_should_receive_snapshots_rendered_with_its_options(self):
+        self.sampler.publish()
+        viewer = SnapshotViewer(self.path)
+        self.addCleanup(viewer.close)
+        viewer.request({'method': 'console', 'units': True})
+        self.assertEqual(['console True 1'], self._receive(viewer))
+        self.collector.rows_snapshot = [{'pid': 2}]
+        self.sampler.publish()
+        self.assertEqual(['console True 2'], self._receive(viewer))
+        viewer.request({'method': 'console', 'units': False})
+        self.assertEqual(['console False 2'], self._receive(viewer))
+
+    def test_server_should_refuse_socket_of_live_collector_and_replace_stale_one(self):
+        self.assertTrue(collector_is_serving(self.path))
+        self.assertRaises(SocketUnavailable, SnapshotServer, self.path, self.sampler, self._render)
+        self.assertTrue(collector_is_serving(self.path))
+        # left behind by a collector that is gone, along with its lock file
+        path = self.path + '.stale'
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.close()
+        open(path + '.lock', 'w').close()
+        SnapshotServer(path, self.sampler, self._render).close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_server_should_refuse_socket_locked_by_collector_starting_up(self):
+        self.server.sock.close()
+        os.unlink(self.path)
+        # the socket is not there yet, but the lock is taken
+        self.assertRaises(SocketUnavailable, SnapshotServer, self.path, self.sampler, self._render)
+
+    def test_server_socket_should_be_accessible_by_owner_only(self):
+        self.assertEqual(0o600, stat.S_IMODE(os.stat(self.path).st_mode))
+
+    @mock.patch('os.getuid', return_value=-1)
+    def test_server_should_refuse_socket_of_another_user(self, _):
+        self.server.sock.close()
+        self.assertRaises(SocketUnavailable, SnapshotServer, self.path, self.sampler, self._render)
+        # left in place rather than replaced
+        self.assertTrue(os.path.exists(self.path))
@@ -0,0 +1,84 @@
+import json
+from unittest import TestCase
+
+import mock
+
+import pg_view
+from pg_view.collectors.pg_collector import PgstatCollector
+from pg_view.models.delta import DeltaDecoder, DeltaEncoder
+from pg_view.models.outputs import NdjsonOutput
+from pg_view.utils import OUTPUT_METHOD
+
+
+def record(tick, processes, memory=None):
+    collectors = [{'type': 'memory', 'data': [memory or {'free': '1GB'}]}]
+    if processes is not None:
+        collectors.append({'type': 'postgres', 'name': 'main', 'version': '9.6',
+                           'data': [dict(row, _key='{0}:{1}'.format(row['pid'], row['starttime']))
+                                    for row in processes]})
+    return {'time': tick, 'monotonic': tick, 'collectors': collectors}
+
+
+class DeltaEncoderTest(TestCase):
+    def setUp(self):
+        super(DeltaEncoderTest, self).setUp()
+        self.records = [
+            record(0, [{'pid': 1, 'starttime': 10, 'cpu': 1}, {'pid': 2, 'starttime': 10, 'cpu': 0}]),
+            record(1, [{'pid': 1, 'starttime': 10, 'cpu': 2}, {'pid': 2, 'starttime': 10, 'cpu': 0}]),
+            # pid 2 is gone and reused by a new process, pid 1 moves down
+            record(2, [{'pid': 2, 'starttime': 20, 'cpu': 5}, {'pid': 1, 'starttime': 10, 'cpu': 2}]),
+            record(3, None, {'free': '2GB'}),
+            record(4, [{'pid': 3, 'starttime': 30, 'cpu': 0}], {'free': '2GB'}),
+            record(5, [{'pid': 3, 'starttime': 30, 'cpu': 1}], {'free': '2GB'}),
+        ]
+
+    def test_decoder_should_reconstruct_every_record(self):
+        encoder, decoder = DeltaEncoder(4), DeltaDecoder()
+        for r in self.records:
+            # go through the serialized form, the way the reader gets the records
+            self.assertEqual(r, decoder.decode(json.loads(json.dumps(encoder.encode(r)))))
+
+    def test_encoder_should_write_keyframes_every_interval_and_only_changes_in_between(self):
+        encoded = [e for e in map(DeltaEncoder(4).encode, self.records)]
+        self.assertEqual([True, False, False, False, True, False], [bool(e.get('keyframe')) for e in encoded])
+        self.assertEqual({'postgres/main': {'rows': {'1:10': {'cpu': 2}}}}, encoded[1]['delta'])
+        processes = encoded[2]['delta']['postgres/main']
+        self.assertEqual(['2:10'], processes['removed'])
+        self.assertEqual(['2:20', '1:10'], processes['order'])
+        self.assertEqual({'memory': {'rows': {'0': {'free': '2GB'}}}}, encoded[3]['delta'])
+        self.assertEqual(['postgres/main'], encoded[3]['removed'])
+        self.assertNotIn('order', encoded[5])
+
+    def test_decoder_should_wait_for_a_keyframe(self):
+        encoder, decoder = DeltaEncoder(10), DeltaDecoder()
+        encoder.encode(self.records[0])
+        self.assertIsNone(decoder.decode(encoder.encode(self.records[1])))
+
+
+class NdjsonDeltaOutputTest(TestCase):
+    def test_refresh_should_write_the_changes_only(self):
+        stream = mock.Mock()
+        output = NdjsonOutput(stream, DeltaEncoder(10))
+        for free in ('1GB', '1GB', '2GB'):
+            output.display('{{"type":"memory","data":[{{"free":"{0}","total":"4GB"}}]}}'.format(free))
+            output.refresh()
+        lines = [json.loads(args[0]) for args, _ in stream.write.call_args_list]
+        self.assertTrue(lines[0]['keyframe'])
+        self.assertEqual({}, lines[1]['delta'])
+        self.assertEqual({'memory': {'rows': {'0': {'free': '2GB'}}}}, lines[2]['delta'])
+
+    def test_processes_should_be_keyed_by_pid_and_start_time(self):
+        collector = PgstatCollector(mock.MagicMock(), mock.Mock(), 1049, 'main', 9.6, [])
+        rows = [{'pid': 5, 'starttime': 911, 'type': 'backend', 'locked_by': None, 'query': 'select 1'}]
+        data = json.loads(collector.output(OUTPUT_METHOD.ndjson, rows=rows))['data']
+        # the plain output is left as it is
+        self.assertNotIn('_key', data[0])
+        collector.set_keyed_rows(True)
+        data = json.loads(collector.output(OUTPUT_METHOD.ndjson, rows=rows))['data']
+        self.assertEqual('5:911', data[0]['_key'])
+
+    def test_view_should_ask_for_the_row_keys_with_the_delta_encoding_only(self):
+        stream = mock.Mock(name='stream')
+        self.assertFalse(pg_view.current_view(OUTPUT_METHOD.ndjson, NdjsonOutput(stream))['delta'])
+        self.assertTrue(pg_view.current_view(OUTPUT_METHOD.ndjson, NdjsonOutput(stream, DeltaEncoder(10)))['delta'])
+        self.assertFalse(pg_view.current_view(OUTPUT_METHOD.json, None)['delta'])
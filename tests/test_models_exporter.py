@@ -0,0 +1,89 @@
+import time
+from unittest import TestCase
+
+import mock
+
+from pg_view.collectors.memory_collector import MemoryStatCollector
+from pg_view.collectors.partition_collector import PartitionStatCollector
+from pg_view.collectors.pg_collector import PgstatCollector
+from pg_view.models.exporter import MetricsServer, render_metrics
+from pg_view.models.scheduler import Sampler
+
+try:
+    from urllib2 import HTTPError, urlopen
+except ImportError:
+    from urllib.error import HTTPError
+    from urllib.request import urlopen
+
+
+class RenderMetricsTest(TestCase):
+    def setUp(self):
+        super(RenderMetricsTest, self).setUp()
+        self.pg = PgstatCollector(mock.MagicMock(), mock.Mock(), 1049, 'main', 9.6, [])
+        self.partitions = PartitionStatCollector('main', 9.6, '/data', None)
+        self.backends = [{'pid': pid, 'type': 'backend', 'datname': 'db"1', 'usename': None, 'utime': pid * 0.1,
+                          'stime': 0, 'uss': 1024} for pid in range(1, 6)]
+
+    def test_render_should_convert_the_rows_to_gauges_in_base_units(self):
+        text = render_metrics([(MemoryStatCollector(), [{'total': 2, 'free': None}]),
+                               (self.partitions, [{'type': 'data', 'space_left': 1, 'read': 2},
+                                                  {'type': 'xlog', 'space_left': 3}])], 7)
+        lines = text.splitlines()
+        self.assertIn('pg_view_memory_total_bytes 2048.0', lines)
+        self.assertFalse([line for line in lines if line.startswith('pg_view_memory_free_bytes')])
+        self.assertEqual(['pg_view_partition_free_bytes{cluster="main/9.6",type="data"} 1024.0',
+                          'pg_view_partition_free_bytes{cluster="main/9.6",type="xlog"} 3072.0'],
+                         [line for line in lines if line.startswith('pg_view_partition_free_bytes')])
+        self.assertIn('# TYPE pg_view_partition_free_bytes gauge', lines)
+        self.assertIn('pg_view_partition_read_bytes_per_second{cluster="main/9.6",type="data"} 1024.0', lines)
+        self.assertEqual(['pg_view_snapshots_total 7', '# EOF'], lines[-2:])
+
+    def test_render_should_export_only_the_busiest_backends_on_request(self):
+        self.assertNotIn('pg_view_backend', render_metrics([(self.pg, self.backends)], 1))
+        self.pg.metrics_backends = 2
+        lines = [line for line in render_metrics([(self.pg, self.backends)], 1).splitlines()
+                 if line.startswith('pg_view_backend_cpu_user_ratio')]
+        self.assertEqual(['pg_view_backend_cpu_user_ratio{cluster="main/9.6",pid="5",type="backend",'
+                          'datname="db\\"1",usename=""} 0.5', 'pg_view_backend_cpu_user_ratio{cluster="main/9.6",'
+                          'pid="4",type="backend",datname="db\\"1",usename=""} 0.4'], lines)
+
+
+class MetricsServerTest(TestCase):
+    def setUp(self):
+        super(MetricsServerTest, self).setUp()
+        self.collector = mock.Mock(name='collector')
+        self.collector.rows_snapshot = [{'pid': 1}]
+        self.sampler = Sampler([self.collector], mock.Mock(name='consumer'), lambda: 1)
+        self.render = mock.Mock(side_effect=lambda snapshot: 'pg_view_pid {0}\n# EOF\n'.format(
+            snapshot.rows[self.collector][0]['pid']))
+        self.server = MetricsServer(('127.0.0.1', 0), self.sampler, self.render)
+        self.addCleanup(self.server.close)
+        self.server.start()
+        self.url = 'http://127.0.0.1:{0}'.format(self.server.httpd.server_address[1])
+
+    def _scrape(self, path='/metrics'):
+        response = urlopen(self.url + path, timeout=5)
+        try:
+            return response.info().get('Content-Type'), response.read()
+        finally:
+            response.close()
+
+    def _wait_for_render(self, calls):
+        for _ in range(100):
+            if self.render.call_count >= calls:
+                return
+            time.sleep(0.01)
+
+    def test_scrape_should_return_the_text_rendered_for_the_latest_snapshot(self):
+        self.assertEqual(b'# EOF\n', self._scrape()[1])
+        self.sampler.publish()
+        self._wait_for_render(1)
+        content_type, body = self._scrape()
+        self.assertTrue(content_type.startswith('application/openmetrics-text'))
+        self.assertEqual(b'pg_view_pid 1\n# EOF\n', body)
+        self._scrape()
+        # the scrapes don't render anything
+        self.assertEqual(1, self.render.call_count)
+
+    def test_scrape_should_only_serve_the_metrics(self):
+        self.assertRaises(HTTPError, self._scrape, '/')
@@ -0,0 +1,113 @@
+import os
+import shutil
+import socket
+import tempfile
+import time
+from threading import Thread
+from unittest import TestCase
+
+import mock
+
+from pg_view.collectors.cluster_collector import ClusterStatCollector
+from pg_view.collectors.memory_collector import MemoryStatCollector
+from pg_view.collectors.partition_collector import PartitionStatCollector
+from pg_view.models.graphite import GraphiteSink, metric_lines
+from pg_view.models.scheduler import Sampler
+
+
+class MetricLinesTest(TestCase):
+    def test_lines_should_follow_the_host_cluster_and_labels(self):
+        partitions = PartitionStatCollector('main', 9.6, '/data', None)
+        lines = metric_lines([(MemoryStatCollector(), [{'total': 2, 'free': float('nan')}]),
+                              (partitions, [{'type': 'xlog', 'space_left': 3}])], 'db1.example.com', 1480806000.5,
+                             prefix='servers.')
+        self.assertEqual(['servers.db1_example_com.memory_total_bytes 2048.0 1480806000\n',
+                          'servers.db1_example_com.main_9_6.xlog.partition_free_bytes 3072.0 1480806000\n'], lines)
+
+    def test_lines_should_leave_the_role_out_of_the_path(self):
+        lines = metric_lines([(ClusterStatCollector({}), [{'cluster': 'main/9.6', 'role': 'master', 'conns': 5}])],
+                             'db1', 1)
+        self.assertEqual(['db1.main_9_6.postgres_connections 5.0 1\n'], lines)
+
+
+class Listener(object):
+    """ accepts the connections of the sink and collects what it gets """
+
+    def __init__(self, family, address):
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.bind(address)
+        self.sock.listen(1)
+        self.address = self.sock.getsockname()
+        self.received = []
+        self.thread = Thread(target=self._accept)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _accept(self):
+        conn, _ = self.sock.accept()
+        while True:
+            data = conn.recv(4096)
+            if not data:
+                break
+            self.received.append(data)
+        conn.close()
+
+    def data(self):
+        self.thread.join(5)
+        self.sock.close()
+        return b''.join(self.received)
+
+
+class GraphiteSinkTest(TestCase):
+    def setUp(self):
+        super(GraphiteSinkTest, self).setUp()
+        self.collector = mock.Mock(name='collector')
+        self.sampler = Sampler([self.collector], mock.Mock(name='consumer'), lambda: 1)
+
+    def render(self, snapshot):
+        return ['pg_view.tick {0} {0}\n'.format(snapshot.version), 'pg_view.rows {0} {1}\n'.format(
+            len(snapshot.rows[self.collector]), snapshot.version)]
+
+    def test_put_should_drop_the_oldest_lines_when_the_queue_is_full(self):
+        sink = GraphiteSink(('127.0.0.1', 2003), self.sampler, self.render, queue_size=3)
+        sink.put(['a\n', 'b\n'])
+        sink.put(['c\n', 'd\n', 'e\n'])
+        self.assertEqual(['c\n', 'd\n', 'e\n'], list(sink.queue))
+        self.assertEqual(2, sink.dropped)
+
+    def test_sink_should_send_every_snapshot_over_tcp(self):
+        listener = Listener(socket.AF_INET, ('127.0.0.1', 0))
+        sink = GraphiteSink(listener.address, self.sampler, self.render, batch_size=3)
+        sink.start()
+        self.collector.rows_snapshot = [1]
+        self.sampler.publish()
+        for _ in range(100):
+            if sink.version == 1:
+                break
+            time.sleep(0.01)
+        self.collector.rows_snapshot = [1, 2]
+        self.sampler.publish()
+        # the snapshot published last is sent on close even if the renderer hasn't got to it yet
+        sink.close()
+        self.assertEqual(b'pg_view.tick 1 1\npg_view.rows 1 1\npg_view.tick 2 2\npg_view.rows 2 2\n',
+                         listener.data())
+        self.assertEqual(4, sink.sent)
+
+    def test_sink_should_send_over_a_unix_socket(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        listener = Listener(socket.AF_UNIX, os.path.join(directory, 'carbon.sock'))
+        sink = GraphiteSink(listener.address, self.sampler, self.render)
+        sink.start()
+        sink.put(['pg_view.up 1 1\n'])
+        sink.close()
+        self.assertEqual(b'pg_view.up 1 1\n', listener.data())
+
+    def test_sink_should_keep_the_lines_while_the_receiver_is_away(self):
+        sink = GraphiteSink(('127.0.0.1', 1), self.sampler, self.render, retry_interval=0.01)
+        self.collector.rows_snapshot = [1]
+        sink.start()
+        self.sampler.publish()
+        sink.close(timeout=1)
+        self.assertEqual(0, sink.sent)
+        self.assertFalse(sink.sender.is_alive())
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import TestCase
+
+import mock
+
+import pg_view
+from pg_view import flags
+from pg_view.collectors.memory_collector import MemoryStatCollector
+from pg_view.collectors.pg_collector import PgstatCollector
+from pg_view.models.recording import Player, Recorder, Recording
+from pg_view.models.scheduler import Snapshot
+from pg_view.utils import OUTPUT_METHOD
+
+
+class RecordingTest(TestCase):
+    def setUp(self):
+        super(RecordingTest, self).setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'pg_view.rec')
+        self.memory = MemoryStatCollector()
+        self.pg = PgstatCollector(mock.MagicMock(), mock.Mock(), 1049, 'main', 9.6, [])
+        self.pg.recovery_status = 'standby'
+        self.pg.server_version = '9.6.1'
+
+    def _record(self, ticks, ticks_per_chunk=10):
+        recorder = Recorder(self.path, [self.memory, self.pg], ticks_per_chunk)
+        for tick in range(ticks):
+            self.pg.total_connections = tick
+            recorder.record(Snapshot(tick + 1, {self.memory: [{'free': tick}],
+                                                self.pg: [{'pid': 1, 'age': Decimal('1.5')}]}), now=100 + tick * 2)
+        recorder.close()
+        recording = Recording(self.path)
+        self.addCleanup(recording.close)
+        return recording
+
+    def test_recording_should_index_the_chunks_by_time(self):
+        recording = self._record(25)
+        self.assertEqual((25, 100, 148), (len(recording), recording.start_time, recording.end_time))
+        self.assertEqual([('memory', None), ('postgres', 'main')],
+                         [(desc['name'], desc['dbname']) for desc in recording.collectors])
+        time, data = recording.tick(23)
+        self.assertEqual(146, time)
+        self.assertEqual([{'free': 23}], data['memory']['rows'])
+        self.assertEqual([{'pid': 1, 'age': 1.5}], data['postgres (main/9.6)']['rows'])
+        self.assertEqual((0, 12, 12, 24), (recording.find(50), recording.find(124), recording.find(125),
+                                           recording.find(1000)))
+
+    def test_recording_should_ignore_a_chunk_cut_short(self):
+        self._record(25)
+        with open(self.path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+        recording = Recording(self.path)
+        self.addCleanup(recording.close)
+        self.assertEqual((20, 138), (len(recording), recording.end_time))
+
+    def test_player_should_feed_the_recorded_rows_and_state_to_the_collectors(self):
+        recording = self._record(25)
+        memory, pg = MemoryStatCollector(), PgstatCollector(None, None, None, 'main', 9.6, [])
+        player = Player(recording, [memory, pg])
+        player.step(5)
+        self.assertTrue(player.paused)
+        self.assertEqual(([{'free': 5}], 5, 'standby'), (memory.rows_snapshot, pg.total_connections, pg.role()))
+        self.assertTrue(pg.ncurses_produce_prefix().startswith('main 9.6.1 standby connections: 5 of'))
+        self.assertEqual({memory: [{'free': 5}], pg: pg.rows_snapshot}, player.latest().rows)
+        player.skip(-60)
+        self.assertEqual(0, player.position)
+        player.seek(141)
+        self.assertEqual((20, 140), (player.position, player.time()))
+        player.change_speed(100)
+        self.assertEqual(64, player.speed)
+
+    def test_player_time_should_not_read_the_recording(self):
+        recording = self._record(5)
+        player = Player(recording, [MemoryStatCollector()])
+        player.step(2)
+        with mock.patch.object(recording, 'tick', side_effect=AssertionError('read outside the playback')):
+            self.assertEqual(104, player.time())
+
+    def test_replay_should_show_the_aux_processes_on_request(self):
+        recorder = Recorder(self.path, [self.pg])
+        rows = [{'pid': pid, 'type': type, 'datname': 'db', 'usename': 'postgres', 'client_addr': 'local',
+                 'application_name': '', 'query': 'active', 'waiting': False, 'utime': 0, 'stime': 0,
+                 'read_bytes': 0, 'write_bytes': 0, 'uss': 0, 'locked_by': None}
+                for pid, type in ((1, 'backend'), (2, 'checkpointer'))]
+        recorder.record(Snapshot(1, {self.pg: rows}), now=100)
+        recorder.close()
+        recording = Recording(self.path)
+        self.addCleanup(recording.close)
+        pg = PgstatCollector(None, None, None, 'main', 9.6, [])
+        player = Player(recording, [pg])
+        player.step(0)
+        output = mock.Mock(**{'rows_limit.return_value': None})
+
+        def pids():
+            view = pg_view.current_view(OUTPUT_METHOD.curses, output)
+            data = pg_view.render_snapshot({}, [pg], player.latest(), view)
+            return [row['pid'].value for row in data[0][pg.ident()]['rows']]
+        self.assertEqual(['1'], pids())
+        with mock.patch.object(flags, 'filter_aux', False):
+            self.assertEqual(['1', '2'], pids())
@@ -0,0 +1,140 @@
+import threading
+from unittest import TestCase
+
+import mock
+
+from pg_view.models.scheduler import CollectorPool, Sampler, TickScheduler, wait_for_input
+
+
+class CollectorPoolTest(TestCase):
+    def setUp(self):
+        super(CollectorPoolTest, self).setUp()
+        self.release = threading.Event()
+        self.fast = mock.Mock(name='fast')
+        self.slow = mock.Mock(name='slow')
+
+    def _process(self, st):
+        if st is self.slow:
+            self.release.wait()
+
+    @mock.patch('pg_view.models.scheduler.process_single_collector')
+    def test_process_should_mark_collector_stale_when_deadline_missed(self, mocked_process):
+        mocked_process.side_effect = self._process
+        pool = CollectorPool([self.fast, self.slow])
+        stale = pool.process(0.05)
+        self.assertEqual([self.slow], stale)
+        self.assertTrue(self.slow.stale)
+        self.assertFalse(self.fast.stale)
+        self.fast.take_snapshot.assert_called_once_with()
+        self.slow.take_snapshot.assert_not_called()
+        self.release.set()
+
+    @mock.patch('pg_view.models.scheduler.process_single_collector')
+    def test_process_should_not_resubmit_busy_collector(self, mocked_process):
+        mocked_process.side_effect = self._process
+        pool = CollectorPool([self.fast, self.slow])
+        pool.process(0.05)
+        pool.process(0.05)
+        self.assertEqual(3, mocked_process.call_count)
+        self.release.set()
+        pool.process(1)
+        self.assertFalse(self.slow.stale)
+
+    @mock.patch('pg_view.models.scheduler.process_single_collector')
+    def test_process_should_take_snapshot_when_collector_fails(self, mocked_process):
+        mocked_process.side_effect = Exception('boom')
+        pool = CollectorPool([self.fast])
+        self.assertEqual([], pool.process(1))
+        self.fast.take_snapshot.assert_called_once_with()
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TickSchedulerTest(TestCase):
+    def setUp(self):
+        super(TickSchedulerTest, self).setUp()
+        self.clock = FakeClock()
+        self.scheduler = TickScheduler(1, clock=self.clock, sleep=self.clock.sleep)
+        self.scheduler.start()
+
+    def test_wait_should_subtract_work_time_from_sleep(self):
+        self.clock.now += 0.3
+        self.assertEqual(0, self.scheduler.wait())
+        self.assertEqual(101.0, self.clock.now)
+        self.clock.now += 0.9
+        self.scheduler.wait()
+        self.assertEqual(102.0, self.clock.now)
+
+    def test_wait_should_run_immediately_when_slightly_late(self):
+        self.clock.now += 1.5
+        self.assertEqual(0, self.scheduler.wait())
+        self.assertEqual(101.5, self.clock.now)
+        # the schedule stays aligned to the original deadlines
+        self.scheduler.wait()
+        self.assertEqual(102.0, self.clock.now)
+
+    def test_wait_should_skip_missed_ticks_when_late_by_whole_intervals(self):
+        self.clock.now += 3.2
+        self.assertEqual(2, self.scheduler.wait())
+        self.assertEqual(2, self.scheduler.missed)
+        self.scheduler.wait()
+        self.assertEqual(104.0, self.clock.now)
+
+    def test_time_left_should_return_time_until_next_deadline(self):
+        self.clock.now += 0.25
+        self.assertEqual(0.75, self.scheduler.time_left())
+        self.clock.now += 2
+        self.assertEqual(0, self.scheduler.time_left())
+
+
+class SamplerTest(TestCase):
+    def setUp(self):
+        super(SamplerTest, self).setUp()
+        self.collector = mock.Mock(name='collector')
+        self.collector.flush_samples.return_value = True
+        self.collector.rows_snapshot = [{'pid': 1}]
+        self.sampler = Sampler([self.collector], mock.Mock(name='consumer'), lambda: 0.01)
+        self.addCleanup(self.sampler.stop)
+
+    @mock.patch('pg_view.models.scheduler.process_single_collector')
+    def test_sampler_should_publish_snapshots_and_wake_up_the_reader(self, mocked_process):
+        self.sampler.start()
+        snapshot = self.sampler.wait_for_snapshot(0, 1)
+        self.assertLess(0, snapshot.version)
+        self.assertEqual({self.collector: [{'pid': 1}]}, snapshot.rows)
+        self.assertEqual([self.sampler.fileno()], wait_for_input([self.sampler.fileno()], 1))
+
+    def test_publish_should_tell_the_first_snapshot_with_rates(self):
+        self.collector.has_rates.return_value = False
+        self.sampler.publish()
+        self.assertIsNone(self.sampler.rates_version)
+        self.collector.has_rates.return_value = True
+        self.sampler.publish()
+        self.sampler.publish()
+        self.assertEqual(2, self.sampler.rates_version)
+
+    def test_publish_should_give_up_waiting_for_the_rates(self):
+        self.collector.has_rates.return_value = False
+        for _ in range(Sampler.MAX_SNAPSHOTS_WITHOUT_RATES):
+            self.sampler.publish()
+        self.assertEqual(Sampler.MAX_SNAPSHOTS_WITHOUT_RATES, self.sampler.rates_version)
+
+    def test_latest_should_drain_wakeups(self):
+        self.sampler.publish()
+        self.sampler.publish()
+        self.assertEqual(2, self.sampler.latest().version)
+        self.assertEqual([], wait_for_input([self.sampler.fileno()], 0))
+
+    def test_publish_should_not_block_when_nobody_reads(self):
+        for _ in range(100000):
+            self.sampler.publish()
+        self.assertEqual(100000, self.sampler.latest().version)
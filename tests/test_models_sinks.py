@@ -0,0 +1,105 @@
+import json
+import threading
+import time
+from unittest import TestCase
+
+import mock
+
+import pg_view
+from pg_view.collectors.memory_collector import MemoryStatCollector
+from pg_view.collectors.pg_collector import PgstatCollector
+from pg_view.collectors.system_collector import SystemStatCollector
+from pg_view.models.outputs import NdjsonOutput
+from pg_view.models.scheduler import Sampler, Snapshot
+from pg_view.models.sinks import OutputSink
+from pg_view.utils import OUTPUT_METHOD
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class OutputSinkTest(TestCase):
+    def setUp(self):
+        super(OutputSinkTest, self).setUp()
+        self.collector = mock.Mock(name='collector')
+        self.sampler = Sampler([self.collector], mock.Mock(name='consumer'), lambda: 1)
+        self.stream = StringIO()
+        self.render = mock.Mock(side_effect=lambda snapshot, view: ['{{"v":{0}}}'.format(snapshot.version)])
+        self.view = {'method': OUTPUT_METHOD.ndjson, 'collectors': ['memory']}
+        self.sink = OutputSink(self.sampler, NdjsonOutput(self.stream), self.view, self.render, 'test')
+
+    def _records(self):
+        return [json.loads(line)['collectors'] for line in self.stream.getvalue().splitlines()]
+
+    def test_sink_should_write_every_new_snapshot_once(self):
+        self.sink.start()
+        self.sampler.publish()
+        for _ in range(100):
+            if self.sink.version == 1:
+                break
+            time.sleep(0.01)
+        self.sink.close()
+        self.assertEqual([[{'v': 1}]], self._records())
+        self.render.assert_called_once_with(self.sampler.snapshot, self.view)
+
+    def test_close_should_write_the_snapshot_published_last(self):
+        self.sink.start()
+        self.sink.stopped.set()
+        self.sink.join()
+        self.sampler.publish()
+        self.sink.close()
+        self.assertEqual([[{'v': 1}]], self._records())
+
+    def test_close_should_not_wait_for_a_stuck_write(self):
+        release = threading.Event()
+        self.render.side_effect = lambda snapshot, view: release.wait() and ['{}']
+        self.sink.start()
+        self.sampler.publish()
+        for _ in range(100):
+            if self.render.called:
+                break
+            time.sleep(0.01)
+        with mock.patch.object(OutputSink, 'CLOSE_TIMEOUT', 0.05), \
+                mock.patch('pg_view.models.scheduler.logger') as mocked_logger:
+            self.sink.close()
+        self.assertTrue(mocked_logger.warning.called)
+        self.assertEqual(1, self.render.call_count)
+        release.set()
+        self.sink.join()
+
+    def test_sink_should_go_on_after_a_failure(self):
+        self.render.side_effect = [Exception('oops'), ['{}']]
+        self.sink._consume(Snapshot(1, {}))
+        self.sink._consume(Snapshot(2, {}))
+        self.assertEqual([[{}]], self._records())
+
+
+class RenderSnapshotTest(TestCase):
+    def test_render_should_only_format_the_subscribed_collectors(self):
+        memory, system = MemoryStatCollector(), SystemStatCollector()
+        view = dict(pg_view.current_view(OUTPUT_METHOD.json, None), collectors=['memory'])
+        with mock.patch.object(system, 'output') as mocked_output:
+            data = pg_view.render_snapshot({}, [memory, system], Snapshot(1, {memory: [{'total': 1}]}), view)
+        self.assertEqual(1, len(data))
+        self.assertEqual('memory', json.loads(data[0])['type'])
+        mocked_output.assert_not_called()
+
+    def test_render_should_filter_the_aux_processes_per_view(self):
+        pg = PgstatCollector(mock.MagicMock(), mock.Mock(), 1049, 'main', 9.6, [])
+        rows = [{'pid': pid, 'type': type, 'datname': 'db', 'usename': 'postgres', 'client_addr': 'local',
+                 'application_name': '', 'query': 'active', 'waiting': False, 'utime': 0, 'stime': 0,
+                 'read_bytes': 0, 'write_bytes': 0, 'uss': 0, 'locked_by': None}
+                for pid, type in ((1, 'backend'), (2, 'checkpointer'))]
+        pg.set_rows_snapshot(rows)
+        snapshot = Snapshot(1, {pg: pg.rows_snapshot})
+        view = pg_view.current_view(OUTPUT_METHOD.curses, mock.Mock(**{'rows_limit.return_value': None}))
+
+        def pids(filter_aux):
+            data = pg_view.render_snapshot({}, [pg], snapshot, dict(view, filter_aux=filter_aux))
+            return [row['pid'].value for row in data[0][pg.ident()]['rows']]
+        # the viewers attached to the same collector don't share the setting
+        self.assertEqual(['1'], pids(True))
+        self.assertEqual(['1', '2'], pids(False))
+        self.assertEqual(['1'], pids(True))